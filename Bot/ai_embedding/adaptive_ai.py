@@ -1,14 +1,35 @@
-from typing import Dict, List, Optional, Any
+import asyncio
+from typing import Callable, Dict, List, Optional, Any
 import json
 import time
-from ai_embedding.ai import answer_general_question, generate_answer, embed_question
+from ai_embedding.ai import (
+    generate_answer,
+    embed_question,
+    request_general_answer,
+    mark_incomplete,
+    EMPTY_GENERAL_ANSWER,
+    IncompleteAnswerError,
+)
+from ai_embedding.async_ai import (
+    embed_question_async,
+    generate_answer_async,
+    request_general_answer_async,
+)
+from ai_embedding.answer_cache import SemanticAnswerCache
 from core.state_manager import StateManager
 from core.search_service import AdvancedSearchService
+from core.query_expansion import query_expander
+from constants import ANSWER_CACHE_CONFIG
+
+# Caché de respuestas generales compartido por todos los usuarios
+semantic_answer_cache = SemanticAnswerCache()
 
 class AdaptiveAIService:
     def __init__(self, state_manager: StateManager, search_service: AdvancedSearchService):
         self.state_manager = state_manager
         self.search_service = search_service
+        # Diccionario id -> chunk del índice cargado (lo asigna BotHandler)
+        self.chunks_by_id: Dict[int, Dict[str, Any]] = {}
         
         # Plantillas de prompts adaptativas por nivel
         self.prompt_templates = {
@@ -40,10 +61,64 @@ class AdaptiveAIService:
             "practical": "Enfócate en ejemplos prácticos y aplicaciones del mundo real."
         }
     
-    def generate_adaptive_response(self, question: str, command_type: str, user_id: int, context_chunks=None) -> str:
-        """Genera respuesta adaptada al perfil del usuario"""
+    def generate_adaptive_response(
+        self,
+        question: str,
+        command_type: str,
+        user_id: int,
+        context_chunks=None,
+        on_text: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        """
+        Genera respuesta adaptada al perfil del usuario
+
+        Si se indica `on_text`, se invoca con el texto parcial a medida que
+        el modelo lo genera (streaming); el valor retornado es la respuesta
+        final ya post-procesada.
+        """
         session = self.state_manager.get_user_session(user_id)
+        full_prompt = self._build_full_prompt(question, command_type, user_id, session)
         
+        # Generar respuesta según tipo
+        if context_chunks:
+            # Respuesta basada en documentos
+            return self._generate_document_based_response(full_prompt, context_chunks, session, on_text)
+        else:
+            # Respuesta general de IA (reutilizable entre usuarios con el mismo perfil)
+            profile = self._answer_profile(command_type, session)
+            return self._generate_general_response(full_prompt, session, question, profile, on_text)
+
+    async def generate_adaptive_response_async(
+        self,
+        question: str,
+        command_type: str,
+        user_id: int,
+        context_chunks=None,
+        on_text=None,
+    ) -> str:
+        """
+        Versión asíncrona de `generate_adaptive_response` (runtime con AsyncTeleBot)
+
+        Sesiones, historial de búsquedas y caché semántico bloquean (locks,
+        SQLite, numpy), así que se ejecutan en hilos fuera del event loop.
+        """
+        session = await asyncio.to_thread(self.state_manager.get_user_session, user_id)
+        full_prompt = await asyncio.to_thread(self._build_full_prompt, question, command_type, user_id, session)
+
+        if context_chunks:
+            return await self._generate_document_based_response_async(
+                full_prompt, context_chunks, session, on_text
+            )
+        profile = self._answer_profile(command_type, session)
+        return await self._generate_general_response_async(full_prompt, session, question, profile, on_text)
+
+    @staticmethod
+    def _answer_profile(command_type: str, session) -> tuple:
+        """Clave de perfil del caché semántico de respuestas"""
+        return (command_type, session.expertise_level, session.preferences.get("response_style", "professional"))
+
+    def _build_full_prompt(self, question: str, command_type: str, user_id: int, session) -> str:
+        """Prompt completo según nivel, estilo e historial del usuario"""
         # Obtener nivel y preferencias del usuario
         expertise_level = session.expertise_level
         response_style = session.preferences.get("response_style", "professional")
@@ -64,13 +139,7 @@ class AdaptiveAIService:
         if conversation_context:
             full_prompt += f"\n\nContexto de conversación previa: {conversation_context}"
         
-        # Generar respuesta según tipo
-        if context_chunks:
-            # Respuesta basada en documentos
-            return self._generate_document_based_response(full_prompt, context_chunks, session)
-        else:
-            # Respuesta general de IA
-            return self._generate_general_response(full_prompt, session)
+        return full_prompt
     
     def _build_contextual_prompt(self, question: str, command_type: str, level: str, tools: List[str], interests: List[str]) -> str:
         """Construye prompt adaptado al contexto del usuario"""
@@ -109,36 +178,7 @@ class AdaptiveAIService:
     
     def _detect_tool_in_question(self, question: str, user_tools: List[str]) -> Optional[str]:
         """Detecta si hay una herramienta específica mencionada en la pregunta"""
-        question_lower = question.lower()
-        
-        # Herramientas y sus variaciones
-        tool_variations = {
-            "Figma": ["figma", "fig"],
-            "Sketch": ["sketch"],
-            "Adobe XD": ["xd", "adobe xd", "experience design"],
-            "InVision": ["invision", "in vision"],
-            "Framer": ["framer"],
-            "Principle": ["principle"],
-            "Protopie": ["protopie", "proto pie"],
-            "Axure": ["axure"],
-            "Marvel": ["marvel"],
-            "Zeplin": ["zeplin"]
-        }
-        
-        # Buscar primero en herramientas favoritas del usuario
-        for tool in user_tools:
-            if tool in tool_variations:
-                for variation in tool_variations[tool]:
-                    if variation in question_lower:
-                        return tool
-        
-        # Buscar en todas las herramientas
-        for tool, variations in tool_variations.items():
-            for variation in variations:
-                if variation in question_lower:
-                    return tool
-        
-        return None
+        return query_expander.detect_tool(question, user_tools)
     
     def _get_conversation_context(self, user_id: int) -> str:
         """Obtiene contexto de conversación reciente"""
@@ -158,7 +198,7 @@ class AdaptiveAIService:
         
         return " ".join(context_parts) if context_parts else ""
     
-    def _generate_document_based_response(self, prompt: str, context_chunks: List, session) -> str:
+    def _generate_document_based_response(self, prompt: str, context_chunks: List, session, on_text=None) -> str:
         """Genera respuesta basada en documentos con prompt adaptativo"""
         try:
             # Personalizar prompt para búsqueda con documentos
@@ -171,7 +211,9 @@ class AdaptiveAIService:
             )
             
             # Usar el sistema de generación existente pero con prompt mejorado
-            answer, references = generate_answer(prompt, context_chunks, context_chunks)
+            answer, references = generate_answer(
+                prompt, context_chunks, self.chunks_by_id, on_text=on_text
+            )
             
             # Post-procesar respuesta para añadir personalización adicional
             personalized_answer = self._post_process_response(answer, session)
@@ -181,25 +223,85 @@ class AdaptiveAIService:
         except Exception as e:
             return f"Error generando respuesta personalizada: {str(e)}"
     
-    def _generate_general_response(self, prompt: str, session) -> str:
-        """Genera respuesta general con IA adaptativa"""
+    def _generate_general_response(self, prompt: str, session, question: str = None, profile=None, on_text=None) -> str:
+        """Genera respuesta general con IA adaptativa, consultando antes el caché semántico"""
         try:
-            # Añadir contexto de personalización al prompt
-            personalized_prompt = (
-                f"{prompt}\n\n"
-                f"Contexto del usuario:\n"
-                f"- Nivel de experiencia: {session.expertise_level}\n"
-                f"- Herramientas favoritas: {', '.join(session.favorite_tools) if session.favorite_tools else 'No especificadas'}\n"
-                f"- Áreas de interés: {', '.join(session.preferences.get('interests', [])) if session.preferences.get('interests') else 'Generales'}\n"
-                f"- Búsquedas realizadas: {session.search_count}\n\n"
-                "Personaliza tu respuesta según este perfil del usuario."
-            )
-            
-            response = answer_general_question(personalized_prompt)
+            question_embedding = None
+            if question and profile and ANSWER_CACHE_CONFIG['enabled']:
+                question_embedding = embed_question(question)
+                if question_embedding:
+                    cached_answer = semantic_answer_cache.lookup(question_embedding, profile)
+                    if cached_answer:
+                        return self._post_process_response(cached_answer, session)
+
+            try:
+                response = request_general_answer(
+                    self._personalize_general_prompt(prompt, session), on_text=on_text
+                )
+            except IncompleteAnswerError as e:
+                # Una respuesta cortada se muestra con aviso, pero nunca se guarda en el caché
+                return self._post_process_response(mark_incomplete(e.partial), session)
+            if not response:
+                response = EMPTY_GENERAL_ANSWER
+            elif question_embedding:
+                semantic_answer_cache.store(question_embedding, profile, question, response)
             return self._post_process_response(response, session)
             
         except Exception as e:
             return f"Error generando respuesta: {str(e)}"
+
+    def _personalize_general_prompt(self, prompt: str, session) -> str:
+        """Añade contexto de personalización al prompt"""
+        return (
+            f"{prompt}\n\n"
+            f"Contexto del usuario:\n"
+            f"- Nivel de experiencia: {session.expertise_level}\n"
+            f"- Herramientas favoritas: {', '.join(session.favorite_tools) if session.favorite_tools else 'No especificadas'}\n"
+            f"- Áreas de interés: {', '.join(session.preferences.get('interests', [])) if session.preferences.get('interests') else 'Generales'}\n"
+            f"- Búsquedas realizadas: {session.search_count}\n\n"
+            "Personaliza tu respuesta según este perfil del usuario."
+        )
+
+    async def _generate_document_based_response_async(self, prompt: str, context_chunks: List, session, on_text=None) -> str:
+        """Versión asíncrona de `_generate_document_based_response`"""
+        try:
+            answer, references = await generate_answer_async(
+                prompt, context_chunks, self.chunks_by_id, on_text=on_text
+            )
+            return await asyncio.to_thread(self._post_process_response, answer, session)
+        except Exception as e:
+            return f"Error generando respuesta personalizada: {str(e)}"
+
+    async def _generate_general_response_async(self, prompt: str, session, question: str = None, profile=None, on_text=None) -> str:
+        """Versión asíncrona de `_generate_general_response`"""
+        try:
+            question_embedding = None
+            if question and profile and ANSWER_CACHE_CONFIG['enabled']:
+                question_embedding = await embed_question_async(question)
+                if question_embedding:
+                    cached_answer = await asyncio.to_thread(
+                        semantic_answer_cache.lookup, question_embedding, profile
+                    )
+                    if cached_answer:
+                        return await asyncio.to_thread(self._post_process_response, cached_answer, session)
+
+            try:
+                response = await request_general_answer_async(
+                    self._personalize_general_prompt(prompt, session), on_text=on_text
+                )
+            except IncompleteAnswerError as e:
+                # Una respuesta cortada se muestra con aviso, pero nunca se guarda en el caché
+                return await asyncio.to_thread(self._post_process_response, mark_incomplete(e.partial), session)
+            if not response:
+                response = EMPTY_GENERAL_ANSWER
+            elif question_embedding:
+                await asyncio.to_thread(
+                    semantic_answer_cache.store, question_embedding, profile, question, response
+                )
+            return await asyncio.to_thread(self._post_process_response, response, session)
+
+        except Exception as e:
+            return f"Error generando respuesta: {str(e)}"
     
     def _post_process_response(self, response: str, session) -> str:
         """Post-procesa la respuesta para añadir elementos personalizados"""
@@ -1,14 +1,17 @@
+import asyncio
 import time
 import os
-from typing import List, Dict, Any
+import json
+from typing import Callable, List, Dict, Any, Optional, Tuple
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from logger import ai_logger
+from constants import EMBEDDING_CONFIG, RATE_LIMITER_CONFIG
+from ai_embedding.embedding_cache import QueryEmbeddingCache
 import numpy as np
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import queue
+from concurrent.futures import ThreadPoolExecutor
 
 url = "https://api.fireworks.ai/inference/v1/embeddings"
 url_llm = "https://api.fireworks.ai/inference/v1/chat/completions"
@@ -20,6 +23,216 @@ headers = {
     "Content-Type": "application/json",
 }
 
+EMPTY_GENERAL_ANSWER = (
+    "No se pudo generar una respuesta. Por favor, intenta reformular tu pregunta de diseño."
+)
+INCOMPLETE_ANSWER_NOTICE = (
+    "⚠️ _La respuesta se cortó por un problema de conexión y puede estar incompleta. "
+    "Vuelve a preguntar para obtenerla completa._"
+)
+
+
+class IncompleteAnswerError(Exception):
+    """El stream de la respuesta se cortó antes de `[DONE]` o de un `finish_reason`"""
+
+    def __init__(self, partial: str):
+        super().__init__("Respuesta interrumpida del servicio de IA")
+        self.partial = partial
+
+
+def mark_incomplete(partial: str) -> str:
+    """Texto recibido antes del corte, con el aviso de respuesta incompleta"""
+    return f"{partial}\n\n{INCOMPLETE_ANSWER_NOTICE}"
+
+
+class AdaptiveRateLimiter:
+    """
+    Limitador compartido de peticiones a la API (token bucket + AIMD).
+
+    El bucket se recarga a `rate` peticiones por segundo y además limita
+    las peticiones en vuelo a `concurrency`. Cada respuesta 2xx sube la
+    tasa de forma aditiva (y la concurrencia cada cierto número de
+    éxitos); un 429 la reduce de forma multiplicativa y, si trae
+    `Retry-After`, pausa a todos los clientes hasta ese momento. Así las
+    ingestas masivas convergen al límite real del proveedor.
+    """
+
+    def __init__(self, config: Dict[str, Any] = RATE_LIMITER_CONFIG):
+        self.min_rate = config['min_rate']
+        self.max_rate = config['max_rate']
+        self.additive_increase = config['additive_increase']
+        self.decrease_factor = config['decrease_factor']
+        self.max_concurrency = config['max_concurrency']
+        self.rate = config['initial_rate']
+        self.concurrency = config['initial_concurrency']
+
+        self._condition = threading.Condition()
+        # Corrutinas esperando un hueco de concurrencia: (event loop, future que despierta `release`)
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._tokens = 1.0
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._in_flight = 0
+        self._successes = 0
+        self.throttled_count = 0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(
+            max(1.0, self.rate), self._tokens + (now - self._last_refill) * self.rate
+        )
+        self._last_refill = now
+
+    def _try_acquire(self) -> Tuple[bool, Optional[float]]:
+        """
+        Intenta tomar un token y un hueco (con el lock tomado).
+
+        Returns:
+            Tuple: (adquirido, segundos a esperar o None si depende de un release)
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if now < self._paused_until:
+            return False, self._paused_until - now
+        if self._in_flight >= self.concurrency:
+            return False, None
+        if self._tokens < 1.0:
+            return False, (1.0 - self._tokens) / self.rate
+        self._tokens -= 1.0
+        self._in_flight += 1
+        return True, None
+
+    def acquire(self) -> None:
+        """Bloquea hasta que haya un token y un hueco de concurrencia"""
+        with self._condition:
+            while True:
+                acquired, wait = self._try_acquire()
+                if acquired:
+                    return
+                self._condition.wait(wait)
+
+    async def acquire_async(self) -> None:
+        """
+        Como `acquire`, pero cede el event loop mientras espera
+
+        La espera por un token o una pausa dura lo calculado; la espera por
+        un hueco de concurrencia termina cuando `release` resuelve el future
+        de la corrutina, sin sondear.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            waiter = None
+            with self._condition:
+                acquired, wait = self._try_acquire()
+                if acquired:
+                    return
+                if wait is None:
+                    waiter = loop.create_future()
+                    self._async_waiters.append((loop, waiter))
+            if waiter is None:
+                await asyncio.sleep(wait)
+                continue
+            try:
+                await waiter
+            finally:
+                with self._condition:
+                    if (loop, waiter) in self._async_waiters:
+                        self._async_waiters.remove((loop, waiter))
+
+    @staticmethod
+    def _wake(waiter: asyncio.Future) -> None:
+        if not waiter.done():
+            waiter.set_result(None)
+
+    def release(self, status_code: Optional[int] = None, retry_after: Optional[float] = None) -> None:
+        """Registra el resultado de una petición y ajusta tasa y concurrencia"""
+        with self._condition:
+            self._in_flight -= 1
+            if status_code == 429:
+                self.throttled_count += 1
+                self._successes = 0
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                self.concurrency = max(1, int(self.concurrency * self.decrease_factor))
+                if retry_after:
+                    self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                ai_logger.warning(
+                    f"Límite de la API alcanzado (429): tasa reducida a {self.rate:.2f} req/s, "
+                    f"concurrencia {self.concurrency}"
+                    + (f", pausa de {retry_after:.1f} s" if retry_after else "")
+                )
+            elif status_code is not None and 200 <= status_code < 300:
+                self.rate = min(self.max_rate, self.rate + self.additive_increase)
+                self._successes += 1
+                if self._successes >= self.concurrency and self.concurrency < self.max_concurrency:
+                    self.concurrency += 1
+                    self._successes = 0
+            self._condition.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+            for loop, waiter in waiters:
+                if not loop.is_closed():
+                    loop.call_soon_threadsafe(self._wake, waiter)
+
+    @property
+    def current_rate(self) -> float:
+        """Tasa actual permitida, en peticiones por segundo"""
+        return self.rate
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estado actual del limitador"""
+        with self._condition:
+            return {
+                'rate_per_second': round(self.rate, 2),
+                'concurrency': self.concurrency,
+                'in_flight': self._in_flight,
+                'throttled_count': self.throttled_count,
+                'paused_for_seconds': round(max(0.0, self._paused_until - time.monotonic()), 1),
+            }
+
+
+class APIRequestError(Exception):
+    """
+    Petición a la API fallida.
+
+    `status_code` es el código HTTP de la respuesta, o None si no hubo
+    respuesta (timeout o error de conexión).
+    """
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# Respuestas que rechazan el contenido enviado (texto inválido o demasiado grande)
+INPUT_ERROR_STATUSES = (400, 413, 422)
+
+
+def is_input_error(error: Exception) -> bool:
+    """
+    Indica si el fallo se debe al contenido de la petición y no al servicio.
+
+    Solo en ese caso tiene sentido reintentar con menos textos; los
+    timeouts, errores de conexión, 5xx y 429 fallarían igual.
+    """
+    if isinstance(error, APIRequestError):
+        return error.status_code in INPUT_ERROR_STATUSES
+    return isinstance(error, ValueError)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Segundos indicados por la cabecera Retry-After (solo formato numérico)"""
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+
+# Limitador compartido por todas las llamadas a la API
+api_rate_limiter = AdaptiveRateLimiter()
+
+# Caché de embeddings de consultas (compartido por todas las búsquedas)
+query_embedding_cache = QueryEmbeddingCache(
+    f"{EMBEDDING_CONFIG['model']}:{EMBEDDING_CONFIG['dimensions']}"
+)
+
 # Lock para thread safety
 _session_lock = threading.Lock()
 _session = None
@@ -32,11 +245,11 @@ def get_http_session():
         if _session is None:
             _session = requests.Session()
             
-            # Configurar strategy de retry
+            # Configurar strategy de retry (los 429 los gestiona el limitador adaptativo)
             retry_strategy = Retry(
                 total=3,
                 backoff_factor=1,
-                status_forcelist=[429, 500, 502, 503, 504],
+                status_forcelist=[500, 502, 503, 504],
                 respect_retry_after_header=True
             )
             
@@ -58,31 +271,194 @@ def get_http_session():
         
         return _session
 
-def make_api_request(url: str, payload: dict, timeout: int = 30):
-    """Hace un request HTTP robusto con manejo de errores"""
+def make_api_request(url: str, payload: dict, timeout: int = 30, stream: bool = False):
+    """
+    Hace un request HTTP robusto con manejo de errores, regulado por el limitador compartido
+
+    Con `stream=True` retorna la respuesta abierta (para leerla como SSE)
+    en lugar del JSON decodificado. La petición sigue ocupando su hueco del
+    limitador mientras se lee el cuerpo: el llamante debe cerrarla con
+    `close_stream`.
+    """
     session = get_http_session()
-    
+
+    for attempt in range(RATE_LIMITER_CONFIG['max_throttle_retries'] + 1):
+        api_rate_limiter.acquire()
+        status_code = None
+        retry_after = None
+        streaming = False
+        try:
+            response = session.post(url, json=payload, timeout=timeout, stream=stream)
+            status_code = response.status_code
+            if status_code == 429:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                response.close()
+                continue
+            response.raise_for_status()
+            if stream:
+                streaming = True
+                return response
+            return response.json()
+        except requests.exceptions.Timeout:
+            ai_logger.error(f"Timeout en request a {url}")
+            raise APIRequestError("Timeout en la conexión con el servicio de IA")
+        except requests.exceptions.ConnectionError:
+            ai_logger.error(f"Error de conexión a {url}")
+            raise APIRequestError("Error de conexión con el servicio de IA")
+        except requests.exceptions.HTTPError as e:
+            ai_logger.error(f"Error HTTP {e.response.status_code}: {e.response.text}")
+            raise APIRequestError(
+                f"Error del servidor de IA: {e.response.status_code}", e.response.status_code
+            )
+        except Exception as e:
+            ai_logger.error(f"Error inesperado en request: {str(e)}")
+            raise
+        finally:
+            if not streaming:
+                api_rate_limiter.release(status_code, retry_after)
+
+    ai_logger.error(f"Límite de la API persistente tras {attempt + 1} intentos a {url}")
+    raise APIRequestError("Error del servidor de IA: 429", 429)
+
+def close_stream(response: requests.Response) -> None:
+    """Cierra una respuesta de `make_api_request(stream=True)` y libera su hueco del limitador"""
     try:
-        response = session.post(url, json=payload, timeout=timeout)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.Timeout:
-        ai_logger.error(f"Timeout en request a {url}")
-        raise Exception("Timeout en la conexión con el servicio de IA")
-    except requests.exceptions.ConnectionError:
-        ai_logger.error(f"Error de conexión a {url}")
-        raise Exception("Error de conexión con el servicio de IA")
-    except requests.exceptions.HTTPError as e:
-        ai_logger.error(f"Error HTTP {e.response.status_code}: {e.response.text}")
-        raise Exception(f"Error del servidor de IA: {e.response.status_code}")
-    except Exception as e:
-        ai_logger.error(f"Error inesperado en request: {str(e)}")
-        raise
+        response.close()
+    finally:
+        api_rate_limiter.release(response.status_code)
+
+def parse_sse_line(line: str) -> Tuple[bool, Optional[str]]:
+    """
+    Interpreta una línea del stream SSE de chat completions.
+
+    El stream termina con `[DONE]` o con el primer evento que trae
+    `finish_reason`, que puede incluir aún un último fragmento de texto.
+
+    Returns:
+        Tuple: (stream terminado, fragmento de texto o None)
+    """
+    if not line or not line.startswith("data:"):
+        return False, None
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return True, None
+    choice = json.loads(data).get("choices", [{}])[0]
+    return bool(choice.get("finish_reason")), choice.get("delta", {}).get("content")
+
+def chat_completion(
+    payload: dict,
+    timeout: int = 45,
+    on_text: Optional[Callable[[str], None]] = None,
+) -> str:
+    """
+    Llama al endpoint de chat completions y retorna el texto generado.
+
+    Si se indica `on_text`, la respuesta se pide en streaming (SSE) y se
+    invoca con el texto acumulado cada vez que llega un fragmento, de modo
+    que el llamante puede mostrarla progresivamente.
+
+    Raises:
+        IncompleteAnswerError: Si el stream se corta tras recibir texto
+    """
+    if on_text is None:
+        response_data = make_api_request(url_llm, payload, timeout=timeout)
+        return response_data.get("choices", [{}])[0].get("message", {}).get("content", "")
+
+    response = make_api_request(url_llm, {**payload, "stream": True}, timeout=timeout, stream=True)
+    response.encoding = "utf-8"
+    parts = []
+    completed = False
+    try:
+        for line in response.iter_lines(decode_unicode=True):
+            done, delta = parse_sse_line(line)
+            if delta:
+                parts.append(delta)
+                on_text("".join(parts))
+            if done:
+                completed = True
+                break
+    except requests.exceptions.RequestException as e:
+        ai_logger.error(f"Streaming interrumpido tras {len(parts)} fragmentos: {str(e)}")
+    finally:
+        close_stream(response)
+
+    if not completed:
+        if not parts:
+            raise Exception("Error de conexión con el servicio de IA")
+        ai_logger.warning(f"Respuesta incompleta: el stream terminó tras {len(parts)} fragmentos")
+        raise IncompleteAnswerError("".join(parts))
+    return "".join(parts)
+
+def estimate_tokens(text: str) -> int:
+    """Estimación rápida de tokens (~4 caracteres por token)"""
+    return len(text) // 4 + 1
+
+
+def batch_texts_by_budget(
+    texts: List[str],
+    max_tokens: int = EMBEDDING_CONFIG['max_batch_tokens'],
+    max_items: int = EMBEDDING_CONFIG['max_batch_items'],
+) -> List[List[int]]:
+    """
+    Agrupa textos en lotes que respetan un presupuesto de tokens y de elementos.
+
+    Returns:
+        List[List[int]]: Índices de los textos de cada lote, en orden
+    """
+    batches = []
+    current = []
+    current_tokens = 0
+    for position, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(position)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """
+    Genera los embeddings de varios textos en una sola petición.
+
+    La API recibe una lista en `input` y devuelve cada vector con su
+    `index`, que se usa para devolverlos en el mismo orden que `texts`.
+
+    Raises:
+        APIRequestError: Si la petición falla
+        ValueError: Si la respuesta no trae todos los vectores
+    """
+    payload = {
+        "input": texts,
+        "model": EMBEDDING_CONFIG['model'],
+        "dimensions": EMBEDDING_CONFIG['dimensions'],
+    }
+    response_data = make_api_request(url, payload, timeout=EMBEDDING_CONFIG['batch_timeout'])
+
+    embeddings = [None] * len(texts)
+    for position, item in enumerate(response_data["data"]):
+        embeddings[item.get("index", position)] = item["embedding"]
+    if any(embedding is None for embedding in embeddings):
+        raise ValueError("La respuesta de embeddings no incluye todos los textos del lote")
+    return embeddings
+
 
 def generate_embeddings(chunks: List[Dict[str, Any]]) -> None:
     """
     Genera embeddings para los fragmentos de texto que no los tengan
-    Versión mejorada con procesamiento paralelo y manejo robusto de errores
+
+    Los fragmentos se agrupan en lotes según `EMBEDDING_CONFIG` y cada lote
+    es una sola petición a la API. Si la API rechaza el contenido de un lote
+    (400, 413, 422), se divide a la mitad y se reintenta, de modo que un
+    texto problemático no arrastra al resto. Si el fallo es del servicio
+    (timeout, conexión, 5xx o 429 persistente), el lote falla entero sin
+    dividirse y los lotes pendientes no se envían: sus fragmentos quedan
+    sin embedding y `process_documents` saca su documento del manifiesto
+    para volver a procesarlo en la próxima ingesta.
 
     Args:
         chunks: Lista de fragmentos con metadatos
@@ -92,67 +468,190 @@ def generate_embeddings(chunks: List[Dict[str, Any]]) -> None:
     """
     ai_logger.info(f"Solicitada generación de embeddings para {len(chunks)} chunks")
 
-    # Contador de embeddings a generar
-    chunks_to_process = [chunk for chunk in chunks if "embedding" not in chunk]
-    
+    chunks_to_process = []
+    for chunk in chunks:
+        if "embedding" in chunk:
+            continue
+        if not chunk.get("text", ""):
+            ai_logger.warning(f"Fragmento {chunk.get('chunk_id', 'Unknown')} no tiene texto para embeddings")
+            continue
+        chunks_to_process.append(chunk)
+
     if not chunks_to_process:
         ai_logger.info("Todos los chunks ya tienen embeddings. No es necesario generar nuevos.")
         return
 
-    ai_logger.info(f"Se generarán {len(chunks_to_process)} nuevos embeddings")
+    texts = [chunk["text"] for chunk in chunks_to_process]
+    batches = batch_texts_by_budget(texts)
+    ai_logger.info(
+        f"Se generarán {len(chunks_to_process)} nuevos embeddings en {len(batches)} peticiones"
+    )
 
-    # Procesar embeddings en paralelo (máximo 3 threads para no sobrecargar la API)
     start_time = time.time()
-    generated_count = 0
-    failed_count = 0
-    
-    def process_chunk(chunk):
-        """Procesa un chunk individual"""
-        chunk_id = chunk.get("chunk_id", "Unknown")
+    request_count = 0
+    count_lock = threading.Lock()
+    service_down = threading.Event()
+
+    def process_batch(positions: List[int]) -> int:
+        """Embebe un lote; si la API rechaza su contenido, lo divide hasta aislar los textos problemáticos"""
+        nonlocal request_count
+        if service_down.is_set():
+            return 0
+        with count_lock:
+            request_count += 1
         try:
-            text = chunk.get("text", "")
-            if not text:
-                ai_logger.warning(f"Fragmento {chunk_id} no tiene texto para embeddings")
-                return False
-                
-            embedding = embed_question(text)
-            if embedding:
-                chunk["embedding"] = embedding
-                ai_logger.debug(f"Embedding generado correctamente para {chunk_id}")
-                return True
-            else:
-                ai_logger.error(f"No se pudo generar embedding para {chunk_id}")
-                return False
+            embeddings = embed_texts([texts[position] for position in positions])
         except Exception as e:
-            ai_logger.error(f"Error procesando chunk {chunk_id}: {str(e)}")
-            return False
-    
-    # Procesamiento paralelo con ThreadPoolExecutor
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        future_to_chunk = {executor.submit(process_chunk, chunk): chunk for chunk in chunks_to_process}
-        
-        for future in as_completed(future_to_chunk):
-            if future.result():
-                generated_count += 1
-            else:
-                failed_count += 1
-            
-            # Rate limiting - pausa entre requests
-            time.sleep(0.1)
+            if not is_input_error(e):
+                service_down.set()
+                ai_logger.error(
+                    f"Lote de {len(positions)} textos falló por el servicio ({str(e)}); "
+                    "se omiten los lotes pendientes"
+                )
+                return 0
+            if len(positions) == 1:
+                chunk_id = chunks_to_process[positions[0]].get("chunk_id", "Unknown")
+                ai_logger.error(f"No se pudo generar embedding para {chunk_id}: {str(e)}")
+                return 0
+            ai_logger.warning(f"Lote de {len(positions)} textos rechazado ({str(e)}), dividiendo...")
+            middle = len(positions) // 2
+            return process_batch(positions[:middle]) + process_batch(positions[middle:])
+
+        for position, embedding in zip(positions, embeddings):
+            chunks_to_process[position]["embedding"] = embedding
+        return len(positions)
+
+    # La concurrencia efectiva la regula el limitador compartido de make_api_request
+    with ThreadPoolExecutor(max_workers=api_rate_limiter.max_concurrency) as executor:
+        generated_count = sum(executor.map(process_batch, batches))
 
     elapsed_time = time.time() - start_time
-    avg_time = elapsed_time / len(chunks_to_process) if chunks_to_process else 0
-
+    failed_count = len(chunks_to_process) - generated_count
     ai_logger.info(
         f"Generación completada: {generated_count} exitosos, {failed_count} fallidos "
-        f"en {elapsed_time:.2f} segundos (promedio: {avg_time:.2f} s/embedding)"
+        f"en {elapsed_time:.2f} segundos ({request_count} peticiones)"
     )
 
+
+def resolve_context_chunks(
+    context_chunks: List[Dict[str, Any]] | List[int],
+    chunks_by_id: Optional[Dict[int, Dict[str, Any]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Resuelve los fragmentos de contexto a sus diccionarios completos.
+
+    Los resultados de búsqueda llevan su id de chunk, así que la resolución
+    es una consulta O(1) al diccionario id -> chunk construido al cargar el
+    índice, sin recorrer el corpus.
+
+    Args:
+        context_chunks: Fragmentos (dict) o ids de chunk
+        chunks_by_id: Diccionario id -> fragmento
+
+    Returns:
+        list: Fragmentos resueltos, en el mismo orden
+    """
+    resolved = []
+    for chunk in context_chunks:
+        if isinstance(chunk, dict):
+            resolved.append(chunk)
+        elif isinstance(chunk, (int, np.integer)) and chunks_by_id is not None:
+            original_chunk = chunks_by_id.get(int(chunk))
+            if original_chunk:
+                resolved.append(original_chunk)
+            else:
+                ai_logger.warning(f"Chunk con id {chunk} no encontrado")
+        else:
+            ai_logger.warning(
+                f"Fragmento de contexto no resoluble ignorado: {type(chunk).__name__}"
+            )
+    return resolved
+
+
+NO_CONTEXT_ANSWER = "No se encontraron recursos de diseño relevantes para responder a tu pregunta."
+EMPTY_DOCUMENT_ANSWER = "No se pudo generar una respuesta adecuada. Intenta reformular tu pregunta."
+
+
+def _pretty_document_name(chunk: Dict[str, Any]) -> str:
+    return os.path.basename(chunk["document"]).replace(".pdf", "").replace("_", " ")
+
+
+def build_answer_payload(
+    question: str,
+    processed_chunks: List[Dict[str, Any]],
+    model: str = "accounts/fireworks/models/llama-v3p3-70b-instruct",
+) -> dict:
+    """Construye la petición al LLM para responder con los fragmentos de contexto"""
+    context_text = ""
+    for chunk in processed_chunks:
+        doc_name = _pretty_document_name(chunk)
+
+        pages = ", ".join(map(str, chunk["pages"])) if "pages" in chunk else "N/A"
+
+        context_text += (
+            f"\n\n📚 Recurso: {doc_name}\n"
+            f"📖 Páginas: {pages}\n"
+            f"📝 Contenido:\n{chunk['text']}\n"
+            "――――――――――――――――――――――"
+        )
+
+    # Prompt especializado en UX/UI
+    prompt = (
+        "Eres un experto senior en UX/UI Design con más de 10 años de experiencia. "
+        "Respondes con conocimientos profundos sobre investigación de usuarios, "
+        "diseño de interfaces, usabilidad, accesibilidad, design systems y mejores prácticas. "
+        f"PREGUNTA: {question}\n\n"
+        "RECURSOS DE DISEÑO RELEVANTES:\n" + context_text + "\n\n"
+        "Basándote en la información anterior y tu experiencia en diseño, "
+        "proporciona una respuesta profesional y práctica. "
+        "Incluye ejemplos concretos, mejores prácticas y consideraciones importantes. "
+        "Estructura tu respuesta con encabezados en Markdown cuando sea apropiado. "
+        "Si es relevante, menciona herramientas específicas como Figma, Sketch, Adobe XD, etc.\n\n"
+        "RESPUESTA:"
+    )
+
+    return {
+        "model": model,
+        "messages": [
+            {
+                "role": "system",
+                "content": "Eres un experto UX/UI Designer y consultor de experiencia de usuario. Respondes de manera profesional, práctica y con ejemplos concretos del mundo real del diseño digital.",
+            },
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": 0.3,  # Precisión para consejos de diseño
+        "max_tokens": 1500,
+        "top_p": 0.9,
+    }
+
+
+def finish_answer(answer: str, processed_chunks: List[Dict[str, Any]]) -> tuple:
+    """Añade referencias y el tip final a la respuesta del modelo"""
+    if not answer:
+        ai_logger.warning("Respuesta vacía de la API")
+        return EMPTY_DOCUMENT_ANSWER, []
+
+    # Extraer referencias únicas
+    unique_refs = []
+    for chunk in processed_chunks:
+        doc_name = _pretty_document_name(chunk)
+
+        pages = ", ".join(map(str, chunk["pages"])) if "pages" in chunk else "N/A"
+
+        ref_str = f"📄 {doc_name} | | 📌 Pág. {pages}"
+        unique_refs.append(ref_str)
+
+    answer += "\n\n💡 **Tip profesional:** Siempre valida tus decisiones de diseño con usuarios reales y datos de usabilidad."
+
+    return answer, unique_refs
+
+
 def generate_answer(
     question: str,
-    context_chunks: List[Dict[str, Any]] | List[List[int]],
-    save_chunks: List[Dict[str, Any]] | List[List[int]],
+    context_chunks: List[Dict[str, Any]] | List[int],
+    save_chunks: Optional[Dict[int, Dict[str, Any]]] = None,
     model: str = "accounts/fireworks/models/llama-v3p3-70b-instruct",
+    on_text: Optional[Callable[[str], None]] = None,
 ) -> tuple:
     """
     Genera una respuesta especializada en UX/UI Design citando recursos específicos.
@@ -160,108 +659,31 @@ def generate_answer(
 
     Args:
         question: Pregunta del usuario sobre diseño
-        context_chunks: Fragmentos de recursos de diseño relevantes
-        save_chunks: Todos los chunks disponibles para búsqueda
+        context_chunks: Fragmentos de recursos de diseño relevantes (dicts o ids de chunk)
+        save_chunks: Diccionario id -> fragmento para resolver ids
         model: Modelo generativo a usar
+        on_text: Callback con el texto acumulado (activa el modo streaming)
 
     Returns:
         tuple: (respuesta_formateada, referencias_detalladas)
     """
     try:
         # Procesar los chunks de contexto
-        processed_chunks = []
-        for chunk in context_chunks:
-            if isinstance(chunk, dict):
-                processed_chunks.append(chunk)
-            else:
-                original_chunk = find_original_chunk(chunk, save_chunks)
-                if original_chunk:
-                    processed_chunks.append(original_chunk)
+        processed_chunks = resolve_context_chunks(context_chunks, save_chunks)
 
         if not processed_chunks:
-            return (
-                "No se encontraron recursos de diseño relevantes para responder a tu pregunta.",
-                [],
-            )
-
-        context_text = ""
-        for chunk in processed_chunks:
-            doc_name = (
-                os.path.basename(chunk["document"])
-                .replace(".pdf", "")
-                .replace("_", " ")
-            )
+            return NO_CONTEXT_ANSWER, []
 
-            pages = ", ".join(map(str, chunk["pages"])) if "pages" in chunk else "N/A"
-
-            context_text += (
-                f"\n\n📚 Recurso: {doc_name}\n"
-                f"📖 Páginas: {pages}\n"
-                f"📝 Contenido:\n{chunk['text']}\n"
-                "――――――――――――――――――――――"
-            )
-
-        # Prompt especializado en UX/UI
-        prompt = (
-            "Eres un experto senior en UX/UI Design con más de 10 años de experiencia. "
-            "Respondes con conocimientos profundos sobre investigación de usuarios, "
-            "diseño de interfaces, usabilidad, accesibilidad, design systems y mejores prácticas. "
-            f"PREGUNTA: {question}\n\n"
-            "RECURSOS DE DISEÑO RELEVANTES:\n" + context_text + "\n\n"
-            "Basándote en la información anterior y tu experiencia en diseño, "
-            "proporciona una respuesta profesional y práctica. "
-            "Incluye ejemplos concretos, mejores prácticas y consideraciones importantes. "
-            "Estructura tu respuesta con encabezados en Markdown cuando sea apropiado. "
-            "Si es relevante, menciona herramientas específicas como Figma, Sketch, Adobe XD, etc.\n\n"
-            "RESPUESTA:"
-        )
-
-        # Configurar payload para la API
-        payload = {
-            "model": model,
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "Eres un experto UX/UI Designer y consultor de experiencia de usuario. Respondes de manera profesional, práctica y con ejemplos concretos del mundo real del diseño digital.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            "temperature": 0.3,  # Precisión para consejos de diseño
-            "max_tokens": 1500,
-            "top_p": 0.9,
-        }
+        payload = build_answer_payload(question, processed_chunks, model)
 
         # Generar respuesta con manejo robusto
         ai_logger.info("Generando respuesta de IA...")
-        response_data = make_api_request(url_llm, payload, timeout=45)
-
-        # Procesar respuesta
-        answer = (
-            response_data.get("choices", [{}])[0].get("message", {}).get("content", "")
-        )
-
-        if not answer:
-            ai_logger.warning("Respuesta vacía de la API")
-            return "No se pudo generar una respuesta adecuada. Intenta reformular tu pregunta.", []
-
-        # Extraer referencias únicas
-        unique_refs = []
-        for chunk in processed_chunks:
-            doc_name = (
-                os.path.basename(chunk["document"])
-                .replace(".pdf", "")
-                .replace("_", " ")
-            )
-
-            pages = ", ".join(map(str, chunk["pages"])) if "pages" in chunk else "N/A"
-
-            ref_str = f"📄 {doc_name} | | 📌 Pág. {pages}"
-            unique_refs.append(ref_str)
-
-        answer += "\n\n💡 **Tip profesional:** Siempre valida tus decisiones de diseño con usuarios reales y datos de usabilidad."
+        answer = chat_completion(payload, timeout=45, on_text=on_text)
 
-        return answer, unique_refs
+        return finish_answer(answer, processed_chunks)
 
+    except IncompleteAnswerError as e:
+        return finish_answer(mark_incomplete(e.partial), processed_chunks)
     except Exception as e:
         ai_logger.error(f"Error generando respuesta: {str(e)}")
         return (
@@ -270,46 +692,33 @@ def generate_answer(
         )
 
 
-def find_original_chunk(vector, chunks_db):
-    """
-    Función para encontrar el chunk original correspondiente a un vector.
-    se Podrá optimizar? par que no sea O(n)?
-    """
-
-    closest_chunk = None
-    min_distance = float("inf")
-
-    for chunk in chunks_db:
-        chunk_vector = chunk.get("embedding")
-        if chunk_vector:
-            distance = np.linalg.norm(np.array(vector) - np.array(chunk_vector))
-            if distance < min_distance:
-                min_distance = distance
-                closest_chunk = chunk
-
-    return closest_chunk
-
-
-def embed_question(question: str) -> List[float]:
+def embed_question(question: str, timeout: int = 30) -> List[float]:
     """
     Genera embedding para una pregunta
-    Versión mejorada con manejo robusto de conexiones
+    Las consultas repetidas se resuelven desde el caché de embeddings
 
     Args:
         question: Pregunta a convertir en embedding
+        timeout: Segundos máximos de espera a la API
 
     Returns:
         List[float]: Embedding generado
     """
+    return query_embedding_cache.get_or_compute(
+        question, lambda text: _request_question_embedding(text, timeout)
+    )
+
+def _request_question_embedding(question: str, timeout: int = 30) -> List[float]:
+    """Pide a la API el embedding de una pregunta (sin caché)"""
     try:
         payload = {
             "input": question,
-            "model": "nomic-ai/nomic-embed-text-v1.5",
-            "dimensions": 768,
+            "model": EMBEDDING_CONFIG['model'],
+            "dimensions": EMBEDDING_CONFIG['dimensions'],
         }
         
         ai_logger.debug(f"Generando embedding para texto de {len(question)} caracteres")
-        response_data = make_api_request(url, payload, timeout=30)
+        response_data = make_api_request(url, payload, timeout=timeout)
         
         question_embedding = response_data["data"][0]["embedding"]
         ai_logger.debug("Embedding generado exitosamente")
@@ -319,58 +728,78 @@ def embed_question(question: str) -> List[float]:
         ai_logger.error(f"Error generando embedding: {str(e)}")
         return None
 
-def answer_general_question(pregunta: str) -> str:
+def build_general_answer_payload(pregunta: str) -> dict:
+    """Construye la petición al LLM para una pregunta general de diseño"""
+    prompt = (
+        "Como experto senior en UX/UI Design, responde de manera detallada y práctica:\n"
+        f"Pregunta: {pregunta}\n\n"
+        "Incluye cuando sea relevante:\n"
+        "- Principios de diseño fundamentales\n"
+        "- Mejores prácticas de UX/UI\n"
+        "- Herramientas recomendadas (Figma, Sketch, Adobe XD, etc.)\n"
+        "- Ejemplos de aplicación real\n"
+        "- Consideraciones de usabilidad y accesibilidad\n"
+        "- Tendencias actuales del diseño\n"
+        "Respuesta profesional (formato markdown):"
+    )
+
+    return {
+        "model": "accounts/fireworks/models/llama-v3p3-70b-instruct",
+        "messages": [
+            {
+                "role": "system",
+                "content": "Eres un diseñador UX/UI experto y mentor. Respondes con conocimiento profundo sobre experiencia de usuario, interfaces, usabilidad, accesibilidad y herramientas de diseño modernas.",
+            },
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": 0.3,
+        "max_tokens": 1500,
+        "top_p": 0.9,
+    }
+
+def request_general_answer(pregunta: str, on_text: Optional[Callable[[str], None]] = None) -> str:
+    """
+    Pide al LLM una respuesta especializada en UX/UI Design.
+
+    Args:
+        pregunta: La pregunta del usuario sobre diseño
+        on_text: Callback con el texto acumulado (activa el modo streaming)
+
+    Returns:
+        str: Respuesta del modelo (vacía si la API no devolvió contenido)
+
+    Raises:
+        IncompleteAnswerError: Si el stream se cortó a mitad de la respuesta
+        Exception: Si la petición a la API falla
+    """
+    payload = build_general_answer_payload(pregunta)
+
+    ai_logger.info("Generando respuesta general de diseño...")
+    return chat_completion(payload, timeout=45, on_text=on_text)
+
+def answer_general_question(pregunta: str, on_text: Optional[Callable[[str], None]] = None) -> str:
     """
     Genera una respuesta especializada en UX/UI Design para preguntas generales.
     Versión mejorada con manejo robusto de conexiones.
 
     Args:
         pregunta: La pregunta del usuario sobre diseño
+        on_text: Callback con el texto acumulado (activa el modo streaming)
 
     Returns:
         str: Respuesta especializada en UX/UI Design
     """
     try:
-        prompt = (
-            "Como experto senior en UX/UI Design, responde de manera detallada y práctica:\n"
-            f"Pregunta: {pregunta}\n\n"
-            "Incluye cuando sea relevante:\n"
-            "- Principios de diseño fundamentales\n"
-            "- Mejores prácticas de UX/UI\n"
-            "- Herramientas recomendadas (Figma, Sketch, Adobe XD, etc.)\n"
-            "- Ejemplos de aplicación real\n"
-            "- Consideraciones de usabilidad y accesibilidad\n"
-            "- Tendencias actuales del diseño\n"
-            "Respuesta profesional (formato markdown):"
-        )
+        answer = request_general_answer(pregunta, on_text=on_text)
 
-        payload = {
-            "model": "accounts/fireworks/models/llama-v3p3-70b-instruct",
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "Eres un diseñador UX/UI experto y mentor. Respondes con conocimiento profundo sobre experiencia de usuario, interfaces, usabilidad, accesibilidad y herramientas de diseño modernas.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            "temperature": 0.3,
-            "max_tokens": 1500,
-            "top_p": 0.9,
-        }
-
-        ai_logger.info("Generando respuesta general de diseño...")
-        response_data = make_api_request(url_llm, payload, timeout=45)
-
-        answer = (
-            response_data.get("choices", [{}])[0].get("message", {}).get("content", "")
-        )
-        
         if not answer:
             ai_logger.warning("Respuesta vacía de la API")
-            return "No se pudo generar una respuesta. Por favor, intenta reformular tu pregunta de diseño."
+            return EMPTY_GENERAL_ANSWER
             
         return answer
 
+    except IncompleteAnswerError as e:
+        return mark_incomplete(e.partial)
     except Exception as e:
         error_msg = f"⚠️ Error al generar respuesta para tu consulta de diseño: {str(e)}"
         ai_logger.error(error_msg)
@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+from constants import ANSWER_CACHE_CONFIG
+
+ProfileKey = Tuple[str, str, str]
+
+
+class SemanticAnswerCache:
+    """
+    Caché de respuestas del LLM por vecindad semántica de la pregunta.
+
+    Las respuestas se agrupan por perfil (command_type, expertise_level,
+    response_style); dentro de un perfil, una pregunta nueva reutiliza la
+    respuesta de la pregunta cacheada más parecida si su similitud coseno
+    supera `similarity_threshold`. Las entradas caducan tras `ttl_hours` y
+    el total se limita a `max_entries` con expulsión LRU.
+    """
+
+    def __init__(self, config: Dict[str, Any] = ANSWER_CACHE_CONFIG):
+        self.similarity_threshold = config['similarity_threshold']
+        self.ttl_seconds = config['ttl_hours'] * 3600
+        self.max_entries = config['max_entries']
+
+        # Entradas por perfil: clave -> (vector normalizado, pregunta, respuesta, creada)
+        self._profiles: Dict[ProfileKey, "OrderedDict[int, tuple]"] = {}
+        self._lru: "OrderedDict[int, ProfileKey]" = OrderedDict()
+        self._next_key = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _evict(self, key: int) -> None:
+        profile = self._lru.pop(key)
+        entries = self._profiles[profile]
+        entries.pop(key, None)
+        if not entries:
+            del self._profiles[profile]
+
+    def lookup(self, embedding, profile: ProfileKey) -> Optional[str]:
+        """
+        Busca una respuesta cacheada para una pregunta equivalente.
+
+        Args:
+            embedding: Embedding de la pregunta
+            profile: (command_type, expertise_level, response_style)
+
+        Returns:
+            str: Respuesta cacheada, o None si no hay ninguna suficientemente similar
+        """
+        vector = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            entries = self._profiles.get(profile)
+            if vector is None or not entries:
+                self.misses += 1
+                return None
+
+            for key in [key for key, entry in entries.items() if now - entry[3] >= self.ttl_seconds]:
+                self._evict(key)
+            entries = self._profiles.get(profile)
+            if not entries:
+                self.misses += 1
+                return None
+
+            keys = list(entries.keys())
+            similarities = np.stack([entries[key][0] for key in keys]) @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                self.misses += 1
+                return None
+
+            self._lru.move_to_end(keys[best])
+            self.hits += 1
+            return entries[keys[best]][2]
+
+    def store(self, embedding, profile: ProfileKey, question: str, answer: str) -> None:
+        """Guarda la respuesta generada para una pregunta y perfil"""
+        vector = self._normalize(embedding)
+        if vector is None or not answer:
+            return
+
+        with self._lock:
+            key = self._next_key
+            self._next_key += 1
+            self._profiles.setdefault(profile, OrderedDict())[key] = (
+                vector, question, answer, time.time()
+            )
+            self._lru[key] = profile
+            while len(self._lru) > self.max_entries:
+                self._evict(next(iter(self._lru)))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estadísticas de aciertos del caché"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups * 100) if lookups else 0.0,
+                'entries': len(self._lru),
+            }
@@ -0,0 +1,242 @@
+import asyncio
+import inspect
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+import aiohttp
+from logger import ai_logger
+from constants import EMBEDDING_CONFIG, RATE_LIMITER_CONFIG
+from ai_embedding.ai import (
+    NO_CONTEXT_ANSWER,
+    APIRequestError,
+    IncompleteAnswerError,
+    api_rate_limiter,
+    build_answer_payload,
+    build_general_answer_payload,
+    finish_answer,
+    headers,
+    mark_incomplete,
+    parse_retry_after,
+    parse_sse_line,
+    query_embedding_cache,
+    resolve_context_chunks,
+    url,
+    url_llm,
+)
+
+# Contrapartes asíncronas (aiohttp) de las llamadas de ai.py para el
+# runtime con AsyncTeleBot: comparten limitador, cachés y prompts con la
+# versión síncrona, pero una petición en vuelo no ocupa ningún hilo.
+
+TextCallback = Callable[[str], Union[None, Awaitable[None]]]
+
+# Errores del servidor reintentados con backoff, como en la sesión síncrona
+_SERVER_RETRY_STATUSES = (500, 502, 503, 504)
+_MAX_SERVER_RETRIES = 3
+
+_async_session: Optional[aiohttp.ClientSession] = None
+
+
+async def get_async_http_session() -> aiohttp.ClientSession:
+    """Retorna la sesión aiohttp compartida (ligada al event loop actual)"""
+    global _async_session
+
+    if _async_session is None or _async_session.closed:
+        _async_session = aiohttp.ClientSession(
+            headers=headers,
+            connector=aiohttp.TCPConnector(limit=100),
+        )
+        ai_logger.info("Sesión HTTP asíncrona configurada")
+    return _async_session
+
+
+async def close_async_http_session() -> None:
+    """Cierra la sesión aiohttp compartida (al apagar el bot)"""
+    global _async_session
+
+    if _async_session is not None and not _async_session.closed:
+        await _async_session.close()
+    _async_session = None
+
+
+async def make_api_request_async(url: str, payload: dict, timeout: int = 30, stream: bool = False):
+    """
+    Versión asíncrona de `make_api_request`, regulada por el mismo limitador
+
+    Con `stream=True` retorna la respuesta abierta, que sigue ocupando su
+    hueco del limitador; el llamante debe liberarla con `release_stream`.
+    """
+    session = await get_async_http_session()
+    # Igual que `timeout` en requests: límite de conexión y entre lecturas
+    client_timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+    throttled = 0
+    server_errors = 0
+
+    while True:
+        await api_rate_limiter.acquire_async()
+        status_code = None
+        retry_after = None
+        streaming = False
+        try:
+            response = await session.post(url, json=payload, timeout=client_timeout)
+            status_code = response.status
+            if status_code == 429:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                response.release()
+            elif status_code in _SERVER_RETRY_STATUSES and server_errors < _MAX_SERVER_RETRIES:
+                response.release()
+            elif status_code >= 400:
+                error_text = await response.text()
+                response.release()
+                ai_logger.error(f"Error HTTP {status_code}: {error_text}")
+                raise APIRequestError(f"Error del servidor de IA: {status_code}", status_code)
+            elif stream:
+                streaming = True
+                return response
+            else:
+                async with response:
+                    return await response.json()
+        except asyncio.TimeoutError:
+            ai_logger.error(f"Timeout en request a {url}")
+            raise APIRequestError("Timeout en la conexión con el servicio de IA")
+        except aiohttp.ClientConnectionError:
+            ai_logger.error(f"Error de conexión a {url}")
+            raise APIRequestError("Error de conexión con el servicio de IA")
+        finally:
+            if not streaming:
+                api_rate_limiter.release(status_code, retry_after)
+
+        if status_code == 429:
+            throttled += 1
+            if throttled > RATE_LIMITER_CONFIG['max_throttle_retries']:
+                ai_logger.error(f"Límite de la API persistente tras {throttled} intentos a {url}")
+                raise APIRequestError("Error del servidor de IA: 429", 429)
+        else:
+            server_errors += 1
+            await asyncio.sleep(2 ** (server_errors - 1))
+
+
+def release_stream(response: aiohttp.ClientResponse) -> None:
+    """Libera una respuesta de `make_api_request_async(stream=True)` y su hueco del limitador"""
+    try:
+        response.release()
+    finally:
+        api_rate_limiter.release(response.status)
+
+
+async def chat_completion_async(
+    payload: dict,
+    timeout: int = 45,
+    on_text: Optional[TextCallback] = None,
+) -> str:
+    """
+    Versión asíncrona de `chat_completion`.
+
+    `on_text` puede ser una función normal o una corrutina; en el segundo
+    caso se espera antes de leer el siguiente fragmento.
+
+    Raises:
+        IncompleteAnswerError: Si el stream se corta tras recibir texto
+    """
+    if on_text is None:
+        response_data = await make_api_request_async(url_llm, payload, timeout=timeout)
+        return response_data.get("choices", [{}])[0].get("message", {}).get("content", "")
+
+    response = await make_api_request_async(
+        url_llm, {**payload, "stream": True}, timeout=timeout, stream=True
+    )
+    parts = []
+    completed = False
+    try:
+        async for raw_line in response.content:
+            done, delta = parse_sse_line(raw_line.decode("utf-8").strip())
+            if delta:
+                parts.append(delta)
+                result = on_text("".join(parts))
+                if inspect.isawaitable(result):
+                    await result
+            if done:
+                completed = True
+                break
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        ai_logger.error(f"Streaming interrumpido tras {len(parts)} fragmentos: {str(e)}")
+    finally:
+        release_stream(response)
+
+    if not completed:
+        if not parts:
+            raise Exception("Error de conexión con el servicio de IA")
+        ai_logger.warning(f"Respuesta incompleta: el stream terminó tras {len(parts)} fragmentos")
+        raise IncompleteAnswerError("".join(parts))
+    return "".join(parts)
+
+
+async def embed_question_async(question: str, timeout: int = 30) -> Optional[List[float]]:
+    """
+    Versión asíncrona de `embed_question` (mismo caché de embeddings)
+
+    El caché bloquea (lock y SQLite en disco), así que se consulta en un hilo.
+    """
+    embedding = await asyncio.to_thread(query_embedding_cache.get, question)
+    if embedding is not None:
+        return embedding
+
+    try:
+        payload = {
+            "input": question,
+            "model": EMBEDDING_CONFIG['model'],
+            "dimensions": EMBEDDING_CONFIG['dimensions'],
+        }
+        response_data = await make_api_request_async(url, payload, timeout=timeout)
+        embedding = response_data["data"][0]["embedding"]
+    except Exception as e:
+        ai_logger.error(f"Error generando embedding: {str(e)}")
+        return None
+
+    await asyncio.to_thread(query_embedding_cache.put, question, embedding)
+    return embedding
+
+
+async def generate_answer_async(
+    question: str,
+    context_chunks: List[Dict[str, Any]] | List[int],
+    save_chunks: Optional[Dict[int, Dict[str, Any]]] = None,
+    model: str = "accounts/fireworks/models/llama-v3p3-70b-instruct",
+    on_text: Optional[TextCallback] = None,
+) -> tuple:
+    """Versión asíncrona de `generate_answer`"""
+    try:
+        processed_chunks = resolve_context_chunks(context_chunks, save_chunks)
+
+        if not processed_chunks:
+            return NO_CONTEXT_ANSWER, []
+
+        payload = build_answer_payload(question, processed_chunks, model)
+
+        ai_logger.info("Generando respuesta de IA...")
+        answer = await chat_completion_async(payload, timeout=45, on_text=on_text)
+
+        return finish_answer(answer, processed_chunks)
+
+    except IncompleteAnswerError as e:
+        return finish_answer(mark_incomplete(e.partial), processed_chunks)
+    except Exception as e:
+        ai_logger.error(f"Error generando respuesta: {str(e)}")
+        return (
+            f"⚠️ Error al generar respuesta para tu consulta de diseño: {str(e)}",
+            [],
+        )
+
+
+async def request_general_answer_async(
+    pregunta: str, on_text: Optional[TextCallback] = None
+) -> str:
+    """
+    Versión asíncrona de `request_general_answer`
+
+    Raises:
+        IncompleteAnswerError: Si el stream se cortó a mitad de la respuesta
+        Exception: Si la petición a la API falla
+    """
+    payload = build_general_answer_payload(pregunta)
+
+    ai_logger.info("Generando respuesta general de diseño...")
+    return await chat_completion_async(payload, timeout=45, on_text=on_text)
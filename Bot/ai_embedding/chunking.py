@@ -0,0 +1,282 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from constants import CHUNKING_CONFIG
+
+# (número de página, texto de la página)
+Page = Tuple[int, str]
+
+# Firma de los documentos del manifiesto anterior a la fragmentación configurable
+LEGACY_CHUNKER_SIGNATURE = "fixed:12500:500"
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?…])\s+")
+# "2.", "2.1", "II." seguidos del título; los años u otras cifras de 3+ dígitos no cuentan
+_NUMBERED_HEADING = re.compile(r"^(?:\d{1,2}(?:\.\d{1,2})*\.?|[IVXLC]+\.)\s+(\S)")
+_SENTENCE_END = (".", "!", "?", ":", "…")
+
+
+def chunker_signature(config: Dict[str, Any] = CHUNKING_CONFIG) -> str:
+    """
+    Identifica la configuración de fragmentación con la que se procesó un documento.
+
+    Se guarda en el manifiesto: si cambia, el documento se vuelve a
+    fragmentar y embeber en la siguiente ingesta.
+    """
+    if config['strategy'] == 'fixed':
+        return f"fixed:{config['fixed_block_chars']}:{config['fixed_overlap_chars']}"
+    return (
+        f"structured:{config['target_tokens']}:{config['max_tokens']}:"
+        f"{config['min_tokens']}:{config['overlap_tokens']}"
+    )
+
+
+def estimate_tokens(text: str, chars_per_token: float = CHUNKING_CONFIG['chars_per_token']) -> int:
+    return max(1, round(len(text) / chars_per_token))
+
+
+def is_heading(line: str, previous: Optional[str] = None, following: Optional[str] = None) -> bool:
+    """
+    Línea de título: corta, numerada ("2.1 Personas"), en mayúsculas o con "#" de Markdown
+
+    `extract_text()` devuelve las líneas cortadas como en la página, y una
+    línea de cuerpo cortada rara vez acaba en puntuación. Por eso un título
+    también exige que la línea anterior (`previous`, None si no hay o está
+    en blanco) cierre una frase y que la siguiente no continúe en minúscula.
+    """
+    line = line.strip()
+    if not line or len(line) > 80 or len(line.split()) > 10 or line[-1] in ".,;:":
+        return False
+    if previous and not previous.rstrip().endswith(_SENTENCE_END):
+        return False
+    if following and following.lstrip()[:1].islower():
+        return False
+    if line.startswith("#"):
+        return True
+    numbered = _NUMBERED_HEADING.match(line)
+    if numbered:
+        return numbered.group(1).isupper()
+    # Mayúsculas: al menos dos palabras, para no confundir siglas ("CMYK", "UX UI")
+    letters = [char for char in line if char.isalpha()]
+    return len(line.split()) >= 2 and len(letters) >= 6 and all(char.isupper() for char in letters)
+
+
+def split_fixed_blocks(
+    pages: List[Page], document: str, block_size: int = 12500, overlap: int = 500
+) -> List[Dict[str, Any]]:
+    """
+    Bloques de tamaño fijo con solapamiento (fragmentación anterior).
+
+    Args:
+        pages: Texto de cada página
+        document: Valor del campo "document" de los fragmentos
+        block_size: Tamaño aproximado de cada bloque en caracteres
+        overlap: Solapamiento entre bloques para mantener contexto
+
+    Returns:
+        list[dict]: Lista de bloques de texto con metadatos
+    """
+    full_text = ""
+    page_ranges = {}
+    for page_number, page_text in pages:
+        start_pos = len(full_text)
+        full_text += page_text + "\n\n"
+        page_ranges[page_number] = (start_pos, len(full_text))
+
+    blocks = []
+    text_length = len(full_text)
+    for i, start_pos in enumerate(range(0, text_length, block_size - overlap)):
+        end_pos = min(start_pos + block_size, text_length)
+        if end_pos <= start_pos:  # Evitar bloques vacíos al final
+            break
+
+        block_text = full_text[start_pos:end_pos]
+        if len(block_text.strip()) < 100:  # Ignorar bloques muy pequeños
+            continue
+
+        # Páginas con algún solapamiento con el bloque
+        block_pages = [
+            page_num for page_num, (page_start, page_end) in page_ranges.items()
+            if not (end_pos < page_start or start_pos > page_end)
+        ]
+        word_count = len(block_text.split())
+        blocks.append(
+            {
+                "chunk_id": f"Block-{i+1}",
+                "section_number": f"B{i+1}",
+                "header": f"Bloque de texto {i+1} (~{word_count} palabras)",
+                "content": block_text,
+                "text": block_text,
+                "document": document,
+                "pages": block_pages,
+                "type": "text_block",
+                "word_count": word_count,
+            }
+        )
+    return blocks
+
+
+class _PassageBuilder:
+    """Acumula párrafos hasta el tamaño objetivo y emite pasajes"""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.passages: List[Dict[str, Any]] = []
+        self.parts: List[str] = []
+        self.pages: List[int] = []
+        self.tokens = 0      # tokens nuevos (sin contar el solapamiento arrastrado)
+        self.header: Optional[str] = None
+
+    def _tokens(self, text: str) -> int:
+        return estimate_tokens(text, self.config['chars_per_token'])
+
+    def _overlap_tail(self) -> List[str]:
+        """Frases finales del pasaje hasta `overlap_tokens`"""
+        budget = self.config['overlap_tokens']
+        tail: List[str] = []
+        for sentence in reversed(_SENTENCE_BREAK.split(self.parts[-1])):
+            budget -= self._tokens(sentence)
+            if budget < 0:
+                break
+            tail.insert(0, sentence)
+        return [" ".join(tail)] if tail else []
+
+    def flush(self, overlap: bool = True) -> None:
+        if self.tokens == 0:
+            return
+        self.passages.append(
+            {"text": "\n\n".join(self.parts), "pages": sorted(set(self.pages)), "header": self.header}
+        )
+        self.parts = self._overlap_tail() if overlap else []
+        self.pages = self.pages[-1:] if self.parts else []
+        self.tokens = 0
+
+    def add_heading(self, text: str, page: int) -> None:
+        # Un título abre sección: cierra el pasaje salvo que sea demasiado corto
+        if self.tokens >= self.config['min_tokens']:
+            self.flush(overlap=False)
+        self.header = text.lstrip("#").strip()
+        self.add_text(text, page)
+
+    def add_text(self, text: str, page: int) -> None:
+        tokens = self._tokens(text)
+        if self.tokens and self.tokens + tokens > self.config['target_tokens'] \
+                and self.tokens >= self.config['min_tokens']:
+            self.flush()
+        self.parts.append(text)
+        self.pages.append(page)
+        self.tokens += tokens
+
+    def end_page(self) -> None:
+        if self.tokens >= self.config['min_tokens']:
+            self.flush(overlap=False)
+
+
+def _split_long(text: str, config: Dict[str, Any]) -> List[str]:
+    """Parte un párrafo mayor que `max_tokens` por frases (y por palabras si hace falta)"""
+    max_chars = config['max_tokens'] * config['chars_per_token']
+    target_chars = config['target_tokens'] * config['chars_per_token']
+    pieces: List[str] = []
+    current = ""
+    for sentence in _SENTENCE_BREAK.split(text):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if current and len(current) + len(sentence) + 1 > target_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current} {sentence}".strip()
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_passages(
+    pages: List[Page], document: str, config: Dict[str, Any] = CHUNKING_CONFIG
+) -> List[Dict[str, Any]]:
+    """
+    Fragmenta en pasajes respetando páginas, párrafos y títulos.
+
+    Los párrafos se agrupan hasta `target_tokens`; un título o un cambio
+    de página cierran el pasaje en curso si ya supera `min_tokens`, y los
+    párrafos mayores que `max_tokens` se parten por frases. Cada pasaje
+    empieza con las últimas frases del anterior (`overlap_tokens`) salvo
+    al abrir sección o página.
+
+    Returns:
+        list[dict]: Fragmentos con los mismos campos que `split_fixed_blocks`
+    """
+    builder = _PassageBuilder(config)
+    max_tokens = config['max_tokens']
+
+    def add_paragraph(lines: List[str], page_number: int) -> None:
+        text = " ".join(lines)
+        if estimate_tokens(text, config['chars_per_token']) > max_tokens:
+            for piece in _split_long(text, config):
+                builder.add_text(piece, page_number)
+        else:
+            builder.add_text(text, page_number)
+
+    for page_number, page_text in pages:
+        for block in _PARAGRAPH_BREAK.split(page_text):
+            paragraph: List[str] = []
+            lines = [line.strip() for line in block.splitlines() if line.strip()]
+            previous = None   # None: inicio de bloque o tras un título
+            for position, line in enumerate(lines):
+                following = lines[position + 1] if position + 1 < len(lines) else None
+                if is_heading(line, previous, following):
+                    if paragraph:
+                        add_paragraph(paragraph, page_number)
+                        paragraph = []
+                    builder.add_heading(line, page_number)
+                    previous = None
+                else:
+                    paragraph.append(line)
+                    previous = line
+            if paragraph:
+                add_paragraph(paragraph, page_number)
+        builder.end_page()
+    builder.flush(overlap=False)
+
+    passages = builder.passages
+    # Un último pasaje diminuto se une al anterior si cabe
+    if len(passages) > 1 and estimate_tokens(passages[-1]["text"], config['chars_per_token']) < config['min_tokens']:
+        last = passages.pop()
+        previous = passages[-1]
+        if estimate_tokens(previous["text"] + last["text"], config['chars_per_token']) <= max_tokens:
+            previous["text"] += "\n\n" + last["text"]
+            previous["pages"] = sorted(set(previous["pages"]) | set(last["pages"]))
+        else:
+            passages.append(last)
+
+    chunks = []
+    for i, passage in enumerate(passages, start=1):
+        text = passage["text"]
+        word_count = len(text.split())
+        chunks.append(
+            {
+                "chunk_id": f"Passage-{i}",
+                "section_number": f"P{i}",
+                "header": passage["header"] or f"Fragmento {i} (~{word_count} palabras)",
+                "content": text,
+                "text": text,
+                "document": document,
+                "pages": passage["pages"],
+                "type": "passage",
+                "word_count": word_count,
+            }
+        )
+    return chunks
+
+
+def split_document(
+    pages: List[Page], document: str, config: Dict[str, Any] = CHUNKING_CONFIG
+) -> List[Dict[str, Any]]:
+    """Fragmenta un documento con la estrategia configurada"""
+    if config['strategy'] == 'fixed':
+        return split_fixed_blocks(pages, document, config['fixed_block_chars'], config['fixed_overlap_chars'])
+    return split_passages(pages, document, config)
@@ -0,0 +1,173 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from logger import ai_logger
+from constants import EMBEDDING_CACHE_CONFIG, QUERY_EMBEDDING_CACHE_FILE
+
+
+def normalize_query_text(text: str) -> str:
+    """Normaliza una consulta para el caché: Unicode NFKC, minúsculas y espacios colapsados"""
+    return " ".join(unicodedata.normalize("NFKC", text).lower().split())
+
+
+class QueryEmbeddingCache:
+    """
+    Caché de embeddings de consultas: LRU en memoria respaldado por SQLite.
+
+    La clave es el modelo más el texto normalizado, así que "Design
+    Systems " y "design systems" comparten embedding y un cambio de modelo
+    nunca devuelve vectores antiguos. Las entradas caducan tras
+    `ttl_hours`; en disco se conservan como máximo `disk_entries`,
+    descartando las usadas hace más tiempo.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        path: str = QUERY_EMBEDDING_CACHE_FILE,
+        config: Dict[str, Any] = EMBEDDING_CACHE_CONFIG,
+    ):
+        self.model = model
+        self.path = path
+        self.memory_entries = config['memory_entries']
+        self.disk_entries = config['disk_entries']
+        self.ttl_seconds = config['ttl_hours'] * 3600
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._writes_since_prune = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self._db is None:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._db = sqlite3.connect(self.path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                    "key TEXT PRIMARY KEY, vector BLOB NOT NULL, "
+                    "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+                )
+                self._db.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_query_embeddings_last_used "
+                    "ON query_embeddings (last_used)"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                ai_logger.error(f"Caché de embeddings en disco no disponible: {e}")
+                self._db = None
+        return self._db
+
+    def _key(self, text: str) -> str:
+        normalized = normalize_query_text(text)
+        return hashlib.blake2b(
+            f"{self.model}\x00{normalized}".encode("utf-8"), digest_size=16
+        ).hexdigest()
+
+    def _remember(self, key: str, embedding: List[float], created_at: float) -> None:
+        self._memory[key] = (embedding, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, text: str) -> Optional[List[float]]:
+        """Retorna el embedding cacheado de la consulta, o None"""
+        key = self._key(text)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] < self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self._memory.pop(key, None)
+
+            db = self._connection()
+            if db is not None:
+                try:
+                    row = db.execute(
+                        "SELECT vector, created_at FROM query_embeddings WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None and now - row[1] < self.ttl_seconds:
+                        embedding = np.frombuffer(row[0], dtype=np.float32).tolist()
+                        db.execute(
+                            "UPDATE query_embeddings SET last_used = ? WHERE key = ?", (now, key)
+                        )
+                        db.commit()
+                        self._remember(key, embedding, row[1])
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return embedding
+                    if row is not None:
+                        db.execute("DELETE FROM query_embeddings WHERE key = ?", (key,))
+                        db.commit()
+                except sqlite3.Error as e:
+                    ai_logger.error(f"Error leyendo caché de embeddings: {e}")
+
+            self.misses += 1
+            return None
+
+    def put(self, text: str, embedding: List[float]) -> None:
+        """Guarda el embedding de una consulta en memoria y en disco"""
+        key = self._key(text)
+        now = time.time()
+        with self._lock:
+            self._remember(key, embedding, now)
+            db = self._connection()
+            if db is None:
+                return
+            try:
+                db.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (key, vector, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, np.asarray(embedding, dtype=np.float32).tobytes(), now, now),
+                )
+                self._writes_since_prune += 1
+                if self._writes_since_prune >= 100:
+                    self._prune(db, now)
+                db.commit()
+            except sqlite3.Error as e:
+                ai_logger.error(f"Error guardando caché de embeddings: {e}")
+
+    def _prune(self, db: sqlite3.Connection, now: float) -> None:
+        """Elimina entradas caducadas y las menos usadas por encima del límite"""
+        self._writes_since_prune = 0
+        db.execute("DELETE FROM query_embeddings WHERE created_at < ?", (now - self.ttl_seconds,))
+        db.execute(
+            "DELETE FROM query_embeddings WHERE key IN ("
+            "SELECT key FROM query_embeddings ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.disk_entries,),
+        )
+
+    def get_or_compute(
+        self, text: str, compute: Callable[[str], Optional[List[float]]]
+    ) -> Optional[List[float]]:
+        """Retorna el embedding cacheado o lo calcula con `compute` y lo guarda"""
+        embedding = self.get(text)
+        if embedding is not None:
+            return embedding
+        embedding = compute(text)
+        if embedding:
+            self.put(text, embedding)
+        return embedding
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estadísticas de aciertos del caché"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups * 100) if lookups else 0.0,
+                'memory_entries': len(self._memory),
+            }
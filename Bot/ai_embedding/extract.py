@@ -1,29 +1,35 @@
 import PyPDF2
-from sklearn.neighbors import NearestNeighbors
+import hashlib
+import json
 import numpy as np
 import os
-import pickle
 import time
-from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from logger import data_logger
 from ai_embedding.ai import generate_embeddings, embed_question
-from constants import EMBEDDINGS_FILE, INDEX_FILE, DOCUMENTS_FOLDER
-
-
-def save_data(file_path, data):
-    """Guarda datos en formato pickle."""
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    with open(file_path, "wb") as f:
-        pickle.dump(data, f)
-    data_logger.info(f"Datos guardados en {file_path}")
-
-
-def load_data(file_path):
-    """Carga datos desde un archivo pickle."""
-    with open(file_path, "rb") as f:
-        data = pickle.load(f)
-    data_logger.info(f"Datos cargados desde {file_path}")
-    return data
+from ai_embedding.vector_index import VectorIndex, LazyVectorIndex
+from ai_embedding.store import EmbeddingStore, assign_chunk_ids
+from ai_embedding.pipeline import IngestionPipeline
+from ai_embedding.chunking import (
+    LEGACY_CHUNKER_SIGNATURE, chunker_signature, split_document, split_fixed_blocks,
+)
+from constants import (
+    INDEX_FILE, DOCUMENTS_FOLDER, DOCUMENTS_MANIFEST_FILE, INGESTION_CONFIG, CHUNKING_CONFIG,
+)
+
+embedding_store = EmbeddingStore()
+
+
+def read_pdf_pages(pdf_file) -> List[Tuple[int, str]]:
+    """Texto de cada página con contenido de un PDF abierto en modo binario."""
+    reader = PyPDF2.PdfReader(pdf_file)
+    pages = []
+    for page_number, page in enumerate(reader.pages, start=1):
+        page_text = page.extract_text()
+        if page_text:
+            pages.append((page_number, page_text))
+    return pages
 
 
 def extract_text_blocks_from_pdf(
@@ -42,57 +48,7 @@ def extract_text_blocks_from_pdf(
         list[dict]: Lista de bloques de texto con metadatos.
     """
     try:
-        reader = PyPDF2.PdfReader(pdf_file)
-        blocks = []
-        full_text = ""
-        page_ranges = {}
-
-        # Extraer todo el texto primero y rastrear rangos de páginas
-        for page_number, page in enumerate(reader.pages, start=1):
-            page_text = page.extract_text()
-            if page_text:
-                start_pos = len(full_text)
-                full_text += page_text + "\n\n"
-                end_pos = len(full_text)
-                page_ranges[page_number] = (start_pos, end_pos)
-
-        # Dividir el texto en bloques superpuestos
-        text_length = len(full_text)
-        start_positions = list(range(0, text_length, block_size - overlap))
-
-        for i, start_pos in enumerate(start_positions):
-            end_pos = min(start_pos + block_size, text_length)
-            if end_pos <= start_pos:  # Evitar bloques vacíos al final
-                break
-
-            block_text = full_text[start_pos:end_pos]
-            if len(block_text.strip()) < 100:  # Ignorar bloques muy pequeños
-                continue
-
-            # Determinar en qué páginas aparece este bloque
-            block_pages = []
-            for page_num, (page_start, page_end) in page_ranges.items():
-                # Si hay algún solapamiento entre el bloque y la página
-                if not (end_pos < page_start or start_pos > page_end):
-                    block_pages.append(page_num)
-
-            # Contar palabras aproximadas (para información)
-            word_count = len(block_text.split())
-
-            blocks.append(
-                {
-                    "chunk_id": f"Block-{i+1}",
-                    "section_number": f"B{i+1}",  # Identificador de bloque
-                    "header": f"Bloque de texto {i+1} (~{word_count} palabras)",
-                    "content": block_text,
-                    "text": block_text,
-                    "document": pdf_file.name,
-                    "pages": block_pages,
-                    "type": "text_block",
-                    "word_count": word_count,
-                }
-            )
-
+        blocks = split_fixed_blocks(read_pdf_pages(pdf_file), pdf_file.name, block_size, overlap)
         data_logger.info(
             f"Se extrajeron {len(blocks)} bloques de texto de {pdf_file.name}"
         )
@@ -105,11 +61,45 @@ def extract_text_blocks_from_pdf(
         raise
 
 
+def extract_chunks_from_pdf(
+    pdf_file, config: Dict[str, Any] = CHUNKING_CONFIG
+) -> List[Dict[str, Any]]:
+    """
+    Extrae los fragmentos de un PDF con la estrategia de CHUNKING_CONFIG.
+
+    'structured' corta en pasajes de ~`target_tokens` respetando páginas,
+    párrafos y títulos; 'fixed' reproduce los bloques de tamaño fijo.
+
+    Args:
+        pdf_file (file object): Archivo PDF abierto en modo binario.
+        config (dict): Configuración de fragmentación.
+
+    Returns:
+        list[dict]: Lista de fragmentos con metadatos.
+    """
+    try:
+        chunks = split_document(read_pdf_pages(pdf_file), pdf_file.name, config)
+        data_logger.info(
+            f"Se extrajeron {len(chunks)} fragmentos ({config['strategy']}) de {pdf_file.name}"
+        )
+        return chunks
+
+    except Exception as e:
+        data_logger.error(
+            f"Error al extraer fragmentos del documento {pdf_file.name}: {e}"
+        )
+        raise
+
+
 def process_documents() -> (
-    Tuple[Optional[NearestNeighbors], Optional[List[Dict[str, Any]]]]
+    Tuple[Optional[LazyVectorIndex], Optional[List[Dict[str, Any]]]]
 ):
     """
-    Procesa documentos y genera embeddings utilizando bloques de texto fijos.
+    Procesa documentos y genera embeddings de sus fragmentos (ver CHUNKING_CONFIG).
+
+    Solo se extraen y embeben los PDFs nuevos o modificados según el
+    manifiesto; los fragmentos de PDFs modificados o eliminados se quitan
+    del almacén y del índice.
 
     Returns:
         Tuple: (modelo de índice, fragmentos procesados)
@@ -145,121 +135,297 @@ def process_documents() -> (
         data_logger.info(
             "No se encontraron datos existentes, comenzando procesamiento desde cero"
         )
+    existing_chunks = existing_chunks or []
 
-    # Procesar nuevos documentos
-    data_logger.info(f"Verificando {len(pdf_files)} archivos PDF para procesamiento...")
-    new_chunks = get_new_chunks(pdf_files, existing_chunks)
+    # Detectar documentos nuevos, modificados y eliminados
+    data_logger.info(f"Verificando {len(pdf_files)} archivos PDF contra el manifiesto...")
+    manifest = load_manifest() if index is not None else {}
+    changed_files, stale_documents, manifest = detect_document_changes(
+        pdf_files, existing_chunks, manifest
+    )
 
-    if new_chunks:
-        data_logger.info(
-            f"Se encontraron {len(new_chunks)} nuevos fragmentos para procesar"
-        )
-        data_logger.info("Iniciando generación de embeddings para nuevos fragmentos...")
-        embedding_start = time.time()
-        generate_embeddings(new_chunks)
-        embedding_time = time.time() - embedding_start
-        data_logger.info(
-            f"Generación de embeddings completada en {embedding_time:.2f} segundos"
-        )
+    for document in stale_documents:
+        existing_chunks = remove_document_chunks(document, index, existing_chunks)
+
+    if changed_files:
+        if index is None:
+            # Almacén nuevo: se crea vacío y se amplía lote a lote
+            embedding_store.save([])
+            existing_chunks, index = embedding_store.load()
+
+        def write_batch(batch: List[Dict[str, Any]]) -> None:
+            ids, vectors = embedding_store.append(batch)
+            index.add(ids, vectors, normalized=True)
+
+        # Extracción, embeddings y escritura solapadas con colas acotadas
+        pipeline = IngestionPipeline(iter_new_chunks, generate_embeddings, write_batch)
+        new_chunks, failed_files = pipeline.run(changed_files)
+
+        # Documentos con fragmentos guardados sin embedding (p. ej. la API cayó a mitad de la ingesta)
+        incomplete_files = sorted({
+            chunk["document"] for chunk in new_chunks
+            if chunk.get("text") and "embedding" not in chunk
+        })
+        if incomplete_files:
+            data_logger.warning(
+                f"{len(incomplete_files)} documentos quedaron con fragmentos sin embedding; "
+                "se reprocesarán en la próxima ejecución"
+            )
 
-        # Actualizar índice con los nuevos fragmentos
-        all_chunks = (existing_chunks or []) + new_chunks
-        data_logger.info(
-            f"Creando índice vectorial con {len(all_chunks)} fragmentos totales..."
-        )
-        index_start = time.time()
-        index, all_chunks = create_vector_store_sklearn(all_chunks)
-        index_time = time.time() - index_start
-        data_logger.info(f"Índice vectorial creado en {index_time:.2f} segundos")
-
-        # Guardar datos actualizados
-        save_start = time.time()
-        data_logger.info("Guardando datos procesados en disco...")
-        save_data(EMBEDDINGS_FILE, all_chunks)
-        save_data(INDEX_FILE, index)
-        save_time = time.time() - save_start
-        data_logger.info(f"Datos guardados en {save_time:.2f} segundos")
+        # Sin entrada en el manifiesto, los archivos fallidos o incompletos se reintentan
+        # en la próxima ejecución (sus fragmentos actuales se eliminan como obsoletos)
+        for pdf_path in failed_files + incomplete_files:
+            manifest.pop(os.path.relpath(pdf_path, DOCUMENTS_FOLDER), None)
 
+        save_manifest(manifest)
         total_time = time.time() - start_time
         data_logger.info(
-            f"=== PROCESAMIENTO COMPLETADO EN {total_time:.2f} SEGUNDOS ==="
+            f"=== PROCESAMIENTO COMPLETADO EN {total_time:.2f} SEGUNDOS "
+            f"({len(new_chunks)} NUEVOS FRAGMENTOS) ==="
         )
-        return index, all_chunks
+        return index, existing_chunks + new_chunks
 
-    data_logger.info("No hay nuevos documentos para procesar")
+    save_manifest(manifest)
     total_time = time.time() - start_time
-    data_logger.info(
-        f"=== PROCESAMIENTO COMPLETADO EN {total_time:.2f} SEGUNDOS (SIN CAMBIOS) ==="
-    )
+    if stale_documents:
+        data_logger.info(
+            f"=== PROCESAMIENTO COMPLETADO EN {total_time:.2f} SEGUNDOS "
+            f"({len(stale_documents)} DOCUMENTOS ELIMINADOS) ==="
+        )
+    else:
+        data_logger.info("No hay nuevos documentos para procesar")
+        data_logger.info(
+            f"=== PROCESAMIENTO COMPLETADO EN {total_time:.2f} SEGUNDOS (SIN CAMBIOS) ==="
+        )
     return index, existing_chunks
 
 
-def get_new_chunks(
+def file_content_hash(path: str, block_size: int = 1 << 20) -> str:
+    """Hash del contenido de un archivo, leído por bloques."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest() -> Dict[str, Dict[str, Any]]:
+    """Carga el manifiesto de documentos procesados (ruta relativa -> firma)."""
+    if not os.path.exists(DOCUMENTS_MANIFEST_FILE):
+        return {}
+    try:
+        with open(DOCUMENTS_MANIFEST_FILE, "r", encoding="utf-8") as f:
+            return json.load(f).get("documents", {})
+    except Exception as e:
+        data_logger.error(f"Error cargando manifiesto de documentos: {e}")
+        return {}
+
+
+def save_manifest(manifest: Dict[str, Dict[str, Any]]) -> None:
+    """Guarda el manifiesto de forma atómica."""
+    os.makedirs(os.path.dirname(DOCUMENTS_MANIFEST_FILE), exist_ok=True)
+    tmp_path = DOCUMENTS_MANIFEST_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"documents": manifest}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, DOCUMENTS_MANIFEST_FILE)
+
+
+def detect_document_changes(
     pdf_files: List[str],
-    existing_chunks: Optional[List[Dict[str, Any]]],
-) -> List[Dict[str, Any]]:
+    existing_chunks: List[Dict[str, Any]],
+    manifest: Dict[str, Dict[str, Any]],
+) -> Tuple[List[str], List[str], Dict[str, Dict[str, Any]]]:
     """
-    Identifica y procesa nuevos documentos no procesados.
+    Compara los PDFs de la carpeta con el manifiesto.
+
+    El manifiesto se indexa por ruta relativa a DOCUMENTS_FOLDER y guarda
+    tamaño, mtime y hash de contenido de cada archivo. El hash solo se
+    calcula cuando cambian el tamaño o el mtime, y un archivo solo se
+    reprocesa si su contenido cambió de verdad o si se fragmentó con otra
+    configuración (firma "chunker"; las entradas sin ella son bloques fijos
+    de 12.500 caracteres). Así un almacén existente migra a la nueva
+    fragmentación documento a documento en la siguiente ingesta.
 
     Args:
-        pdf_files: Lista de rutas a archivos PDF
+        pdf_files: Rutas a los PDFs actuales
         existing_chunks: Fragmentos ya procesados
+        manifest: Manifiesto cargado (vacío si no existe)
+
+    Returns:
+        Tuple: (PDFs a procesar, valores "document" cuyos fragmentos sobran, manifiesto nuevo)
     """
     start_time = time.time()
-    data_logger.info("Iniciando búsqueda de nuevos documentos...")
+    processed_docs = {chunk.get("document") for chunk in existing_chunks if chunk.get("document")}
+    # Fragmentos de versiones sin manifiesto: se asocian por ruta completa o nombre de archivo.
+    # Un manifiesto guardado pero vacío no es heredado: sus documentos se sacaron para reprocesarlos
+    legacy_docs: Dict[str, List[str]] = {}
+    if not manifest and not os.path.exists(DOCUMENTS_MANIFEST_FILE):
+        for doc in processed_docs:
+            legacy_docs.setdefault(os.path.basename(doc), []).append(doc)
+
+    chunker = chunker_signature()
+    changed_files = []
+    rechunked = 0
+    kept_documents = set()
+    new_manifest = {}
 
-    # Crear set de documentos ya procesados para búsqueda más eficiente
-    processed_docs = set()
-    if existing_chunks:
-        for chunk in existing_chunks:
-            doc_name = chunk.get("document")
-            if doc_name:
-                base_name = os.path.basename(doc_name)
-                processed_docs.add(base_name)
-        data_logger.info(
-            f"Se encontraron {len(processed_docs)} documentos ya procesados"
-        )
+    for pdf_path in pdf_files:
+        relative_path = os.path.relpath(pdf_path, DOCUMENTS_FOLDER)
+        stat = os.stat(pdf_path)
+        entry = manifest.get(relative_path)
+
+        candidates = legacy_docs.get(os.path.basename(pdf_path))
+        if entry is None and candidates:
+            document = pdf_path if pdf_path in candidates else candidates[0]
+            candidates.remove(document)
+            entry = {"document": document, "size": None, "mtime_ns": None, "hash": None}
+
+        rechunk = bool(entry) and entry.get("chunker", LEGACY_CHUNKER_SIGNATURE) != chunker
+        if rechunk:
+            data_logger.info(
+                f"Documento con fragmentación anterior ({entry.get('chunker', LEGACY_CHUNKER_SIGNATURE)}): "
+                f"{relative_path}"
+            )
+            rechunked += 1
+            entry = None
 
-    new_chunks = []
-    new_docs_count = 0
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            new_manifest[relative_path] = entry
+            kept_documents.add(entry["document"])
+            continue
 
-    # Procesar solo documentos nuevos
-    for pdf_path in pdf_files:
-        base_name = os.path.basename(pdf_path)
-        if base_name in processed_docs:
-            data_logger.debug(f"Documento ya procesado (omitido): {base_name}")
+        content_hash = file_content_hash(pdf_path)
+        signature = {
+            "document": pdf_path,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "hash": content_hash,
+            "chunker": chunker,
+        }
+
+        if entry and entry["hash"] in (None, content_hash):
+            # Mismo contenido (o documento heredado sin hash): solo se actualiza la firma
+            signature["document"] = entry["document"]
+            new_manifest[relative_path] = signature
+            kept_documents.add(entry["document"])
             continue
 
-        try:
-            new_docs_count += 1
-            data_logger.info(
-                f"Procesando nuevo documento [{new_docs_count}/{len(pdf_files) - len(processed_docs)}]: {base_name}"
-            )
-            with open(pdf_path, "rb") as f:
-                chunks = extract_text_blocks_from_pdf(f)
-                new_chunks.extend(chunks)
-                data_logger.info(f"Añadidos {len(chunks)} bloques de {base_name}")
-        except Exception as e:
-            data_logger.error(f"Error procesando {base_name}: {str(e)}")
+        if entry:
+            data_logger.info(f"Documento modificado: {relative_path}")
+        elif not rechunk:
+            data_logger.info(f"Documento nuevo: {relative_path}")
+        changed_files.append(pdf_path)
+        new_manifest[relative_path] = signature
+
+    for relative_path in manifest:
+        if relative_path not in new_manifest:
+            data_logger.info(f"Documento eliminado: {relative_path}")
+
+    # Todo fragmento cuyo documento no sigue vigente sobra: modificados, eliminados,
+    # y restos de una ingesta interrumpida antes de guardar el manifiesto
+    stale_documents = sorted(processed_docs - kept_documents)
 
     elapsed_time = time.time() - start_time
     data_logger.info(
-        f"Procesamiento completado: {len(new_chunks)} nuevos chunks de {new_docs_count} documentos en {elapsed_time:.2f} segundos"
+        f"Cambios detectados en {elapsed_time:.2f} segundos: {len(changed_files)} por procesar "
+        f"({rechunked} por cambio de fragmentación), {len(stale_documents)} con fragmentos obsoletos"
+    )
+    return changed_files, stale_documents, new_manifest
+
+
+def _extract_document(pdf_path: str) -> List[Dict[str, Any]]:
+    """Extrae los fragmentos de un PDF por ruta (ejecutable en un proceso del pool)."""
+    with open(pdf_path, "rb") as f:
+        return extract_chunks_from_pdf(f)
+
+
+def iter_new_chunks(
+    pdf_files: List[str], workers: Optional[int] = None
+) -> Iterator[Tuple[str, Optional[List[Dict[str, Any]]]]]:
+    """
+    Extrae los documentos indicados y entrega los fragmentos de cada uno al terminarlo.
+
+    La extracción de texto es CPU-bound, así que con más de un worker se
+    reparte entre procesos (`ProcessPoolExecutor`) y los documentos se
+    entregan en orden de finalización; el consumidor puede empezar a
+    embeber mientras el resto sigue extrayéndose.
+
+    Args:
+        pdf_files: Rutas a los PDFs nuevos o modificados
+        workers: Procesos de extracción (por defecto INGESTION_CONFIG['extraction_workers'])
+
+    Yields:
+        Tuple: (ruta del PDF, fragmentos extraídos o None si falló)
+    """
+    if not pdf_files:
+        return
+    if workers is None:
+        workers = INGESTION_CONFIG["extraction_workers"]
+    workers = max(1, min(workers, len(pdf_files)))
+    data_logger.info(
+        f"Extrayendo texto de {len(pdf_files)} documentos con {workers} proceso(s)..."
     )
-    return new_chunks
+
+    if workers == 1:
+        for pdf_path in pdf_files:
+            try:
+                yield pdf_path, _extract_document(pdf_path)
+            except Exception as e:
+                data_logger.error(f"Error procesando {os.path.basename(pdf_path)}: {str(e)}")
+                yield pdf_path, None
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_extract_document, pdf_path): pdf_path
+            for pdf_path in pdf_files
+        }
+        for future in as_completed(futures):
+            pdf_path = futures[future]
+            try:
+                yield pdf_path, future.result()
+            except Exception as e:
+                data_logger.error(f"Error procesando {os.path.basename(pdf_path)}: {str(e)}")
+                yield pdf_path, None
+
+
+def get_new_chunks(
+    pdf_files: List[str], workers: Optional[int] = None
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Extrae los fragmentos de los documentos indicados.
+
+    Args:
+        pdf_files: Lista de rutas a archivos PDF nuevos o modificados
+        workers: Procesos de extracción (ver `iter_new_chunks`)
+
+    Returns:
+        Tuple: (fragmentos extraídos, rutas que no se pudieron procesar)
+    """
+    new_chunks = []
+    failed_files = []
+    for pdf_path, chunks in iter_new_chunks(pdf_files, workers):
+        if chunks is None:
+            failed_files.append(pdf_path)
+        else:
+            new_chunks.extend(chunks)
+    return new_chunks, failed_files
 
 
 def create_vector_store_sklearn(chunks_to_index, new_chunks=None):
     """
-    Crea un índice vectorial para búsqueda rápida usando sklearn.
+    Crea un índice vectorial de similitud coseno sobre los embeddings.
 
     Args:
         chunks_to_index: Lista completa de fragmentos
         new_chunks: Nuevos fragmentos (parámetro opcional, para compatibilidad)
 
     Returns:
-        Tuple: (modelo de vecinos más cercanos, lista de chunks indexados)
+        Tuple: (índice vectorial, lista de chunks indexados)
     """
+    # Cada fila del índice referencia su chunk por id, no por posición
+    assign_chunk_ids(chunks_to_index)
+
     # Filtrar solo los chunks que tienen embedding
     indexable_chunks = []
     for chunk in chunks_to_index:
@@ -274,29 +440,35 @@ def create_vector_store_sklearn(chunks_to_index, new_chunks=None):
         data_logger.error("No hay fragmentos con embeddings para indexar")
         return None, chunks_to_index
 
-    # Convertir embeddings a matriz numpy
-    embeddings = np.array([chunk["embedding"] for chunk in indexable_chunks])
+    # Convertir embeddings a matriz numpy contigua
+    embeddings = np.array(
+        [chunk["embedding"] for chunk in indexable_chunks], dtype=np.float32
+    )
 
-    # Crear y entrenar modelo de vecinos más cercanos
     data_logger.info(f"Creando índice con {len(indexable_chunks)} vectores")
     try:
-        nbrs = NearestNeighbors(
-            n_neighbors=min(5, len(indexable_chunks)), algorithm="ball_tree"
-        ).fit(embeddings)
-        return nbrs, chunks_to_index
+        index = VectorIndex(
+            embeddings, ids=[chunk["id"] for chunk in indexable_chunks]
+        )
+        return index, chunks_to_index
     except Exception as e:
         data_logger.error(f"Error creando índice vectorial: {e}")
         return None, chunks_to_index
 
 
+def build_chunk_lookup(chunks: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """Construye el diccionario id -> fragmento usado para resolver resultados."""
+    return {chunk["id"]: chunk for chunk in chunks if "id" in chunk}
+
+
 def search_similar_chunks_sklearn(question, index_model, chunks, top_k=5):
     """
     Busca fragmentos similares a una pregunta usando el índice vectorial.
 
     Args:
         question: Pregunta o texto de búsqueda (string o embedding)
-        index_model: Modelo de vecinos más cercanos
-        chunks: Lista completa de fragmentos
+        index_model: Índice vectorial (VectorIndex)
+        chunks: Diccionario id -> fragmento (o lista completa de fragmentos)
         top_k: Número de resultados a retornar
 
     Returns:
@@ -315,22 +487,19 @@ def search_similar_chunks_sklearn(question, index_model, chunks, top_k=5):
     else:
         question_embedding = question  # Ya es un embedding
 
-    # Asegurar formato correcto para la búsqueda
-    question_embedding = np.array(question_embedding).reshape(1, -1)
+    # Con una lista hay que construir el mapa en cada llamada; mejor pasar el diccionario
+    chunks_by_id = chunks if isinstance(chunks, dict) else build_chunk_lookup(chunks)
 
-    # Realizar búsqueda de vecinos más cercanos
+    # Realizar búsqueda por similitud coseno
     try:
-        # Limitar top_k al número de vecinos del modelo
-        actual_k = min(top_k, index_model.n_neighbors)
-        distances, indices = index_model.kneighbors(
-            question_embedding, n_neighbors=actual_k
-        )
+        chunk_ids, scores = index_model.search(question_embedding, top_k=top_k)
 
-        # Extraer resultados
+        # Extraer resultados por id de chunk
         results = []
-        for idx in indices[0]:
-            if idx < len(chunks):
-                results.append(chunks[idx])
+        for chunk_id in chunk_ids:
+            chunk = chunks_by_id.get(int(chunk_id))
+            if chunk is not None:
+                results.append(chunk)
 
         data_logger.info(f"Búsqueda completada: {len(results)} resultados encontrados")
         return results
@@ -340,19 +509,52 @@ def search_similar_chunks_sklearn(question, index_model, chunks, top_k=5):
 
 
 def load_existing_data() -> (
-    Tuple[Optional[List[Dict[str, Any]]], Optional[NearestNeighbors]]
+    Tuple[Optional[List[Dict[str, Any]]], Optional[LazyVectorIndex]]
 ):
-    """Carga datos existentes de embeddings e índice."""
+    """Carga datos existentes de embeddings; el índice se construye en la primera búsqueda."""
     try:
-        if os.path.exists(EMBEDDINGS_FILE) and os.path.exists(INDEX_FILE):
+        # Migración única desde el pickle antiguo de embeddings
+        embedding_store.migrate_legacy_pickle()
+
+        # El índice ya no se serializa: descartar el pickle de versiones anteriores
+        if os.path.exists(INDEX_FILE):
+            data_logger.info(f"Eliminando índice serializado obsoleto: {INDEX_FILE}")
+            os.remove(INDEX_FILE)
+
+        if embedding_store.exists():
             data_logger.info("Cargando datos existentes...")
-            return load_data(EMBEDDINGS_FILE), load_data(INDEX_FILE)
+            return embedding_store.load()
     except Exception as e:
         data_logger.error(f"Error cargando datos existentes: {e}")
 
     return None, None
 
 
+def remove_document_chunks(
+    document: str,
+    index_model: Optional[LazyVectorIndex],
+    chunks: List[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """
+    Elimina los fragmentos de un documento del almacén y del índice.
+
+    Args:
+        document: Valor del campo "document" de los fragmentos
+        index_model: Índice vectorial a actualizar
+        chunks: Fragmentos actuales
+
+    Returns:
+        list: Fragmentos restantes
+    """
+    removed_ids = set(embedding_store.remove(document))
+    if not removed_ids:
+        return chunks
+
+    if index_model is not None:
+        index_model.remove(removed_ids)
+    return [chunk for chunk in chunks if chunk.get("id") not in removed_ids]
+
+
 def find_pdf_files(folder: str) -> List[str]:
     """Encuentra archivos PDF en la carpeta especificada y subcarpetas."""
     pdf_files = []
@@ -0,0 +1,155 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional, Tuple
+from logger import data_logger
+from ai_embedding.ai import embed_question
+from ai_embedding.async_ai import embed_question_async
+from ai_embedding.extract import search_similar_chunks_sklearn
+from ai_embedding.lexical_index import reciprocal_rank_fusion
+from constants import HYBRID_SEARCH_CONFIG
+
+
+class HybridSearcher:
+    """
+    Recuperación híbrida: BM25 sobre el texto de los chunks + búsqueda vectorial.
+
+    Con ambos resultados se fusionan con reciprocal rank fusion. Si el
+    embedding de la consulta no llega (API caída o más lenta que
+    `embedding_timeout_seconds` en total, contando esperas del limitador
+    y reintentos) se responde solo con BM25, y durante
+    `embedding_cooldown_seconds` las búsquedas siguientes no vuelven a
+    esperar a la API. En modo 'lexical' nunca se pide el embedding.
+    """
+
+    def __init__(self, config: Dict[str, Any] = HYBRID_SEARCH_CONFIG):
+        self.mode = config['mode']
+        self.candidates = config['candidates']
+        self.rrf_k = config['rrf_k']
+        self.embedding_timeout = config['embedding_timeout_seconds']
+        self.cooldown = config['embedding_cooldown_seconds']
+
+        self._lock = threading.Lock()
+        # Hilos para imponer el plazo total al embedding síncrono; una petición
+        # que lo supera termina en segundo plano (y su resultado llega al caché)
+        self._embedding_executor = ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix="query-embedding"
+        )
+        self._embeddings_down_until = 0.0
+        self.searches = {'hybrid': 0, 'vector': 0, 'lexical': 0}
+        self.embedding_failures = 0
+
+    def use_embeddings(self) -> bool:
+        """Indica si esta búsqueda debe pedir el embedding de la consulta"""
+        if self.mode == 'lexical':
+            return False
+        with self._lock:
+            return time.monotonic() >= self._embeddings_down_until
+
+    def embedding_failed(self) -> None:
+        """Registra un fallo o timeout del embedding y activa el modo solo léxico temporal"""
+        with self._lock:
+            self.embedding_failures += 1
+            if self.mode != 'vector':
+                self._embeddings_down_until = time.monotonic() + self.cooldown
+        data_logger.warning(
+            f"Embedding de consulta no disponible; búsquedas solo léxicas durante {self.cooldown}s"
+        )
+
+    def embed_query(self, query: str) -> Optional[List[float]]:
+        """
+        Embedding de la consulta con un plazo total de `embedding_timeout_seconds`
+
+        Returns:
+            El embedding, o None si no se pide (modo léxico o enfriamiento), falla o vence el plazo
+        """
+        if not self.use_embeddings():
+            return None
+        future = self._embedding_executor.submit(embed_question, query, self.embedding_timeout)
+        try:
+            embedding = future.result(timeout=self.embedding_timeout) or None
+        except FutureTimeoutError:
+            embedding = None
+        if embedding is None:
+            self.embedding_failed()
+        return embedding
+
+    async def embed_query_async(self, query: str) -> Optional[List[float]]:
+        """Versión asíncrona de `embed_query` (mismo plazo total)"""
+        if not self.use_embeddings():
+            return None
+        try:
+            embedding = await asyncio.wait_for(
+                embed_question_async(query, timeout=self.embedding_timeout), self.embedding_timeout
+            ) or None
+        except asyncio.TimeoutError:
+            embedding = None
+        if embedding is None:
+            self.embedding_failed()
+        return embedding
+
+    def lexical_available(self, knowledge) -> bool:
+        """Indica si la instantánea puede buscarse sin embedding"""
+        return self.mode != 'vector' and knowledge.lexical_index is not None
+
+    def search(
+        self,
+        query: str,
+        question_embedding: Optional[List[float]],
+        knowledge,
+        top_k: int = 5,
+    ) -> Tuple[List[Dict[str, Any]], str]:
+        """
+        Busca en una instantánea de la base de conocimiento
+
+        Args:
+            query: Texto de la consulta (para BM25)
+            question_embedding: Embedding de la consulta, o None si no está disponible
+            knowledge: KnowledgeSnapshot con índice vectorial, índice léxico y chunks
+            top_k: Número de resultados
+
+        Returns:
+            Tuple: (chunks ordenados por relevancia, modo usado: 'hybrid', 'vector' o 'lexical')
+        """
+        rankings = []
+        vector_ids: List[int] = []
+        if question_embedding is not None and knowledge.index_model is not None:
+            vector_chunks = search_similar_chunks_sklearn(
+                question_embedding, knowledge.index_model, knowledge.chunks_by_id, top_k=self.candidates
+            )
+            vector_ids = [chunk["id"] for chunk in vector_chunks]
+            rankings.append(vector_ids)
+
+        lexical_ids: List[int] = []
+        if self.lexical_available(knowledge):
+            lexical_ids = [chunk_id for chunk_id, _ in knowledge.lexical_index.search(query, self.candidates)]
+            rankings.append(lexical_ids)
+
+        if vector_ids and lexical_ids:
+            mode = 'hybrid'
+            ranked_ids = reciprocal_rank_fusion(rankings, self.rrf_k)
+        elif vector_ids:
+            mode, ranked_ids = 'vector', vector_ids
+        else:
+            mode, ranked_ids = 'lexical', lexical_ids
+
+        with self._lock:
+            self.searches[mode] += 1
+
+        results = []
+        for chunk_id in ranked_ids[:top_k]:
+            chunk = knowledge.chunks_by_id.get(chunk_id)
+            if chunk is not None:
+                results.append(chunk)
+        data_logger.info(f"Búsqueda {mode}: {len(results)} resultados")
+        return results, mode
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'searches': dict(self.searches),
+                'embedding_failures': self.embedding_failures,
+                'lexical_only': time.monotonic() < self._embeddings_down_until,
+            }
@@ -0,0 +1,216 @@
+import heapq
+import json
+import math
+import os
+import re
+import unicodedata
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from logger import data_logger
+from constants import HYBRID_SEARCH_CONFIG, LEXICAL_INDEX_FILE
+
+LEXICAL_INDEX_VERSION = 1
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Palabras vacías en español e inglés (no aportan a la puntuación)
+STOP_WORDS = frozenset(
+    "a al como con de del el en es la las lo los mas o para pero por que se sin su sus un una uno y "
+    "an and are as at be by for from how in is it of on or the this to what with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Minúsculas sin tildes, solo alfanuméricos y sin palabras vacías"""
+    folded = unicodedata.normalize("NFKD", text.lower())
+    folded = "".join(char for char in folded if not unicodedata.combining(char))
+    return [
+        token for token in _TOKEN_PATTERN.findall(folded)
+        if len(token) > 1 and token not in STOP_WORDS
+    ]
+
+
+def text_checksum(text: str) -> int:
+    return zlib.crc32(text.encode("utf-8"))
+
+
+class BM25Index:
+    """
+    Índice invertido BM25 sobre el texto de los chunks.
+
+    `postings[término][id de chunk] = frecuencia`; una búsqueda solo
+    recorre las listas de los términos de la consulta. Cada chunk guarda
+    también la suma de control de su texto, de modo que `sync` puede
+    actualizar un índice persistido con los chunks vigentes añadiendo y
+    quitando solo los que cambiaron.
+    """
+
+    def __init__(self, k1: float = HYBRID_SEARCH_CONFIG['bm25_k1'], b: float = HYBRID_SEARCH_CONFIG['bm25_b']):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.doc_lengths: Dict[int, int] = {}
+        self.checksums: Dict[int, int] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, chunks: Iterable[Dict[str, Any]]) -> int:
+        """Indexa chunks con "id" y "text"; retorna cuántos se añadieron"""
+        chunks = [chunk for chunk in chunks if chunk.get("id") is not None]
+        # Reindexar un id ya presente reemplaza su entrada anterior
+        self.remove(chunk["id"] for chunk in chunks)
+
+        added = 0
+        for chunk in chunks:
+            chunk_id = chunk["id"]
+            text = chunk.get("text") or chunk.get("content") or ""
+            tokens = tokenize(text)
+            frequencies: Dict[str, int] = {}
+            for token in tokens:
+                frequencies[token] = frequencies.get(token, 0) + 1
+            for token, frequency in frequencies.items():
+                self.postings.setdefault(token, {})[chunk_id] = frequency
+
+            self.doc_lengths[chunk_id] = len(tokens)
+            self.checksums[chunk_id] = text_checksum(text)
+            self.total_length += len(tokens)
+            added += 1
+        return added
+
+    def remove(self, ids: Iterable[int]) -> int:
+        """Quita chunks del índice; retorna cuántos estaban indexados"""
+        ids = {chunk_id for chunk_id in ids if chunk_id in self.doc_lengths}
+        if not ids:
+            return 0
+        for token in list(self.postings):
+            posting = self.postings[token]
+            for chunk_id in ids & posting.keys():
+                del posting[chunk_id]
+            if not posting:
+                del self.postings[token]
+        for chunk_id in ids:
+            self.total_length -= self.doc_lengths.pop(chunk_id)
+            self.checksums.pop(chunk_id, None)
+        return len(ids)
+
+    def sync(self, chunks: List[Dict[str, Any]]) -> bool:
+        """
+        Ajusta el índice a los chunks vigentes (ids nuevos, borrados o con texto distinto)
+
+        Returns:
+            bool: True si el índice cambió
+        """
+        live = {chunk["id"]: chunk for chunk in chunks if "id" in chunk}
+        stale = [chunk_id for chunk_id in self.doc_lengths if chunk_id not in live]
+        changed = [
+            chunk for chunk_id, chunk in live.items()
+            if self.checksums.get(chunk_id) != text_checksum(chunk.get("text") or chunk.get("content") or "")
+        ]
+        self.remove(stale)
+        self.add(changed)
+        return bool(stale or changed)
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[int, float]]:
+        """
+        Chunks con mayor puntuación BM25 para la consulta
+
+        Returns:
+            List[Tuple[int, float]]: Pares (id de chunk, puntuación), de mayor a menor
+        """
+        if not self.doc_lengths:
+            return []
+
+        total_docs = len(self.doc_lengths)
+        average_length = self.total_length / total_docs or 1.0
+        k1, b = self.k1, self.b
+        scores: Dict[int, float] = {}
+        for token in set(tokenize(query)):
+            posting = self.postings.get(token)
+            if not posting:
+                continue
+            idf = math.log(1 + (total_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for chunk_id, frequency in posting.items():
+                norm = k1 * (1 - b + b * self.doc_lengths[chunk_id] / average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * frequency * (k1 + 1) / (frequency + norm)
+
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def save(self, path: str = LEXICAL_INDEX_FILE) -> None:
+        """Guarda el índice de forma atómica (temporal + rename)"""
+        data = {
+            "version": LEXICAL_INDEX_VERSION,
+            "k1": self.k1,
+            "b": self.b,
+            "docs": [
+                [chunk_id, length, self.checksums[chunk_id]]
+                for chunk_id, length in self.doc_lengths.items()
+            ],
+            "postings": {
+                token: [value for pair in posting.items() for value in pair]  # id, frecuencia, id, ...
+                for token, posting in self.postings.items()
+            },
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = LEXICAL_INDEX_FILE) -> Optional["BM25Index"]:
+        """Carga un índice guardado (None si no existe o es de otra versión)"""
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != LEXICAL_INDEX_VERSION:
+            return None
+
+        index = cls(data["k1"], data["b"])
+        for chunk_id, length, checksum in data["docs"]:
+            index.doc_lengths[chunk_id] = length
+            index.checksums[chunk_id] = checksum
+            index.total_length += length
+        for token, flat in data["postings"].items():
+            index.postings[token] = dict(zip(flat[::2], flat[1::2]))
+        return index
+
+
+def load_lexical_index(chunks: List[Dict[str, Any]], path: str = LEXICAL_INDEX_FILE) -> BM25Index:
+    """
+    Carga el índice BM25 guardado junto al almacén y lo pone al día con los chunks.
+
+    Solo se tokenizan los chunks nuevos o modificados desde el último
+    guardado; si hubo cambios, el índice se vuelve a guardar.
+    """
+    try:
+        index = BM25Index.load(path)
+    except Exception as e:
+        data_logger.error(f"Índice léxico ilegible en {path}, reconstruyendo: {e}")
+        index = None
+    if index is None:
+        index = BM25Index()
+
+    if index.sync(chunks):
+        try:
+            index.save(path)
+        except Exception as e:
+            data_logger.error(f"No se pudo guardar el índice léxico: {e}")
+        data_logger.info(f"Índice léxico actualizado: {len(index)} chunks, {len(index.postings)} términos")
+    return index
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = HYBRID_SEARCH_CONFIG['rrf_k']) -> List[int]:
+    """
+    Fusiona varias listas ordenadas de ids con reciprocal rank fusion
+
+    Cada id suma 1 / (k + posición) por cada lista en la que aparece, así
+    que no hace falta que las puntuaciones de los buscadores sean comparables.
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for position, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + position)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -0,0 +1,214 @@
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from logger import data_logger
+from constants import INGESTION_CONFIG
+
+_DONE = object()
+
+
+@dataclass
+class StageStats:
+    """Contadores de una etapa del pipeline de ingesta"""
+    name: str
+    items: int = 0
+    chunks: int = 0
+    busy_seconds: float = 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.busy_seconds if self.busy_seconds else 0.0
+
+    def record(self, chunks: int, elapsed: float) -> None:
+        self.items += 1
+        self.chunks += chunks
+        self.busy_seconds += elapsed
+
+
+class IngestionPipeline:
+    """
+    Pipeline extracción → embeddings → índice con etapas solapadas.
+
+    Cada etapa corre en su propio hilo y se comunica con la siguiente por
+    una cola acotada, así que la ingesta avanza al ritmo de la etapa más
+    lenta (y no de la suma de las tres) sin acumular en memoria más de
+    `queue_size` lotes pendientes por etapa.
+
+    - extracción: documentos entregados por `extract` a medida que terminan
+    - embeddings: lotes de `embed_batch_chunks` fragmentos para `embed`
+    - escritura: lotes de `index_batch_chunks` fragmentos para `write`
+    """
+
+    def __init__(
+        self,
+        extract: Callable[[List[str]], Any],
+        embed: Callable[[List[Dict[str, Any]]], Any],
+        write: Callable[[List[Dict[str, Any]]], Any],
+        config: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Args:
+            extract: Iterador de (ruta, fragmentos o None) para una lista de PDFs
+            embed: Añade "embedding" a cada fragmento del lote (in-place)
+            write: Persiste e indexa un lote de fragmentos ya embebidos
+            config: Tamaños de cola y de lote (por defecto INGESTION_CONFIG)
+        """
+        self.extract = extract
+        self.embed = embed
+        self.write = write
+        self.config = {**INGESTION_CONFIG, **(config or {})}
+        self.stats = {
+            name: StageStats(name) for name in ("extraction", "embedding", "writing")
+        }
+        self.failed_files: List[str] = []
+        self._errors: List[BaseException] = []
+        self._stop = threading.Event()
+
+    def _put(self, target: queue.Queue, item: Any) -> bool:
+        """Encola respetando el límite; abandona si otra etapa falló"""
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source: queue.Queue) -> Any:
+        while not self._stop.is_set():
+            try:
+                return source.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _run_stage(self, target: Callable[[], None], output: queue.Queue) -> None:
+        try:
+            target()
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+        finally:
+            # Marca de fin; si el pipeline se detuvo, el consumidor ya no la espera
+            while True:
+                try:
+                    output.put(_DONE, timeout=0.5)
+                    break
+                except queue.Full:
+                    if self._stop.is_set():
+                        break
+
+    def _extraction_stage(self, pdf_files: List[str], output: queue.Queue) -> None:
+        stats = self.stats["extraction"]
+        started = time.perf_counter()
+        for pdf_path, chunks in self.extract(pdf_files):
+            finished = time.perf_counter()
+            if chunks is None:
+                self.failed_files.append(pdf_path)
+            else:
+                stats.record(len(chunks), finished - started)
+                if chunks and not self._put(output, chunks):
+                    return
+            started = time.perf_counter()
+
+    def _embed_batch(self, batch: List[Dict[str, Any]], output: queue.Queue) -> bool:
+        started = time.perf_counter()
+        self.embed(batch)
+        self.stats["embedding"].record(len(batch), time.perf_counter() - started)
+        return self._put(output, batch)
+
+    def _embedding_stage(self, source: queue.Queue, output: queue.Queue) -> None:
+        batch_size = self.config["embed_batch_chunks"]
+        batch: List[Dict[str, Any]] = []
+
+        while True:
+            chunks = self._get(source)
+            if chunks is _DONE:
+                break
+            batch.extend(chunks)
+            while len(batch) >= batch_size:
+                if not self._embed_batch(batch[:batch_size], output):
+                    return
+                del batch[:batch_size]
+
+        if batch and not self._stop.is_set():
+            self._embed_batch(batch, output)
+
+    def run(self, pdf_files: List[str]) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        Procesa los PDFs y escribe sus fragmentos a medida que se embeben.
+
+        Returns:
+            Tuple: (fragmentos escritos, PDFs que no se pudieron extraer)
+        """
+        queue_size = self.config["queue_size"]
+        extracted: queue.Queue = queue.Queue(maxsize=queue_size)
+        embedded: queue.Queue = queue.Queue(maxsize=queue_size)
+        start_time = time.time()
+
+        workers = [
+            threading.Thread(
+                target=self._run_stage,
+                args=(lambda: self._extraction_stage(pdf_files, extracted), extracted),
+                name="ingest-extract",
+                daemon=True,
+            ),
+            threading.Thread(
+                target=self._run_stage,
+                args=(lambda: self._embedding_stage(extracted, embedded), embedded),
+                name="ingest-embed",
+                daemon=True,
+            ),
+        ]
+        for worker in workers:
+            worker.start()
+
+        # La escritura corre en el hilo llamante: el almacén tiene un único escritor
+        stats = self.stats["writing"]
+        written: List[Dict[str, Any]] = []
+        pending: List[Dict[str, Any]] = []
+        write_batch = self.config["index_batch_chunks"]
+
+        def flush() -> None:
+            started = time.perf_counter()
+            self.write(pending)
+            stats.record(len(pending), time.perf_counter() - started)
+            written.extend(pending)
+            pending.clear()
+
+        try:
+            while True:
+                batch = self._get(embedded)
+                if batch is _DONE:
+                    break
+                pending.extend(batch)
+                if len(pending) >= write_batch:
+                    flush()
+            if pending and not self._stop.is_set():
+                flush()
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+        finally:
+            for worker in workers:
+                worker.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+        data_logger.info(
+            f"Pipeline de ingesta completado en {time.time() - start_time:.2f} segundos: {self.summary()}"
+        )
+        return written, self.failed_files
+
+    def summary(self) -> str:
+        """Resumen de throughput por etapa, señalando la más lenta"""
+        parts = [
+            f"{stats.name} {stats.chunks} chunks en {stats.busy_seconds:.2f}s "
+            f"({stats.chunks_per_second:.1f} chunks/s)"
+            for stats in self.stats.values()
+        ]
+        slowest = max(self.stats.values(), key=lambda stats: stats.busy_seconds)
+        return "; ".join(parts) + f"; etapa más lenta: {slowest.name}"
@@ -0,0 +1,444 @@
+import hashlib
+import io
+import json
+import os
+import pickle
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple
+from logger import data_logger
+from ai_embedding.vector_index import LazyVectorIndex, normalize_rows
+from constants import (
+    EMBEDDINGS_MATRIX_FILE,
+    EMBEDDING_IDS_FILE,
+    CHUNKS_METADATA_FILE,
+    STORE_INFO_FILE,
+    EMBEDDINGS_FILE,
+)
+
+STORE_VERSION = 4
+
+# Fracción de chunks borrados a partir de la cual se reescribe el almacén
+COMPACTION_RATIO = 0.25
+
+# Segmentos añadidos a partir de los cuales se reescribe el almacén
+MAX_SEGMENTS = 64
+
+
+def matrix_content_hash(matrix: np.ndarray, ids: np.ndarray) -> str:
+    """Hash del contenido de la matriz de embeddings y de sus ids de fila."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(matrix.shape).encode())
+    digest.update(np.ascontiguousarray(matrix).reshape(-1).view(np.uint8))
+    digest.update(np.ascontiguousarray(ids, dtype=np.int64).view(np.uint8))
+    return digest.hexdigest()
+
+
+def assign_chunk_ids(chunks: List[Dict[str, Any]], next_id: Optional[int] = None) -> int:
+    """
+    Asigna un "id" entero estable a los fragmentos que aún no lo tienen.
+
+    Args:
+        chunks: Fragmentos a revisar (se modifican in-place)
+        next_id: Primer id libre; por defecto, el mayor id existente + 1
+
+    Returns:
+        int: Siguiente id libre
+    """
+    if next_id is None:
+        next_id = max((chunk["id"] for chunk in chunks if "id" in chunk), default=-1) + 1
+
+    for chunk in chunks:
+        if "id" not in chunk:
+            chunk["id"] = next_id
+            next_id += 1
+    return next_id
+
+
+def _npy_header(array_format: Dict[str, Any], version: Tuple[int, int]) -> bytes:
+    header = io.BytesIO()
+    if version == (1, 0):
+        np.lib.format.write_array_header_1_0(header, array_format)
+    else:
+        np.lib.format.write_array_header_2_0(header, array_format)
+    return header.getvalue()
+
+
+def append_npy_rows(path: str, rows: np.ndarray, committed_rows: int) -> None:
+    """
+    Añade filas al final de un `.npy` sin reescribir las existentes.
+
+    Las filas nuevas se escriben tras las `committed_rows` ya confirmadas
+    (descartando restos de una escritura interrumpida) y después se
+    reescribe la cabecera con la nueva forma. NumPy reserva espacio en la
+    cabecera para que el eje 0 crezca, así que su tamaño no cambia; si
+    cambiara, o si el archivo aún no tiene columnas, se reescribe entero.
+    """
+    with open(path, "r+b") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        data_offset = f.tell()
+
+        if shape[1:] == rows.shape[1:] and dtype == rows.dtype and not fortran_order:
+            new_shape = (committed_rows + rows.shape[0],) + shape[1:]
+            header = _npy_header(
+                {
+                    "shape": new_shape,
+                    "fortran_order": False,
+                    "descr": np.lib.format.dtype_to_descr(dtype),
+                },
+                version,
+            )
+
+            if len(header) == data_offset:
+                row_bytes = int(np.prod(shape[1:], dtype=np.int64)) * dtype.itemsize
+                f.seek(data_offset + committed_rows * row_bytes)
+                f.write(np.ascontiguousarray(rows).tobytes())
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+                # La cabecera se actualiza al final: hasta entonces las filas nuevas no existen
+                f.seek(0)
+                f.write(header)
+                return
+
+    existing = np.load(path, mmap_mode="r")[:committed_rows]
+    if existing.shape[0] == 0:
+        merged = rows
+    else:
+        merged = np.concatenate([existing, rows])
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, merged)
+    del existing
+    os.replace(tmp_path, path)
+
+
+class EmbeddingStore:
+    """
+    Almacenamiento en disco de fragmentos y embeddings.
+
+    Los embeddings se guardan normalizados en una matriz float32 (`.npy`)
+    que se abre con `mmap_mode="r"`, y los metadatos de cada fragmento en
+    un JSONL (una línea por chunk). Al cargar, cada fragmento recibe una
+    vista de su fila en la matriz mapeada en lugar de una lista de floats,
+    por lo que el arranque no deserializa millones de objetos Python.
+
+    Junto a la matriz se guarda `ids[fila] -> id de chunk`, de modo que los
+    fragmentos sin embedding no desplazan la correspondencia fila/chunk.
+
+    El almacén es de solo-añadir: `append` escribe las filas y líneas
+    nuevas al final de los archivos existentes y `remove` registra los ids
+    borrados. `store_info.json` (pequeño, reemplazado de forma atómica) es
+    el punto de confirmación: guarda cuántas filas y bytes son válidos, el
+    hash de cada segmento añadido y los ids borrados. Cuando los borrados
+    superan `COMPACTION_RATIO` o hay más de `MAX_SEGMENTS` segmentos, el
+    almacén se reescribe completo.
+
+    El índice vectorial no se persiste: se deriva de la matriz en la primera
+    búsqueda y se verifica contra los hashes de segmento.
+    """
+
+    def __init__(
+        self,
+        matrix_path: str = EMBEDDINGS_MATRIX_FILE,
+        metadata_path: str = CHUNKS_METADATA_FILE,
+        ids_path: str = EMBEDDING_IDS_FILE,
+        info_path: str = STORE_INFO_FILE,
+    ):
+        self.matrix_path = matrix_path
+        self.metadata_path = metadata_path
+        self.ids_path = ids_path
+        self.info_path = info_path
+        self.next_id = 0
+        self.info: Optional[Dict[str, Any]] = None
+        self.ids_by_document: Dict[str, List[int]] = {}
+
+    def exists(self) -> bool:
+        """Indica si hay un almacén completo en disco."""
+        return (
+            os.path.exists(self.info_path)
+            and os.path.exists(self.matrix_path)
+            and os.path.exists(self.metadata_path)
+        )
+
+    @staticmethod
+    def _split_chunks(
+        chunks: List[Dict[str, Any]]
+    ) -> Tuple[List[bytes], List[Any], List[int]]:
+        """Separa los metadatos serializados (JSONL) de los embeddings."""
+        lines = []
+        rows = []
+        row_ids = []
+        for chunk in chunks:
+            meta = {
+                key: value
+                for key, value in chunk.items()
+                if key not in ("embedding", "embedding_row")
+            }
+            # "content" duplica "text"; se reconstruye al cargar
+            if meta.get("content") == meta.get("text"):
+                meta.pop("content", None)
+            if "embedding" in chunk:
+                rows.append(chunk["embedding"])
+                row_ids.append(chunk["id"])
+            lines.append(
+                (json.dumps(meta, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+            )
+        return lines, rows, row_ids
+
+    def _write_info(self, info: Dict[str, Any]) -> None:
+        tmp_info = self.info_path + ".tmp"
+        with open(tmp_info, "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_info, self.info_path)
+        self.info = info
+
+    def _index_documents(self, chunks: List[Dict[str, Any]]) -> None:
+        for chunk in chunks:
+            document = chunk.get("document")
+            if document:
+                self.ids_by_document.setdefault(document, []).append(chunk["id"])
+
+    def save(self, chunks: List[Dict[str, Any]]) -> None:
+        """
+        Reescribe el almacén completo de forma atómica.
+
+        Args:
+            chunks: Lista de fragmentos; los que tienen "embedding" ocupan una fila.
+                Los fragmentos sin "id" reciben uno nuevo.
+        """
+        existing_max = max((chunk["id"] for chunk in chunks if "id" in chunk), default=-1)
+        self.next_id = assign_chunk_ids(chunks, max(self.next_id, existing_max + 1))
+
+        lines, rows, row_ids = self._split_chunks(chunks)
+        if rows:
+            matrix = normalize_rows(np.array(rows, dtype=np.float32))
+        else:
+            matrix = np.empty((0, 0), dtype=np.float32)
+        ids = np.array(row_ids, dtype=np.int64)
+
+        os.makedirs(os.path.dirname(self.matrix_path), exist_ok=True)
+
+        # Escribir en temporales y renombrar, para no dejar nunca un almacén a medias
+        tmp_matrix = self.matrix_path + ".tmp"
+        with open(tmp_matrix, "wb") as f:
+            np.save(f, matrix)
+
+        tmp_ids = self.ids_path + ".tmp"
+        with open(tmp_ids, "wb") as f:
+            np.save(f, ids)
+
+        tmp_metadata = self.metadata_path + ".tmp"
+        with open(tmp_metadata, "wb") as f:
+            f.writelines(lines)
+
+        os.replace(tmp_matrix, self.matrix_path)
+        os.replace(tmp_ids, self.ids_path)
+        os.replace(tmp_metadata, self.metadata_path)
+        self._write_info(
+            {
+                "version": STORE_VERSION,
+                "dimensions": int(matrix.shape[1]),
+                "rows": int(matrix.shape[0]),
+                "chunk_count": len(lines),
+                "metadata_bytes": sum(len(line) for line in lines),
+                "next_id": self.next_id,
+                "segments": [
+                    {"rows": int(matrix.shape[0]), "hash": matrix_content_hash(matrix, ids)}
+                ]
+                if rows
+                else [],
+                "deleted_ids": [],
+            }
+        )
+
+        self.ids_by_document = {}
+        self._index_documents(chunks)
+        data_logger.info(
+            f"Almacén guardado: {len(lines)} chunks, {matrix.shape[0]} embeddings en {self.matrix_path}"
+        )
+
+    def append(self, chunks: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Añade fragmentos nuevos al final del almacén, sin reescribir los existentes.
+
+        El coste es proporcional a los fragmentos añadidos. Cada fragmento con
+        embedding lo recibe normalizado (como en la matriz persistida).
+
+        Returns:
+            Tuple: (ids de las filas añadidas, matriz normalizada de esas filas)
+        """
+        if self.info is None:
+            self._read_info()
+
+        self.next_id = assign_chunk_ids(chunks, self.next_id)
+        lines, rows, row_ids = self._split_chunks(chunks)
+        ids = np.array(row_ids, dtype=np.int64)
+        if rows:
+            matrix = normalize_rows(np.array(rows, dtype=np.float32))
+        else:
+            matrix = np.empty((0, self.info["dimensions"]), dtype=np.float32)
+
+        if rows and self.info["rows"] and matrix.shape[1] != self.info["dimensions"]:
+            raise ValueError(
+                f"Dimensión {matrix.shape[1]} distinta a la del almacén {self.info['dimensions']}"
+            )
+
+        info = dict(self.info)
+        if rows:
+            append_npy_rows(self.matrix_path, matrix, info["rows"])
+            append_npy_rows(self.ids_path, ids, info["rows"])
+            info["segments"] = info["segments"] + [
+                {"rows": int(matrix.shape[0]), "hash": matrix_content_hash(matrix, ids)}
+            ]
+            info["rows"] += int(matrix.shape[0])
+            info["dimensions"] = int(matrix.shape[1])
+
+        # Las líneas se escriben tras los bytes confirmados, descartando restos previos
+        with open(self.metadata_path, "r+b") as f:
+            f.seek(info["metadata_bytes"])
+            f.writelines(lines)
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+
+        info["chunk_count"] += len(lines)
+        info["metadata_bytes"] += sum(len(line) for line in lines)
+        info["next_id"] = self.next_id
+        self._write_info(info)
+
+        for row, chunk in zip(matrix, (chunk for chunk in chunks if "embedding" in chunk)):
+            chunk["embedding"] = row
+        self._index_documents(chunks)
+
+        data_logger.info(
+            f"Almacén ampliado: +{len(lines)} chunks, +{matrix.shape[0]} embeddings "
+            f"({info['rows']} filas en total)"
+        )
+
+        if len(info["segments"]) > MAX_SEGMENTS:
+            self.compact()
+        return ids, matrix
+
+    def remove(self, document: str) -> List[int]:
+        """
+        Marca como borrados los fragmentos de un documento.
+
+        Args:
+            document: Valor del campo "document" de sus fragmentos
+
+        Returns:
+            List[int]: Ids de los fragmentos eliminados
+        """
+        if self.info is None:
+            self._read_info()
+
+        removed_ids = self.ids_by_document.pop(document, [])
+        if not removed_ids:
+            return []
+
+        info = dict(self.info)
+        info["deleted_ids"] = info["deleted_ids"] + removed_ids
+        self._write_info(info)
+        data_logger.info(f"Eliminados {len(removed_ids)} chunks de {document}")
+
+        if len(info["deleted_ids"]) > COMPACTION_RATIO * info["chunk_count"]:
+            self.compact()
+        return removed_ids
+
+    def compact(self) -> None:
+        """Reescribe el almacén sin los fragmentos borrados."""
+        data_logger.info("Compactando almacén de embeddings...")
+        chunks, _ = self.load()
+        self.save(chunks)
+
+    def _read_info(self) -> Dict[str, Any]:
+        with open(self.info_path, "r", encoding="utf-8") as f:
+            info = json.load(f)
+        self.info = info
+        self.next_id = info["next_id"]
+        return info
+
+    def load(self) -> Tuple[List[Dict[str, Any]], LazyVectorIndex]:
+        """
+        Carga fragmentos y prepara el índice derivado de la matriz mapeada.
+
+        Solo se lee lo confirmado en `store_info.json`, así que una
+        ampliación interrumpida no deja filas ni chunks a medias.
+
+        Returns:
+            Tuple: (fragmentos con "embedding" como vista de fila, índice perezoso)
+        """
+        info = self._read_info()
+        rows = info["rows"]
+        matrix = np.load(self.matrix_path, mmap_mode="r")[:rows]
+        ids = np.load(self.ids_path, mmap_mode="r")[:rows]
+        deleted_ids = set(info["deleted_ids"])
+
+        with open(self.metadata_path, "rb") as f:
+            metadata = f.read(info["metadata_bytes"])
+
+        # Mapa id -> fila construido una sola vez
+        row_by_id = {chunk_id: row for row, chunk_id in enumerate(ids.tolist())}
+        chunks = []
+        for line in metadata.splitlines():
+            chunk = json.loads(line)
+            if chunk["id"] in deleted_ids:
+                continue
+            if "content" not in chunk and "text" in chunk:
+                chunk["content"] = chunk["text"]
+            row = row_by_id.get(chunk["id"])
+            if row is not None:
+                chunk["embedding"] = matrix[row]
+            chunks.append(chunk)
+
+        self.ids_by_document = {}
+        self._index_documents(chunks)
+        segments = info["segments"]
+
+        def load_verified_matrix() -> Tuple[np.ndarray, np.ndarray, List[int]]:
+            start = 0
+            for segment in segments:
+                end = start + segment["rows"]
+                actual_hash = matrix_content_hash(matrix[start:end], ids[start:end])
+                if actual_hash != segment["hash"]:
+                    data_logger.error(
+                        f"Hash de embeddings inconsistente en filas {start}-{end} "
+                        f"({actual_hash} != {segment['hash']}); es necesario reprocesar los documentos"
+                    )
+                    raise ValueError("La matriz de embeddings no coincide con sus metadatos")
+                start = end
+            data_logger.info(f"Índice vectorial construido desde {self.matrix_path}")
+            return matrix, np.asarray(ids), sorted(deleted_ids)
+
+        live_rows = rows - sum(1 for chunk_id in deleted_ids if chunk_id in row_by_id)
+        index = LazyVectorIndex(load_verified_matrix, rows=live_rows, dim=info["dimensions"])
+
+        data_logger.info(
+            f"Almacén cargado: {len(chunks)} chunks, {live_rows} embeddings (mmap)"
+        )
+        return chunks, index
+
+    def migrate_legacy_pickle(self, legacy_path: str = EMBEDDINGS_FILE) -> bool:
+        """
+        Migración única desde el pickle antiguo de lista de diccionarios.
+
+        Returns:
+            bool: True si se migraron datos
+        """
+        if self.exists() or not os.path.exists(legacy_path):
+            return False
+
+        data_logger.info(f"Migrando datos antiguos desde {legacy_path}...")
+        with open(legacy_path, "rb") as f:
+            legacy_chunks = pickle.load(f)
+
+        self.save(legacy_chunks)
+        os.replace(legacy_path, legacy_path + ".migrated")
+        data_logger.info(
+            f"Migración completada: {len(legacy_chunks)} chunks (pickle renombrado a .migrated)"
+        )
+        return True
@@ -0,0 +1,329 @@
+import threading
+import numpy as np
+from typing import Callable, Iterable, List, Optional, Tuple
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    Normaliza (L2) cada fila de una matriz de embeddings.
+
+    Las filas con norma cero se dejan en cero para que nunca aparezcan
+    como resultado relevante.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class _Segment:
+    """Bloque contiguo de vectores con sus ids y una máscara opcional de borrados."""
+
+    __slots__ = ("matrix", "ids", "alive", "dead")
+
+    def __init__(self, matrix: np.ndarray, ids: np.ndarray):
+        self.matrix = matrix
+        self.ids = ids
+        self.alive: Optional[np.ndarray] = None  # None = todas las filas vivas
+        self.dead = 0
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+
+class VectorIndex:
+    """
+    Índice de búsqueda por similitud coseno.
+
+    Guarda los embeddings normalizados en matrices float32 contiguas, de
+    modo que cada búsqueda es un producto matriz-vector seguido de un
+    `argpartition` para obtener el top-k. Con embeddings de 768 dimensiones
+    esto es más rápido que un ball tree, cuyo rendimiento se degrada con la
+    dimensionalidad.
+
+    Cada fila lleva su id de chunk (`ids[fila]`), así que los resultados no
+    dependen de la posición de los chunks en ninguna lista externa.
+
+    El índice es de solo-añadir: `add` agrega un segmento nuevo sin tocar
+    los existentes (la matriz base puede seguir mapeada desde disco) y
+    `remove` marca filas como borradas. `compact` une los segmentos cuando
+    se acumulan demasiados.
+    """
+
+    MAX_SEGMENTS = 8
+
+    def __init__(self, embeddings, ids=None, normalized: bool = False):
+        """
+        Args:
+            embeddings: Matriz (n, dim) o lista de vectores
+            ids: Id de chunk de cada fila (por defecto, el número de fila)
+            normalized: True si los vectores ya vienen normalizados (evita copiarlos)
+        """
+        self._lock = threading.Lock()
+        self._segments: List[_Segment] = []
+        self._row_of: dict = {}
+        self._dim = 0
+        self._size = 0
+        self.add(ids, embeddings, normalized=normalized)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def dim(self) -> int:
+        return self._dim
+
+    @staticmethod
+    def _prepare(ids, vectors, normalized: bool) -> Tuple[np.ndarray, np.ndarray]:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2:
+            raise ValueError(
+                f"Se esperaba una matriz de embeddings 2D, se recibió {matrix.ndim}D"
+            )
+        if not normalized:
+            matrix = normalize_rows(matrix)
+        matrix = np.ascontiguousarray(matrix)
+
+        if ids is None:
+            ids = np.arange(matrix.shape[0], dtype=np.int64)
+        ids = np.asarray(ids, dtype=np.int64)
+        if ids.shape != (matrix.shape[0],):
+            raise ValueError(
+                f"Se recibieron {ids.shape[0]} ids para {matrix.shape[0]} vectores"
+            )
+        return matrix, ids
+
+    def add(self, ids, vectors, normalized: bool = False) -> None:
+        """
+        Añade vectores al índice en tiempo proporcional a los vectores nuevos.
+
+        Args:
+            ids: Ids de chunk de los vectores (None = números de fila)
+            vectors: Matriz (m, dim) de embeddings
+            normalized: True si los vectores ya vienen normalizados
+        """
+        matrix, ids = self._prepare(ids, vectors, normalized)
+        if matrix.shape[0] == 0:
+            if not self._dim and matrix.shape[1]:
+                self._dim = matrix.shape[1]
+            return
+
+        with self._lock:
+            if self._dim and matrix.shape[1] != self._dim:
+                raise ValueError(
+                    f"Dimensión {matrix.shape[1]} distinta a la del índice {self._dim}"
+                )
+            self._dim = matrix.shape[1]
+
+            # Un id re-añadido reemplaza a su versión anterior
+            self._remove_locked(ids)
+
+            segment_number = len(self._segments)
+            for row, chunk_id in enumerate(ids.tolist()):
+                self._row_of[chunk_id] = (segment_number, row)
+
+            # Se publica una lista nueva para que las búsquedas en curso no vean cambios a medias
+            self._segments = self._segments + [_Segment(matrix, ids)]
+            self._size += matrix.shape[0]
+
+        if len(self._segments) > self.MAX_SEGMENTS:
+            self.compact()
+
+    def remove(self, ids: Iterable[int]) -> int:
+        """
+        Marca como borrados los vectores con los ids dados.
+
+        Returns:
+            int: Número de vectores eliminados
+        """
+        with self._lock:
+            return self._remove_locked(np.asarray(list(ids), dtype=np.int64))
+
+    def _remove_locked(self, ids: np.ndarray) -> int:
+        removed = 0
+        for chunk_id in ids.tolist():
+            location = self._row_of.pop(chunk_id, None)
+            if location is None:
+                continue
+            segment = self._segments[location[0]]
+            if segment.alive is None:
+                segment.alive = np.ones(len(segment), dtype=bool)
+            segment.alive[location[1]] = False
+            segment.dead += 1
+            removed += 1
+        self._size -= removed
+        return removed
+
+    def compact(self) -> None:
+        """Une todos los segmentos en una sola matriz, descartando filas borradas."""
+        with self._lock:
+            matrices = []
+            ids = []
+            for segment in self._segments:
+                if segment.alive is None:
+                    matrices.append(segment.matrix)
+                    ids.append(segment.ids)
+                else:
+                    matrices.append(segment.matrix[segment.alive])
+                    ids.append(segment.ids[segment.alive])
+
+            if not matrices:
+                return
+
+            merged = _Segment(
+                np.ascontiguousarray(np.concatenate(matrices)), np.concatenate(ids)
+            )
+            self._row_of = {chunk_id: (0, row) for row, chunk_id in enumerate(merged.ids.tolist())}
+            self._segments = [merged]
+
+    def search(self, query, top_k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Busca los vectores más similares a la consulta.
+
+        Args:
+            query: Embedding de la consulta (lista o array de tamaño dim)
+            top_k: Número de resultados a retornar
+
+        Returns:
+            Tuple: (ids de chunk ordenados por relevancia, similitudes coseno)
+        """
+        query_vector = np.asarray(query, dtype=np.float32).reshape(-1)
+        if query_vector.shape[0] != self.dim:
+            raise ValueError(
+                f"Dimensión de consulta {query_vector.shape[0]} distinta a la del índice {self.dim}"
+            )
+
+        norm = np.linalg.norm(query_vector)
+        if self._size == 0 or top_k <= 0 or norm == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query_vector = query_vector / norm
+
+        candidate_ids = []
+        candidate_scores = []
+        for segment in self._segments:
+            total = len(segment)
+            if total == segment.dead:
+                continue
+
+            scores = segment.matrix @ query_vector
+            if segment.alive is not None:
+                scores[~segment.alive] = -np.inf
+
+            k = min(top_k, total)
+            if k < total:
+                candidates = np.argpartition(-scores, k - 1)[:k]
+            else:
+                candidates = np.arange(total)
+            candidate_ids.append(segment.ids[candidates])
+            candidate_scores.append(scores[candidates])
+
+        ids = np.concatenate(candidate_ids)
+        scores = np.concatenate(candidate_scores)
+        valid = np.isfinite(scores)
+        ids, scores = ids[valid], scores[valid]
+
+        # Solo se ordenan los candidatos de cada segmento, no todo el corpus
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return ids[order], scores[order]
+
+
+class LazyVectorIndex:
+    """
+    Índice derivado de la matriz persistida, construido en la primera búsqueda.
+
+    No se serializa nunca: `loader` devuelve la matriz (ya normalizada y
+    verificada), los ids de cada fila y los ids borrados, y el índice se
+    crea sobre ella sin copiarla. Si la carga falla, el error se recuerda
+    para no repetir la verificación en cada búsqueda.
+
+    Las llamadas a `add`/`remove` anteriores a la construcción se guardan y
+    se aplican al construir, así que actualizar el índice nunca obliga a
+    cargar el corpus completo.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], Tuple[np.ndarray, np.ndarray, List[int]]],
+        rows: int,
+        dim: int,
+    ):
+        """
+        Args:
+            loader: Función que retorna (matriz normalizada, ids de fila, ids borrados)
+            rows: Número de vectores vivos esperados (disponible sin cargar)
+            dim: Dimensión de los vectores (disponible sin cargar)
+        """
+        self._loader = loader
+        self._rows = rows
+        self._dim = dim
+        self._index: Optional[VectorIndex] = None
+        self._error: Optional[Exception] = None
+        self._pending: List[Callable[[VectorIndex], None]] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        if self._index is not None:
+            return len(self._index)
+        return self._rows
+
+    @property
+    def dim(self) -> int:
+        if self._index is not None:
+            return self._index.dim
+        return self._dim
+
+    @property
+    def is_built(self) -> bool:
+        return self._index is not None
+
+    def _ensure_built(self) -> VectorIndex:
+        if self._index is not None:
+            return self._index
+
+        with self._lock:
+            if self._index is None:
+                if self._error is not None:
+                    raise self._error
+                try:
+                    matrix, ids, deleted_ids = self._loader()
+                    index = VectorIndex(matrix, ids=ids, normalized=True)
+                    index.remove(deleted_ids)
+                    for operation in self._pending:
+                        operation(index)
+                    self._pending = []
+                    self._index = index
+                except Exception as e:
+                    self._error = e
+                    raise
+        return self._index
+
+    def build(self) -> "LazyVectorIndex":
+        """Construye el índice ahora (por ejemplo, antes de publicarlo)."""
+        self._ensure_built()
+        return self
+
+    def add(self, ids, vectors, normalized: bool = False) -> None:
+        """Añade vectores; si el índice aún no existe, se aplican al construirlo."""
+        with self._lock:
+            if self._index is None:
+                ids = list(ids)
+                self._pending.append(lambda index: index.add(ids, vectors, normalized))
+                self._rows += len(ids)
+                if not self._dim:
+                    self._dim = np.asarray(vectors).shape[1]
+                return
+        self._index.add(ids, vectors, normalized)
+
+    def remove(self, ids: Iterable[int]) -> None:
+        """Marca vectores como borrados; si el índice aún no existe, se aplica al construirlo."""
+        with self._lock:
+            if self._index is None:
+                ids = list(ids)
+                self._pending.append(lambda index: index.remove(ids))
+                self._rows = max(0, self._rows - len(ids))
+                return
+        self._index.remove(ids)
+
+    def search(self, query, top_k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """Construye el índice si hace falta y delega en `VectorIndex.search`."""
+        return self._ensure_built().search(query, top_k=top_k)
@@ -0,0 +1,2 @@
+# Benchmarks de rendimiento de DesignBot
+# Ejecutar desde Bot/: python -m benchmarks.<nombre>
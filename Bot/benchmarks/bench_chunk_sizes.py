@@ -0,0 +1,227 @@
+"""
+Benchmark offline: calidad de recuperación y coste según la fragmentación.
+
+Fragmenta el mismo corpus con los bloques fijos anteriores (12.500
+caracteres) y con pasajes estructurados de distintos tamaños objetivo, y
+busca un conjunto fijo de consultas con BM25 (sin API, así que es
+reproducible). Por configuración informa recall@5 y MRR (un acierto es un
+fragmento que contiene la respuesta esperada), los caracteres que los
+5 primeros resultados meten en el prompt de `generate_answer` (proxy de
+tokens y latencia del LLM), el número de fragmentos y los tiempos de
+fragmentación y búsqueda.
+
+Por defecto usa un corpus sintético con títulos, secciones y páginas.
+Incluye líneas de cuerpo que parecen títulos al cortarse (empiezan por
+un año o una cifra, siglas en mayúsculas); la columna "títulos falsos"
+cuenta los pasajes cuyo título no es un título real del documento.
+
+`--folder` usa PDFs reales y `--queries` un JSON con
+[{"query": ..., "answer": ...}] cuyas respuestas aparezcan en ellos.
+
+Uso (desde Bot/):
+    python -m benchmarks.bench_chunk_sizes
+    python -m benchmarks.bench_chunk_sizes --documents 40 --targets 200 350 600 1000
+    python -m benchmarks.bench_chunk_sizes --folder ../Design_Resources --queries consultas.json
+"""
+import argparse
+import json
+import os
+import random
+import textwrap
+import time
+from ai_embedding.chunking import split_document
+from ai_embedding.lexical_index import BM25Index
+from constants import CHUNKING_CONFIG
+
+TOP_K = 5
+
+FILLER = (
+    "el diseño de interfaces requiere coherencia visual entre pantallas y componentes "
+    "los usuarios esperan patrones conocidos en la navegación y en los formularios "
+    "una buena jerarquía tipográfica guía la lectura y reduce la carga cognitiva "
+    "los prototipos permiten validar flujos antes de desarrollar la solución final "
+    "las pruebas de usabilidad revelan problemas que el equipo no había previsto "
+    "el sistema de diseño documenta tokens colores espaciados y estados de cada componente "
+    "la accesibilidad beneficia a todos los usuarios y no solo a quienes usan lectores de pantalla "
+    "el contraste el tamaño de los objetivos táctiles y el foco visible son requisitos básicos"
+).split()
+
+TOPICS = [
+    "botones", "formularios", "tarjetas", "menús", "modales", "tablas", "iconos", "pestañas",
+    "notificaciones", "buscadores", "gráficos", "carruseles", "listas", "avatares", "filtros",
+]
+ATTRIBUTES = [
+    ("contraste mínimo", "{:.1f}:1"), ("margen interior", "{} píxeles"),
+    ("tiempo de animación", "{} milisegundos"), ("altura táctil", "{} puntos"),
+    ("radio de borde", "{} píxeles"), ("ancho máximo", "{} columnas"),
+]
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(FILLER, k=words)).capitalize() + "."
+
+
+# Líneas de cuerpo que `extract_text()` puede dejar sueltas y parecen títulos, con su continuación
+FALSE_HEADINGS = [
+    ("2023 fue el año en que los equipos de diseño", "adoptaron tokens compartidos en todos los productos."),
+    ("3 capas de ajuste y", "una máscara bastan para corregir el color de una imagen."),
+    ("CMYK", "se reserva para impresión y no para pantallas."),
+    ("UX UI", "son disciplinas distintas aunque trabajen juntas."),
+    ("12 columnas con medianiles de", "veinte píxeles forman la retícula base."),
+]
+
+
+def _paragraph(rng: random.Random) -> str:
+    return " ".join(_sentence(rng, rng.randint(10, 22)) for _ in range(rng.randint(3, 7)))
+
+
+def _wrapped_lines(paragraph: str, rng: random.Random) -> list:
+    """Líneas cortadas como en un PDF; a veces con una línea que parece un título"""
+    lines = textwrap.wrap(paragraph, 90)
+    if rng.random() < 0.3:
+        trap = list(rng.choice(FALSE_HEADINGS))
+        position = rng.choice([0, rng.randint(1, len(lines))])  # inicio de párrafo o a media frase
+        lines[position:position] = trap
+    return lines
+
+
+def _synthetic_corpus(documents: int, seed: int):
+    """Documentos [(página, texto)], consultas (consulta, respuesta) y títulos reales"""
+    rng = random.Random(seed)
+    corpus, queries, headings = {}, [], set()
+    for doc_index in range(documents):
+        product = f"guía{doc_index}"
+        pages, lines, page_number = [], [], 1
+        for section in range(rng.randint(8, 16)):
+            topic = rng.choice(TOPICS)
+            attribute, unit = rng.choice(ATTRIBUTES)
+            value = unit.format(rng.randint(2, 96) if "{}" in unit else rng.uniform(3, 7))
+            fact = f"En {product} el {attribute} de los {topic} es de {value}."
+            queries.append((f"{attribute} de {topic} en {product}", fact))
+
+            heading = f"{section + 1}. {topic.upper()} EN {product.upper()}"
+            headings.add(heading)
+            lines.append(heading)
+            paragraphs = [_paragraph(rng) for _ in range(rng.randint(2, 6))]
+            position = rng.randrange(len(paragraphs))
+            paragraphs[position] = f"{paragraphs[position]} {fact} {_sentence(rng, 12)}"
+            for paragraph in paragraphs:
+                lines.extend(_wrapped_lines(paragraph, rng))
+                lines.append("")
+                if len(lines) > 55:
+                    pages.append((page_number, "\n".join(lines)))
+                    lines, page_number = [], page_number + 1
+        if lines:
+            pages.append((page_number, "\n".join(lines)))
+        corpus[f"{product}.pdf"] = pages
+    return corpus, queries, headings
+
+
+def _pdf_corpus(folder: str):
+    from ai_embedding.extract import find_pdf_files, read_pdf_pages
+
+    corpus = {}
+    for pdf_path in find_pdf_files(folder):
+        with open(pdf_path, "rb") as f:
+            corpus[pdf_path] = read_pdf_pages(f)
+    return corpus
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+def _evaluate(name: str, config: dict, corpus: dict, queries: list, headings=None) -> dict:
+    start = time.perf_counter()
+    chunks = []
+    for document, pages in corpus.items():
+        chunks.extend(split_document(pages, document, config))
+    chunk_time = time.perf_counter() - start
+
+    for chunk_id, chunk in enumerate(chunks):
+        chunk["id"] = chunk_id
+    index = BM25Index()
+    index.add(chunks)
+    normalized = [_normalize(chunk["text"]) for chunk in chunks]
+
+    hits, reciprocal_ranks, prompt_chars = 0, 0.0, 0
+    start = time.perf_counter()
+    results = [index.search(query, TOP_K) for query, _ in queries]
+    search_time = time.perf_counter() - start
+
+    for (_, answer), ranked in zip(queries, results):
+        answer = _normalize(answer)
+        prompt_chars += sum(len(chunks[chunk_id]["text"]) for chunk_id, _ in ranked)
+        for position, (chunk_id, _) in enumerate(ranked, start=1):
+            if answer in normalized[chunk_id]:
+                hits += 1
+                reciprocal_ranks += 1 / position
+                break
+
+    false_headings = None
+    if headings is not None:
+        false_headings = sum(
+            1 for chunk in chunks
+            if chunk["type"] == "passage"
+            and not chunk["header"].startswith("Fragmento ")
+            and chunk["header"] not in headings
+        )
+
+    total = len(queries) or 1
+    return {
+        "name": name,
+        "chunks": len(chunks),
+        "avg_chars": sum(len(chunk["text"]) for chunk in chunks) / (len(chunks) or 1),
+        "recall": hits / total,
+        "mrr": reciprocal_ranks / total,
+        "prompt_chars": prompt_chars / total,
+        "chunk_ms": chunk_time * 1000,
+        "search_us": search_time / total * 1e6,
+        "false_headings": false_headings,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--targets", type=int, nargs="+", default=[200, 350, 600, 1000])
+    parser.add_argument("--folder", help="Carpeta con PDFs reales (requiere --queries)")
+    parser.add_argument("--queries", help='JSON con [{"query": ..., "answer": ...}]')
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.folder:
+        if not args.queries:
+            parser.error("--folder requiere --queries")
+        corpus, headings = _pdf_corpus(args.folder), None
+    else:
+        corpus, queries, headings = _synthetic_corpus(args.documents, args.seed)
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [(item["query"], item["answer"]) for item in json.load(f)]
+
+    configs = [("fijo 12500/500", dict(CHUNKING_CONFIG, strategy="fixed"))]
+    for target in args.targets:
+        config = dict(
+            CHUNKING_CONFIG,
+            strategy="structured",
+            target_tokens=target,
+            max_tokens=max(CHUNKING_CONFIG['max_tokens'], target * 2),
+            min_tokens=min(CHUNKING_CONFIG['min_tokens'], target // 4),
+        )
+        configs.append((f"pasajes ~{target} tokens", config))
+
+    pages = sum(len(document_pages) for document_pages in corpus.values())
+    print(f"Documentos: {len(corpus)}, páginas: {pages}, consultas: {len(queries)}")
+    print(f"{'fragmentación':<22} {'frags':>6} {'car/frag':>9} {'recall@5':>9} {'MRR':>6} "
+          f"{'car. prompt':>12} {'frag. ms':>9} {'µs/búsq.':>9} {'títulos falsos':>15}")
+    for name, config in configs:
+        row = _evaluate(name, config, corpus, queries, headings)
+        false_headings = "-" if row['false_headings'] is None else row['false_headings']
+        print(f"{row['name']:<22} {row['chunks']:>6} {row['avg_chars']:>9.0f} {row['recall']:>9.3f} "
+              f"{row['mrr']:>6.3f} {row['prompt_chars']:>12.0f} {row['chunk_ms']:>9.1f} {row['search_us']:>9.1f} "
+              f"{false_headings:>15}")
+
+
+if __name__ == "__main__":
+    main()
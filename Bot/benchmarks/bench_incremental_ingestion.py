@@ -0,0 +1,116 @@
+"""
+Regresión: la ingesta incremental recupera los embeddings que faltaron.
+
+Ingiere un corpus sintético en una carpeta y un almacén temporales con la
+API de embeddings simulada: en la primera ejecución un lote falla por el
+servicio a mitad de la ingesta, así que los lotes pendientes se omiten y
+sus fragmentos se guardan sin embedding. La segunda ejecución, con la API
+ya disponible, debe reprocesar esos documentos y dejar todos los
+fragmentos con embedding y todos los documentos en el manifiesto.
+
+Uso (desde Bot/):
+    python -m benchmarks.bench_incremental_ingestion
+    python -m benchmarks.bench_incremental_ingestion --documents 12 --fail-at 3
+"""
+import argparse
+import functools
+import json
+import os
+import tempfile
+import threading
+from unittest import mock
+import numpy as np
+from ai_embedding import ai, extract
+from ai_embedding.ai import APIRequestError
+from ai_embedding.chunking import split_document
+from ai_embedding.store import EmbeddingStore
+from benchmarks.bench_chunk_sizes import _synthetic_corpus
+from constants import EMBEDDING_CONFIG
+
+
+class FlakyEmbeddings:
+    """Sustituto de `embed_texts` que falla por el servicio en la petición `fail_at`"""
+
+    def __init__(self, fail_at: int = 0):
+        self.fail_at = fail_at
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, texts):
+        with self.lock:
+            self.calls += 1
+            call = self.calls
+        if call == self.fail_at:
+            raise APIRequestError("Error en la API: 503 - Service Unavailable", 503)
+        rng = np.random.default_rng(call)
+        return rng.standard_normal((len(texts), EMBEDDING_CONFIG['dimensions'])).tolist()
+
+
+def _ingest(corpus: dict, embeddings: FlakyEmbeddings):
+    """Una ejecución de `process_documents` con extracción y API simuladas"""
+    def iter_new_chunks(pdf_files, workers=None):
+        for pdf_path in pdf_files:
+            yield pdf_path, split_document(corpus[os.path.basename(pdf_path)], pdf_path)
+
+    with mock.patch.object(extract, "iter_new_chunks", iter_new_chunks), \
+            mock.patch.object(ai, "embed_texts", embeddings):
+        return extract.process_documents()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, default=8)
+    parser.add_argument("--fail-at", type=int, default=2, help="Petición de la primera ejecución que falla")
+    args = parser.parse_args()
+
+    corpus, _, _ = _synthetic_corpus(args.documents, seed=42)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "documentos")
+        os.makedirs(folder)
+        for name in corpus:
+            with open(os.path.join(folder, name), "wb") as f:
+                f.write(name.encode("utf-8"))
+
+        store = EmbeddingStore(
+            os.path.join(tmp, "embeddings.npy"),
+            os.path.join(tmp, "chunks.jsonl"),
+            os.path.join(tmp, "ids.npy"),
+            os.path.join(tmp, "store_info.json"),
+        )
+        store.migrate_legacy_pickle = functools.partial(
+            store.migrate_legacy_pickle, os.path.join(tmp, "embeddings.pkl")
+        )
+        manifest_file = os.path.join(tmp, "documents_manifest.json")
+
+        with mock.patch.object(extract, "DOCUMENTS_FOLDER", folder), \
+                mock.patch.object(extract, "DOCUMENTS_MANIFEST_FILE", manifest_file), \
+                mock.patch.object(extract, "INDEX_FILE", os.path.join(tmp, "index.pkl")), \
+                mock.patch.object(extract, "embedding_store", store):
+            _, chunks = _ingest(corpus, FlakyEmbeddings(fail_at=args.fail_at))
+            chunks_first = len(chunks)
+            missing_first = sum(1 for chunk in chunks if "embedding" not in chunk)
+            with open(manifest_file, "r", encoding="utf-8") as f:
+                manifest_first = len(json.load(f)["documents"])
+
+            _, chunks = _ingest(corpus, FlakyEmbeddings())
+            missing_second = sum(1 for chunk in chunks if "embedding" not in chunk)
+            with open(manifest_file, "r", encoding="utf-8") as f:
+                manifest_second = len(json.load(f)["documents"])
+            stored_chunks, _ = store.load()
+
+    print(f"Documentos: {len(corpus)}")
+    print(f"1ª ejecución (falla la petición {args.fail_at}): {chunks_first} fragmentos, "
+          f"{missing_first} sin embedding, {manifest_first} documentos en el manifiesto")
+    print(f"2ª ejecución (API disponible): {missing_second} sin embedding, "
+          f"{manifest_second} documentos en el manifiesto, {len(stored_chunks)} fragmentos en el almacén")
+
+    assert missing_first > 0, "La primera ejecución no dejó fragmentos sin embedding"
+    assert manifest_first < len(corpus), "Documentos incompletos registrados en el manifiesto"
+    assert missing_second == 0, "Fragmentos sin embedding tras la segunda ejecución"
+    assert manifest_second == len(corpus), "Faltan documentos en el manifiesto"
+    assert len(stored_chunks) == len(chunks), "Fragmentos obsoletos o duplicados en el almacén"
+
+
+if __name__ == "__main__":
+    main()
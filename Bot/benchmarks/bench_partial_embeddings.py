@@ -0,0 +1,94 @@
+"""
+Regresión: búsqueda correcta con embeddings faltantes.
+
+Construye un corpus donde una fracción de los chunks no tiene embedding
+(fallo de la API), lo guarda en un almacén temporal y verifica que cada
+chunk se encuentre a sí mismo como primer resultado. Compara con el mapeo
+por posición usado antes (fila del índice == posición en la lista).
+
+Uso (desde Bot/):
+    python -m benchmarks.bench_partial_embeddings
+    python -m benchmarks.bench_partial_embeddings --chunks 20000 --missing 0.1
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from ai_embedding.extract import build_chunk_lookup, search_similar_chunks_sklearn
+from ai_embedding.store import EmbeddingStore
+
+DIM = 768
+
+
+def _build_corpus(size: int, missing_ratio: float, rng: np.random.Generator) -> list:
+    chunks = []
+    for i in range(size):
+        chunk = {
+            "chunk_id": f"Block-{i + 1}",
+            "text": f"texto {i}",
+            "document": f"doc_{i % 17}.pdf",
+        }
+        if rng.random() >= missing_ratio:
+            chunk["embedding"] = rng.standard_normal(DIM).astype(np.float32)
+        chunks.append(chunk)
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, default=5_000)
+    parser.add_argument("--missing", type=float, default=0.05)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    corpus = _build_corpus(args.chunks, args.missing, rng)
+    missing = sum(1 for chunk in corpus if "embedding" not in chunk)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = EmbeddingStore(
+            os.path.join(tmp, "embeddings.npy"),
+            os.path.join(tmp, "chunks.jsonl"),
+            os.path.join(tmp, "ids.npy"),
+            os.path.join(tmp, "store_info.json"),
+        )
+        store.save(corpus)
+        chunks, index = store.load()
+
+        start = time.perf_counter()
+        chunks_by_id = build_chunk_lookup(chunks)
+        lookup_build = time.perf_counter() - start
+
+        embedded = [chunk for chunk in chunks if "embedding" in chunk]
+        sample = [embedded[i] for i in rng.choice(len(embedded), args.queries, replace=False)]
+
+        correct = 0
+        positional_correct = 0
+        start = time.perf_counter()
+        for chunk in sample:
+            results = search_similar_chunks_sklearn(
+                np.asarray(chunk["embedding"]), index, chunks_by_id, top_k=1
+            )
+            if results and results[0]["id"] == chunk["id"]:
+                correct += 1
+        elapsed = time.perf_counter() - start
+
+        # Mapeo antiguo: la fila del índice se usaba como posición en la lista completa
+        row_of = {chunk["id"]: row for row, chunk in enumerate(embedded)}
+        for chunk in sample:
+            row = row_of[chunk["id"]]
+            if row < len(chunks) and chunks[row]["id"] == chunk["id"]:
+                positional_correct += 1
+
+    print(f"Chunks: {args.chunks} ({missing} sin embedding)")
+    print(f"Mapa id -> chunk construido en {lookup_build * 1000:.2f} ms")
+    print(f"Búsqueda por id:       {correct}/{len(sample)} correctos "
+          f"({elapsed / len(sample) * 1000:.3f} ms/consulta)")
+    print(f"Mapeo por posición:    {positional_correct}/{len(sample)} correctos (comportamiento anterior)")
+
+    assert correct == len(sample), "Resultados desalineados con embeddings faltantes"
+
+
+if __name__ == "__main__":
+    main()
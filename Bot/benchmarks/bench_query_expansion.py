@@ -0,0 +1,114 @@
+"""
+Microbenchmark: expansión de consultas y detección de herramientas.
+
+Compara el expansor compilado (índice de sinónimos + autómatas de
+Aho–Corasick) con los recorridos anteriores, que reconstruían los
+diccionarios en cada llamada y probaban cada clave contra cada término.
+Verifica que ambos den el mismo resultado. `--extra-keys` añade claves
+sintéticas al archivo de sinónimos para ver cómo escala cada enfoque.
+
+Uso (desde Bot/):
+    python -m benchmarks.bench_query_expansion
+    python -m benchmarks.bench_query_expansion --queries 20000 --extra-keys 500
+"""
+import argparse
+import json
+import random
+import time
+from core.query_expansion import QueryExpander
+from constants import DESIGN_SYNONYMS_FILE
+
+WORDS = [
+    "como", "diseñar", "una", "interfaz", "accesible", "para", "usuarios", "móviles",
+    "prototipo", "figma", "componentes", "navegación", "testing", "usabilidad", "sketch",
+    "adobe", "xd", "animation", "responsive", "diseño", "sistema", "botones", "formularios",
+    "interaction", "framer", "protopie", "tablet", "user", "ux", "menu", "paleta", "colores",
+]
+
+
+def _legacy_expand(query: str, config: dict, favorite_tools: list) -> list:
+    design_synonyms = {key: list(values) for key, values in config["synonyms"].items()}
+    tool_context = {key: list(values) for key, values in config["tool_context"].items()}
+    query_lower = query.lower()
+    enhanced_terms = []
+    for term in query.split():
+        enhanced_terms.append(term)
+        term_lower = term.lower()
+        for key, synonyms in design_synonyms.items():
+            if key in term_lower or term_lower in synonyms:
+                enhanced_terms.extend(synonyms[:2])
+                break
+    for tool in favorite_tools:
+        if tool in tool_context:
+            for tool_term in tool_context[tool]:
+                if any(word in query_lower for word in config["tool_context_triggers"]):
+                    enhanced_terms.append(tool_term)
+                    break
+    return enhanced_terms
+
+
+def _legacy_detect(question: str, config: dict, user_tools: list):
+    tool_variations = {key: list(values) for key, values in config["tool_variations"].items()}
+    question_lower = question.lower()
+    for tool in user_tools:
+        if tool in tool_variations:
+            for variation in tool_variations[tool]:
+                if variation in question_lower:
+                    return tool
+    for tool, variations in tool_variations.items():
+        for variation in variations:
+            if variation in question_lower:
+                return tool
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=5_000)
+    parser.add_argument("--extra-keys", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(DESIGN_SYNONYMS_FILE, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    for i in range(args.extra_keys):
+        config["synonyms"][f"clave{i}x"] = [f"sinonimo{i}", f"alias{i}"]
+
+    rng = random.Random(42)
+    tools = list(config["tool_variations"])
+    queries = [" ".join(rng.choices(WORDS, k=rng.randint(2, 10))) for _ in range(args.queries)]
+    favorites = [rng.sample(tools, rng.randint(0, 3)) for _ in range(args.queries)]
+
+    start = time.perf_counter()
+    expander = QueryExpander(config)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    legacy = [
+        (_legacy_expand(query, config, tools_), _legacy_detect(query, config, tools_))
+        for query, tools_ in zip(queries, favorites)
+    ]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compiled = [
+        (
+            expander.expand_query(query) + expander.tool_terms(query.lower(), tools_),
+            expander.detect_tool(query, tools_),
+        )
+        for query, tools_ in zip(queries, favorites)
+    ]
+    compiled_time = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(legacy, compiled) if a != b)
+    print(f"Consultas: {args.queries}, claves de sinónimos: {len(config['synonyms'])}")
+    print(f"Compilación del expansor: {build * 1000:.2f} ms")
+    print(f"Recorrido anterior: {legacy_time / args.queries * 1e6:8.2f} µs/consulta")
+    print(f"Expansor compilado: {compiled_time / args.queries * 1e6:8.2f} µs/consulta "
+          f"({legacy_time / compiled_time:.1f}x)")
+    print(f"Resultados distintos: {mismatches}")
+
+    assert mismatches == 0, "El expansor compilado no reproduce la expansión anterior"
+
+
+if __name__ == "__main__":
+    main()
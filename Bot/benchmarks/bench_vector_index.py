@@ -0,0 +1,88 @@
+"""
+Benchmark: VectorIndex (coseno, matriz normalizada) vs NearestNeighbors ball_tree.
+
+Uso (desde Bot/):
+    python -m benchmarks.bench_vector_index
+    python -m benchmarks.bench_vector_index --sizes 1000 10000 --queries 50
+"""
+import argparse
+import time
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+from ai_embedding.vector_index import VectorIndex, normalize_rows
+
+DIM = 768
+
+
+def _random_corpus(size: int, rng: np.random.Generator) -> np.ndarray:
+    """Genera embeddings aleatorios normalizados (como los de nomic)."""
+    return normalize_rows(rng.standard_normal((size, DIM), dtype=np.float32))
+
+
+def _bench_size(size: int, queries: np.ndarray, top_k: int) -> dict:
+    rng = np.random.default_rng(size)
+    corpus = _random_corpus(size, rng)
+
+    start = time.perf_counter()
+    ball_tree = NearestNeighbors(
+        n_neighbors=min(top_k, size), algorithm="ball_tree"
+    ).fit(corpus)
+    ball_build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = VectorIndex(corpus)
+    index_build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ball_results = [
+        ball_tree.kneighbors(q.reshape(1, -1), n_neighbors=top_k)[1][0] for q in queries
+    ]
+    ball_query = (time.perf_counter() - start) / len(queries)
+
+    start = time.perf_counter()
+    index_results = [index.search(q, top_k=top_k)[0] for q in queries]
+    index_query = (time.perf_counter() - start) / len(queries)
+
+    # Con vectores normalizados, distancia euclídea y coseno dan el mismo ranking
+    recall = np.mean(
+        [
+            len(set(a.tolist()) & set(b.tolist())) / top_k
+            for a, b in zip(ball_results, index_results)
+        ]
+    )
+
+    return {
+        "size": size,
+        "ball_build": ball_build,
+        "index_build": index_build,
+        "ball_query_ms": ball_query * 1000,
+        "index_query_ms": index_query * 1000,
+        "recall": recall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    queries = _random_corpus(args.queries, np.random.default_rng(0))
+
+    print(
+        f"{'chunks':>8} | {'build ball':>10} | {'build idx':>9} | "
+        f"{'query ball':>10} | {'query idx':>9} | {'speedup':>7} | {'recall':>6}"
+    )
+    for size in args.sizes:
+        r = _bench_size(size, queries, args.top_k)
+        speedup = r["ball_query_ms"] / r["index_query_ms"] if r["index_query_ms"] else 0
+        print(
+            f"{r['size']:>8} | {r['ball_build']:>9.3f}s | {r['index_build']:>8.3f}s | "
+            f"{r['ball_query_ms']:>8.3f}ms | {r['index_query_ms']:>7.3f}ms | "
+            f"{speedup:>6.1f}x | {r['recall']:>6.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,20 @@
+import asyncio
 import os
 import logging
 import telebot
 import time
 from telebot import types
 from typing import List, Dict, Any, Set, Optional
-from ai_embedding.extract import process_documents, search_similar_chunks_sklearn
-from ai_embedding.ai import answer_general_question, embed_question
-from constants import DOCUMENTS_FOLDER, DESIGN_CATEGORIES, CATEGORY_EMOJIS, CATEGORY_DESCRIPTIONS
+from ai_embedding.ai import answer_general_question
+from ai_embedding.hybrid_search import HybridSearcher
+from constants import DOCUMENTS_FOLDER, DESIGN_CATEGORIES, CATEGORY_EMOJIS, CATEGORY_DESCRIPTIONS, KNOWLEDGE_BASE_CONFIG, STREAMING_CONFIG, ADMISSION_CONFIG
 from core.state_manager import StateManager
 from core.onboarding import OnboardingSystem
 from core.search_service import AdvancedSearchService
 from core.admin_service import AdminService
+from core.knowledge_base import KnowledgeBase, KnowledgeSnapshot
+from core.request_queue import UserRequestQueue, AsyncUserRequestQueue
+from core.admission import AdmissionController
 from ai_embedding.adaptive_ai import AdaptiveAIService
 
 
@@ -41,17 +45,103 @@ def sanitize_markdown(text):
     return text
 
 
+class ProgressiveMessage:
+    """
+    Mensaje de estado que se va editando con la respuesta parcial del modelo.
+
+    Las ediciones se espacian al menos `edit_interval_seconds` y solo se
+    hacen si llegaron `min_chars_delta` caracteres nuevos, para no chocar
+    con el límite de ediciones de Telegram. Los parciales se envían sin
+    parse_mode porque el Markdown a medio generar suele ser inválido.
+    """
+
+    MAX_LENGTH = 4000
+    CURSOR = " ▌"
+
+    def __init__(self, bot, chat_id: int, message_id: int, config: Dict[str, Any] = STREAMING_CONFIG):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.interval = config['edit_interval_seconds']
+        self.min_delta = config['min_chars_delta']
+        self._last_edit = 0.0
+        self._last_length = 0
+
+    def _preview(self, text: str) -> Optional[str]:
+        """Texto parcial a mostrar, o None si aún no toca editar"""
+        now = time.monotonic()
+        if now - self._last_edit < self.interval or len(text) - self._last_length < self.min_delta:
+            return None
+        self._last_edit = now
+        self._last_length = len(text)
+        return text[: self.MAX_LENGTH - len(self.CURSOR)] + self.CURSOR
+
+    def update(self, text: str) -> None:
+        """Muestra el texto parcial si toca según el ritmo de edición"""
+        preview = self._preview(text)
+        if preview is None:
+            return
+        try:
+            self.bot.edit_message_text(preview, self.chat_id, self.message_id)
+        except Exception:
+            # Un parcial perdido no importa: el siguiente o el final lo reemplaza
+            pass
+
+    def finalize(self, text: str) -> bool:
+        """
+        Deja la respuesta final en el mismo mensaje.
+
+        Returns:
+            bool: False si no cabe en un mensaje o la edición falla; el
+            llamante debe entonces borrar el mensaje y enviarla por partes
+        """
+        if not text or len(text) > self.MAX_LENGTH:
+            return False
+        try:
+            self.bot.edit_message_text(text, self.chat_id, self.message_id, parse_mode="Markdown")
+            return True
+        except Exception:
+            return False
+
+
+class AsyncProgressiveMessage(ProgressiveMessage):
+    """`ProgressiveMessage` para AsyncTeleBot: las ediciones son corrutinas"""
+
+    async def update(self, text: str) -> None:
+        preview = self._preview(text)
+        if preview is None:
+            return
+        try:
+            await self.bot.edit_message_text(preview, self.chat_id, self.message_id)
+        except Exception:
+            pass
+
+    async def finalize(self, text: str) -> bool:
+        if not text or len(text) > self.MAX_LENGTH:
+            return False
+        try:
+            await self.bot.edit_message_text(text, self.chat_id, self.message_id, parse_mode="Markdown")
+            return True
+        except Exception:
+            return False
+
+
 class BotHandler:
-    def __init__(self, bot=None):
+    def __init__(self, bot=None, async_bot=None):
         """
         Inicializa el manejador del DesignBot UX/UI con funcionalidades avanzadas
 
         Args:
             bot: Instancia de TeleBot pasada desde main.py
+            async_bot: Instancia de AsyncTeleBot (runtime asíncrono) usada
+                por los métodos `*_async`
         """
         self._init_logging()
         self.bot = bot
-        self.processing_users = set()
+        self.async_bot = async_bot
+        # Consultas pendientes por usuario (FIFO acotada y ronda justa entre usuarios)
+        self.request_queue = UserRequestQueue()
+        self.async_request_queue = AsyncUserRequestQueue()
         
         # Inicializar servicios core
         print("🎨 Inicializando DesignBot con funcionalidades avanzadas...")
@@ -60,6 +150,13 @@ class BotHandler:
         self.onboarding_system = OnboardingSystem(bot, self.state_manager)
         self.admin_service = AdminService(bot, self.state_manager, self.search_service)
         self.adaptive_ai = AdaptiveAIService(self.state_manager, self.search_service)
+        self.admin_service.request_queue = self.async_request_queue if async_bot else self.request_queue
+        # Admisión global delante de la IA (prioriza admins y búsquedas cortas)
+        self.admission = AdmissionController()
+        self.admin_service.admission = self.admission
+        # Recuperación BM25 + vectorial, con respaldo solo léxico si falla el embedding
+        self.hybrid_search = HybridSearcher()
+        self.admin_service.hybrid_search = self.hybrid_search
         
         self._init_data()
 
@@ -69,20 +166,42 @@ class BotHandler:
 
     def _init_data(self):
         """Inicializa el acceso a los datos procesados"""
+        self.knowledge_base = KnowledgeBase(on_publish=self._on_knowledge_published)
         try:
-            # Procesamiento de PDFs/vectores realizado solo una vez al inicio
-            self.index_model, self.chunks = process_documents()
-            if not self.index_model or not self.chunks:
+            snapshot = self.knowledge_base.rebuild()
+            if not snapshot.ready:
                 self.logger.warning("No se pudieron cargar índices o documentos")
+            else:
+                self.logger.info(
+                    f"Índice vectorial listo: {len(snapshot.index_model)} vectores de {snapshot.index_model.dim} dimensiones"
+                )
         except Exception as e:
             self.logger.error(f"Error inicializando datos: {str(e)}")
-            self.index_model = None
-            self.chunks = []
+
+    def _on_knowledge_published(self, snapshot: KnowledgeSnapshot):
+        """Comparte el mapa id -> chunk de la nueva instantánea con la IA adaptativa"""
+        self.adaptive_ai.chunks_by_id = snapshot.chunks_by_id
+
+    @property
+    def index_model(self):
+        return self.knowledge_base.snapshot.index_model
+
+    @property
+    def chunks(self):
+        return self.knowledge_base.snapshot.chunks
+
+    @property
+    def chunks_by_id(self):
+        return self.knowledge_base.snapshot.chunks_by_id
+
+    def start_knowledge_watcher(self):
+        """Recarga la base de conocimiento en segundo plano cuando cambian los documentos"""
+        if KNOWLEDGE_BASE_CONFIG['watch_enabled']:
+            self.knowledge_base.start_watcher()
 
     def process_all_pdfs(self):
         """Procesa todos los PDFs para crear embeddings e índices"""
-        self.index_model, self.chunks = process_documents()
-        return bool(self.index_model and self.chunks)
+        return self.knowledge_base.rebuild().ready
 
     def start(self, message_or_call):
         """Maneja el comando start con onboarding avanzado"""
@@ -103,101 +222,164 @@ class BotHandler:
         # Iniciar onboarding inteligente
         self.onboarding_system.start_onboarding(message_or_call)
 
+    # Comandos de preguntas generales y su mensaje de estado
+    GENERAL_COMMANDS = {
+        "/design ": "design",
+        "/ux ": "ux",
+        "/ui ": "ui",
+        "/tools ": "tools",
+        "/ask ": "general",
+    }
+
+    GENERAL_HELP_MESSAGES = {
+        "design": "❌ **Formato correcto:** `/design [tu pregunta sobre diseño]`\n\n📝 *Ejemplo:* `/design principios de diseño visual`",
+        "ux": "❌ **Formato correcto:** `/ux [tu pregunta sobre UX]`\n\n📝 *Ejemplo:* `/ux cómo hacer user research efectivo`",
+        "ui": "❌ **Formato correcto:** `/ui [tu pregunta sobre UI]`\n\n📝 *Ejemplo:* `/ui mejores prácticas para botones`",
+        "tools": "❌ **Formato correcto:** `/tools [tu pregunta sobre herramientas]`\n\n📝 *Ejemplo:* `/tools cómo usar componentes en Figma`",
+        "general": "❌ **Formato correcto:** `/ask [tu pregunta]`\n\n📝 *Ejemplo:* `/ask diferencia entre UX y UI`"
+    }
+
+    GENERAL_STATUS_MESSAGES = {
+        "design": "🎨 Analizando principios de diseño...",
+        "ux": "👥 Consultando mejores prácticas de UX...",
+        "ui": "🖼️ Revisando patrones de interfaz...",
+        "tools": "🛠️ Buscando guías de herramientas...",
+        "general": "💭 Procesando tu consulta de diseño..."
+    }
+
+    def _queue_reply(self, ahead: Optional[int]) -> Optional[str]:
+        """Aviso al usuario según su posición en la cola (None si se atiende ya)"""
+        if ahead is None:
+            return (
+                f"⏳ Ya tienes {self.request_queue.max_pending} consultas en espera. "
+                "Espera a que responda alguna antes de enviar otra."
+            )
+        if ahead:
+            return f"📥 Consulta en cola: la responderé después de {ahead} consulta(s) anterior(es)."
+        return None
+
+    def _enqueue(self, message, job):
+        """Encola la consulta en la cola del usuario y le avisa si tendrá que esperar"""
+        reply = self._queue_reply(self.request_queue.submit(message.from_user.id, job))
+        if reply:
+            self.bot.send_message(message.chat.id, reply)
+
+    SHED_MESSAGE = (
+        "🚦 Ahora mismo hay demasiadas consultas en curso y no podría responderte a tiempo.\n\n"
+        "🔁 Intenta de nuevo en un minuto."
+    )
+
+    def _admission_lane(self, user_id: int, question: str, command_type: str) -> str:
+        """Carril de prioridad: administradores, búsquedas cortas y el resto de generaciones"""
+        if self.admin_service.is_admin(user_id):
+            return 'admin'
+        if command_type == "search" and len(question) <= ADMISSION_CONFIG['short_search_chars']:
+            return 'search'
+        return 'generation'
+
+    def _shed(self, message, event_type: str, details: Dict[str, Any]):
+        """Avisa al usuario de que su consulta no fue admitida y lo registra"""
+        self.bot.send_message(message.chat.id, self.SHED_MESSAGE)
+        self.admin_service.update_analytics(event_type, {
+            'user_id': message.from_user.id, **details, 'success': False, 'error': 'shed'
+        })
+
+    async def _shed_async(self, message, event_type: str, details: Dict[str, Any]):
+        await self.async_bot.send_message(message.chat.id, self.SHED_MESSAGE)
+        await asyncio.to_thread(self.admin_service.update_analytics, event_type, {
+            'user_id': message.from_user.id, **details, 'success': False, 'error': 'shed'
+        })
+
+    async def _enqueue_async(self, message, job):
+        """Versión asíncrona de `_enqueue` (la consulta es una corrutina)"""
+        reply = self._queue_reply(self.async_request_queue.submit(message.from_user.id, job))
+        if reply:
+            await self.async_bot.send_message(message.chat.id, reply)
+
+    def _parse_general_question(self, text: str):
+        """Determina el comando y extrae la pregunta: (pregunta, command_type)"""
+        for prefix, command_type in self.GENERAL_COMMANDS.items():
+            if text.startswith(prefix):
+                return text.replace(prefix, ""), command_type
+        return text.replace("/ask", "").strip(), "general"
+
+    @staticmethod
+    def _error_message(title: str, error: Exception, hint: str) -> str:
+        """Mensaje de error para el usuario, distinguiendo la saturación del servicio"""
+        if "timeout" in str(error).lower() or "connection" in str(error).lower():
+            return title + "\n\n⏱️ El servicio está experimentando alta demanda. Por favor, intenta nuevamente en unos momentos."
+        return title + "\n\n" + hint
+
+    def _general_error_message(self, error: Exception) -> str:
+        return self._error_message(
+            "❌ No pude generar una respuesta en este momento.",
+            error,
+            "💡 Intenta reformular tu pregunta de diseño o usar `/help` para ver otros comandos.",
+        )
+
+    def _search_error_message(self, error: Exception) -> str:
+        return self._error_message(
+            "❌ Error al procesar tu búsqueda.",
+            error,
+            "💡 Intenta reformular tu consulta o usar `/help` para ver otros comandos.",
+        )
+
     def handle_general_question(self, message):
-        """Maneja preguntas generales con IA adaptativa"""
-        start_time = time.perf_counter()
-        
+        """Maneja preguntas generales con IA adaptativa (encola la consulta del usuario)"""
         # Determinar el comando y extraer la pregunta
-        text = message.text
-        question = ""
-        command_type = "general"
-        
-        if text.startswith("/design "):
-            question = text.replace("/design ", "")
-            command_type = "design"
-        elif text.startswith("/ux "):
-            question = text.replace("/ux ", "")
-            command_type = "ux"
-        elif text.startswith("/ui "):
-            question = text.replace("/ui ", "")
-            command_type = "ui"
-        elif text.startswith("/tools "):
-            question = text.replace("/tools ", "")
-            command_type = "tools"
-        elif text.startswith("/ask "):
-            question = text.replace("/ask ", "")
-            command_type = "general"
-        else:
-            question = text.replace("/ask", "").strip()
+        question, command_type = self._parse_general_question(message.text)
         
         if not question:
-            help_messages = {
-                "design": "❌ **Formato correcto:** `/design [tu pregunta sobre diseño]`\n\n📝 *Ejemplo:* `/design principios de diseño visual`",
-                "ux": "❌ **Formato correcto:** `/ux [tu pregunta sobre UX]`\n\n📝 *Ejemplo:* `/ux cómo hacer user research efectivo`",
-                "ui": "❌ **Formato correcto:** `/ui [tu pregunta sobre UI]`\n\n📝 *Ejemplo:* `/ui mejores prácticas para botones`",
-                "tools": "❌ **Formato correcto:** `/tools [tu pregunta sobre herramientas]`\n\n📝 *Ejemplo:* `/tools cómo usar componentes en Figma`",
-                "general": "❌ **Formato correcto:** `/ask [tu pregunta]`\n\n📝 *Ejemplo:* `/ask diferencia entre UX y UI`"
-            }
-            
             self.bot.send_message(
                 message.chat.id,
-                help_messages.get(command_type, help_messages["general"]),
+                self.GENERAL_HELP_MESSAGES.get(command_type, self.GENERAL_HELP_MESSAGES["general"]),
                 parse_mode="Markdown",
             )
             return
 
+        self._enqueue(message, lambda: self._process_general_question(message, question, command_type))
+
+    def _process_general_question(self, message, question: str, command_type: str):
+        """Genera y envía la respuesta a una pregunta general"""
+        start_time = time.perf_counter()
         user_id = message.from_user.id
-        if user_id in self.processing_users:
-            self.bot.send_message(
-                message.chat.id,
-                "⏳ Ya estoy procesando tu consulta anterior. Por favor espera...",
-            )
+        ticket = self.admission.acquire(self._admission_lane(user_id, question, "general"))
+        if ticket is None:
+            self._shed(message, 'ai_response', {'command_type': command_type})
             return
-
-        self.processing_users.add(user_id)
         
         # Actualizar contexto y historial del usuario
         self.state_manager.update_user_context(user_id, f"question_{command_type}")
         self.state_manager.add_to_history(user_id, question)
         
-        # Mensaje contextual según el tipo de comando
-        context_messages = {
-            "design": "🎨 Analizando principios de diseño...",
-            "ux": "👥 Consultando mejores prácticas de UX...",
-            "ui": "🖼️ Revisando patrones de interfaz...",
-            "tools": "🛠️ Buscando guías de herramientas...",
-            "general": "💭 Procesando tu consulta de diseño..."
-        }
-        
         try:
             self.bot.send_chat_action(message.chat.id, "typing")
             status_msg = self.bot.send_message(
                 message.chat.id, 
-                context_messages.get(command_type, context_messages["general"])
+                self.GENERAL_STATUS_MESSAGES.get(command_type, self.GENERAL_STATUS_MESSAGES["general"])
             )
 
             self.logger.info(f"Generando respuesta adaptativa de {command_type} para usuario {user_id}: {question[:50]}...")
             
-            # Usar IA adaptativa para generar respuesta personalizada
+            # Usar IA adaptativa para generar respuesta personalizada,
+            # mostrándola en el mensaje de estado a medida que se genera
+            progress = ProgressiveMessage(self.bot, message.chat.id, status_msg.message_id)
             respuesta = self.adaptive_ai.generate_adaptive_response(
-                question, command_type, user_id
+                question, command_type, user_id,
+                on_text=progress.update if STREAMING_CONFIG['enabled'] else None,
             )
 
-            # Eliminar mensaje de estado
-            try:
-                self.bot.delete_message(message.chat.id, status_msg.message_id)
-            except:
-                pass
-
             safe_response = sanitize_markdown(respuesta)
 
-            if isinstance(safe_response, list):
-                for part in safe_response:
+            if isinstance(safe_response, list) or not progress.finalize(safe_response):
+                # Eliminar mensaje de estado y enviar la respuesta completa
+                try:
+                    self.bot.delete_message(message.chat.id, status_msg.message_id)
+                except:
+                    pass
+
+                for part in safe_response if isinstance(safe_response, list) else [safe_response]:
                     self.bot.send_message(message.chat.id, part, parse_mode="Markdown")
-            else:
-                self.bot.send_message(
-                    message.chat.id, safe_response, parse_mode="Markdown"
-                )
 
             # Actualizar analytics con tiempo de respuesta
             response_time = time.perf_counter() - start_time
@@ -216,14 +398,7 @@ class BotHandler:
             except:
                 pass
             
-            # Mensaje de error más específico
-            error_msg = "❌ No pude generar una respuesta en este momento."
-            if "timeout" in str(e).lower() or "connection" in str(e).lower():
-                error_msg += "\n\n⏱️ El servicio está experimentando alta demanda. Por favor, intenta nuevamente en unos momentos."
-            else:
-                error_msg += "\n\n💡 Intenta reformular tu pregunta de diseño o usar `/help` para ver otros comandos."
-            
-            self.bot.send_message(message.chat.id, error_msg)
+            self.bot.send_message(message.chat.id, self._general_error_message(e))
             
             # Actualizar analytics de error
             self.admin_service.update_analytics('ai_response', {
@@ -237,48 +412,213 @@ class BotHandler:
             self.logger.info(
                 f"Tiempo de respuesta de handle_general_question para usuario {user_id}: {elapsed:.3f} segundos"
             )
-            self.processing_users.discard(user_id)
+            self.admission.release(ticket)
 
-    def handle_embedding_search(self, message):
-        """Busca documentos con búsqueda contextual avanzada"""
+    async def handle_general_question_async(self, message):
+        """Versión asíncrona de `handle_general_question` (usa `self.async_bot`)"""
+        question, command_type = self._parse_general_question(message.text)
+
+        if not question:
+            await self.async_bot.send_message(
+                message.chat.id,
+                self.GENERAL_HELP_MESSAGES.get(command_type, self.GENERAL_HELP_MESSAGES["general"]),
+                parse_mode="Markdown",
+            )
+            return
+
+        await self._enqueue_async(
+            message, lambda: self._process_general_question_async(message, question, command_type)
+        )
+
+    async def _process_general_question_async(self, message, question: str, command_type: str):
+        """Versión asíncrona de `_process_general_question`"""
+        bot = self.async_bot
         start_time = time.perf_counter()
+        user_id = message.from_user.id
+        ticket = await self.admission.acquire_async(self._admission_lane(user_id, question, "general"))
+        if ticket is None:
+            await self._shed_async(message, 'ai_response', {'command_type': command_type})
+            return
+        await asyncio.to_thread(self.state_manager.update_user_context, user_id, f"question_{command_type}")
+        await asyncio.to_thread(self.state_manager.add_to_history, user_id, question)
+
+        status_msg = None
+        try:
+            await bot.send_chat_action(message.chat.id, "typing")
+            status_msg = await bot.send_message(
+                message.chat.id,
+                self.GENERAL_STATUS_MESSAGES.get(command_type, self.GENERAL_STATUS_MESSAGES["general"])
+            )
+
+            self.logger.info(f"Generando respuesta adaptativa de {command_type} para usuario {user_id}: {question[:50]}...")
+
+            progress = AsyncProgressiveMessage(bot, message.chat.id, status_msg.message_id)
+            respuesta = await self.adaptive_ai.generate_adaptive_response_async(
+                question, command_type, user_id,
+                on_text=progress.update if STREAMING_CONFIG['enabled'] else None,
+            )
+
+            safe_response = sanitize_markdown(respuesta)
+
+            if isinstance(safe_response, list) or not await progress.finalize(safe_response):
+                try:
+                    await bot.delete_message(message.chat.id, status_msg.message_id)
+                except Exception:
+                    pass
+
+                for part in safe_response if isinstance(safe_response, list) else [safe_response]:
+                    await bot.send_message(message.chat.id, part, parse_mode="Markdown")
+            status_msg = None
+
+            await asyncio.to_thread(self.admin_service.update_analytics, 'ai_response', {
+                'user_id': user_id,
+                'command_type': command_type,
+                'response_time': time.perf_counter() - start_time,
+                'success': True
+            })
+
+        except Exception as e:
+            self.logger.error(f"Error en handle_general_question_async para usuario {user_id}: {str(e)}")
+            if status_msg:
+                try:
+                    await bot.delete_message(message.chat.id, status_msg.message_id)
+                except Exception:
+                    pass
+
+            await bot.send_message(message.chat.id, self._general_error_message(e))
+
+            await asyncio.to_thread(self.admin_service.update_analytics, 'ai_response', {
+                'user_id': user_id,
+                'command_type': command_type,
+                'success': False,
+                'error': str(e)
+            })
+        finally:
+            elapsed = time.perf_counter() - start_time
+            self.logger.info(
+                f"Tiempo de respuesta de handle_general_question_async para usuario {user_id}: {elapsed:.3f} segundos"
+            )
+            self.admission.release(ticket)
+
+    def _search_help_text(self, user_id: int) -> str:
+        """Ayuda de /search con sugerencias personalizadas y búsquedas populares"""
+        suggestions = self.search_service.get_search_suggestions(user_id)
+        trending = self.search_service.get_trending_searches()
+        
+        suggestion_text = (
+            "🔍 **Búsqueda Inteligente**\n\n"
+            "❌ Formato correcto: `/search [tu consulta]`\n\n"
+        )
+        
+        if suggestions:
+            suggestion_text += "💡 **Sugerencias personalizadas:**\n"
+            for suggestion in suggestions[:5]:
+                suggestion_text += f"• {suggestion}\n"
+            suggestion_text += "\n"
+        
+        if trending:
+            suggestion_text += "🔥 **Búsquedas populares:**\n"
+            for trend in trending[:5]:
+                suggestion_text += f"• {trend}\n"
+        
+        suggestion_text += "\n📝 *Ejemplo:* `/search atomic design system`"
+        return suggestion_text
+
+    def _build_search_references(self, similar_chunks):
+        """
+        Agrupa las referencias de los resultados por documento.
+
+        Returns:
+            tuple: (texto de referencias o None, teclado de descargas o None)
+        """
+        # Diccionario para agrupar referencias por documento
+        doc_refs = {}  # {documento: set(páginas)}
+
+        # Extraer información única de documentos y páginas
+        for chunk in similar_chunks:
+            doc_name = chunk.get("document", "")
+            if not doc_name:
+                continue
+
+            # Convertir a nombre base del documento
+            base_name = os.path.basename(doc_name)
+            pretty_name = base_name.replace(".pdf", "").replace("_", " ")
+
+            # Extraer páginas únicas
+            pages = chunk.get("pages", [])
+
+            # Agregar al diccionario, combinando las páginas si ya existe
+            if pretty_name in doc_refs:
+                doc_refs[pretty_name].update(pages)
+            else:
+                doc_refs[pretty_name] = set(pages)
+
+        if not doc_refs:
+            return None, None
+
+        # Crear mensaje de referencias
+        ref_text = "📚 Referencias consultadas:\n\n"
+
+        for doc_name, pages in doc_refs.items():
+            # Ordenar páginas para presentación
+            sorted_pages = sorted(pages)
+            pages_str = (
+                ", ".join(map(str, sorted_pages)) if sorted_pages else "N/A"
+            )
+            ref_text += f"• {doc_name} (Pág: {pages_str})\n"
+
+        # Crear botones de descarga (solo uno por documento)
+        keyboard = types.InlineKeyboardMarkup()
+
+        for doc_pretty_name in doc_refs.keys():
+            # Buscar documento en sistema de archivos
+            for pdf_path in self.find_pdf_files(DOCUMENTS_FOLDER):
+                base_name = os.path.basename(pdf_path)
+                pdf_pretty_name = base_name.replace(".pdf", "").replace(
+                    "_", " "
+                )
+
+                if pdf_pretty_name == doc_pretty_name:
+                    # Encontramos el documento, crear botón de descarga
+                    rel_path = os.path.relpath(pdf_path, DOCUMENTS_FOLDER)
+                    keyboard.add(
+                        types.InlineKeyboardButton(
+                            f"📥 Descargar {doc_pretty_name}",
+                            callback_data=f"download#{rel_path}",
+                        )
+                    )
+                    break
+
+        # Botones solo si hay documentos para descargar
+        return ref_text, keyboard if keyboard.keyboard else None
+
+    @staticmethod
+    def _split_answer(answer: str) -> List[str]:
+        """Divide la respuesta en mensajes de 4000 caracteres como máximo"""
+        if len(answer) > 4000:
+            return [answer[i : i + 4000] for i in range(0, len(answer), 4000)]
+        return [answer]
+
+    def handle_embedding_search(self, message):
+        """Busca documentos con búsqueda contextual avanzada (encola la consulta del usuario)"""
         question = message.text.replace("/search ", "")
         if not question or question == "/search":
             # Mostrar sugerencias de búsqueda personalizadas
-            user_id = message.from_user.id
-            suggestions = self.search_service.get_search_suggestions(user_id)
-            trending = self.search_service.get_trending_searches()
-            
-            suggestion_text = (
-                "🔍 **Búsqueda Inteligente**\n\n"
-                "❌ Formato correcto: `/search [tu consulta]`\n\n"
+            self.bot.send_message(
+                message.chat.id, self._search_help_text(message.from_user.id), parse_mode="Markdown"
             )
-            
-            if suggestions:
-                suggestion_text += "💡 **Sugerencias personalizadas:**\n"
-                for suggestion in suggestions[:5]:
-                    suggestion_text += f"• {suggestion}\n"
-                suggestion_text += "\n"
-            
-            if trending:
-                suggestion_text += "🔥 **Búsquedas populares:**\n"
-                for trend in trending[:5]:
-                    suggestion_text += f"• {trend}\n"
-            
-            suggestion_text += "\n📝 *Ejemplo:* `/search atomic design system`"
-            
-            self.bot.send_message(message.chat.id, suggestion_text, parse_mode="Markdown")
             return
 
+        self._enqueue(message, lambda: self._process_embedding_search(message, question))
+
+    def _process_embedding_search(self, message, question: str):
+        """Busca documentos relevantes y responde con IA adaptativa"""
+        start_time = time.perf_counter()
         user_id = message.from_user.id
-        if user_id in self.processing_users:
-            self.bot.send_message(
-                message.chat.id,
-                "⏳ Ya estoy procesando tu consulta anterior. Por favor espera...",
-            )
+        ticket = self.admission.acquire(self._admission_lane(user_id, question, "search"))
+        if ticket is None:
+            self._shed(message, 'search', {'query': question})
             return
-
-        self.processing_users.add(user_id)
         
         # Actualizar contexto y estadísticas de búsqueda
         self.state_manager.update_user_context(user_id, "search")
@@ -299,8 +639,11 @@ class BotHandler:
                 question, user_id
             )
 
+            # Una sola lectura de la instantánea: índice y chunks siempre de la misma versión
+            knowledge = self.knowledge_base.snapshot
+
             # Verificación de datos disponibles
-            if not self.index_model or not self.chunks:
+            if not knowledge.searchable:
                 try:
                     self.bot.delete_message(message.chat.id, status_msg.message_id)
                 except:
@@ -311,9 +654,9 @@ class BotHandler:
                 )
                 return
 
-            # Generación de embedding para la búsqueda mejorada
-            question_embedding = embed_question(enhanced_query)
-            if not question_embedding:
+            # Embedding de la búsqueda mejorada (se omite en modo léxico o con la API caída)
+            question_embedding = self.hybrid_search.embed_query(enhanced_query)
+            if question_embedding is None and not self.hybrid_search.lexical_available(knowledge):
                 try:
                     self.bot.delete_message(message.chat.id, status_msg.message_id)
                 except:
@@ -324,9 +667,9 @@ class BotHandler:
                 )
                 return
 
-            # Búsqueda semántica de documentos relevantes
-            similar_chunks = search_similar_chunks_sklearn(
-                question_embedding, self.index_model, self.chunks, top_k=5
+            # Búsqueda híbrida de documentos relevantes (BM25 + semántica)
+            similar_chunks, retrieval_mode = self.hybrid_search.search(
+                enhanced_query, question_embedding, knowledge, top_k=5
             )
 
             if not similar_chunks:
@@ -351,95 +694,36 @@ class BotHandler:
                 pass
 
             # Generar respuesta usando IA adaptativa con contexto de documentos
+            progress = ProgressiveMessage(self.bot, message.chat.id, status_msg.message_id)
             answer = self.adaptive_ai.generate_adaptive_response(
-                question, "search", user_id, similar_chunks
+                question, "search", user_id, similar_chunks,
+                on_text=progress.update if STREAMING_CONFIG['enabled'] else None,
             )
 
-            # Eliminar mensaje de estado
-            try:
-                self.bot.delete_message(message.chat.id, status_msg.message_id)
-            except:
-                pass
+            if not progress.finalize(answer):
+                # Eliminar mensaje de estado
+                try:
+                    self.bot.delete_message(message.chat.id, status_msg.message_id)
+                except:
+                    pass
 
-            # Enviar la respuesta principal (dividida si es necesaria)
-            if len(answer) > 4000:
-                chunks = [answer[i : i + 4000] for i in range(0, len(answer), 4000)]
-                for chunk in chunks:
-                    self.bot.send_message(message.chat.id, chunk, parse_mode="Markdown")
-            else:
+                # Enviar la respuesta principal (dividida si es necesaria)
+                for part in self._split_answer(answer):
+                    self.bot.send_message(message.chat.id, part, parse_mode="Markdown")
+            # El mensaje de estado ya contiene la respuesta o fue eliminado
+            status_msg = None
+
+            # Referencias únicas y botones de descarga
+            ref_text, keyboard = self._build_search_references(similar_chunks)
+            if ref_text:
+                self.bot.send_message(message.chat.id, ref_text)
+            if keyboard:
                 self.bot.send_message(
-                    message.chat.id, answer, parse_mode="Markdown"
+                    message.chat.id,
+                    "Selecciona un documento para descargar:",
+                    reply_markup=keyboard,
                 )
 
-            # Manejo mejorado de referencias
-            if similar_chunks:
-                # Diccionario para agrupar referencias por documento
-                doc_refs = {}  # {documento: set(páginas)}
-
-                # Extraer información única de documentos y páginas
-                for chunk in similar_chunks:
-                    doc_name = chunk.get("document", "")
-                    if not doc_name:
-                        continue
-
-                    # Convertir a nombre base del documento
-                    base_name = os.path.basename(doc_name)
-                    pretty_name = base_name.replace(".pdf", "").replace("_", " ")
-
-                    # Extraer páginas únicas
-                    pages = chunk.get("pages", [])
-
-                    # Agregar al diccionario, combinando las páginas si ya existe
-                    if pretty_name in doc_refs:
-                        doc_refs[pretty_name].update(pages)
-                    else:
-                        doc_refs[pretty_name] = set(pages)
-
-                # Crear mensaje de referencias
-                if doc_refs:
-                    ref_text = "📚 Referencias consultadas:\n\n"
-
-                    for doc_name, pages in doc_refs.items():
-                        # Ordenar páginas para presentación
-                        sorted_pages = sorted(pages)
-                        pages_str = (
-                            ", ".join(map(str, sorted_pages)) if sorted_pages else "N/A"
-                        )
-                        ref_text += f"• {doc_name} (Pág: {pages_str})\n"
-
-                    # Enviar mensaje con referencias únicas
-                    self.bot.send_message(message.chat.id, ref_text)
-
-                    # Crear botones de descarga (solo uno por documento)
-                    keyboard = types.InlineKeyboardMarkup()
-
-                    for doc_pretty_name in doc_refs.keys():
-                        # Buscar documento en sistema de archivos
-                        for pdf_path in self.find_pdf_files(DOCUMENTS_FOLDER):
-                            base_name = os.path.basename(pdf_path)
-                            pdf_pretty_name = base_name.replace(".pdf", "").replace(
-                                "_", " "
-                            )
-
-                            if pdf_pretty_name == doc_pretty_name:
-                                # Encontramos el documento, crear botón de descarga
-                                rel_path = os.path.relpath(pdf_path, DOCUMENTS_FOLDER)
-                                keyboard.add(
-                                    types.InlineKeyboardButton(
-                                        f"📥 Descargar {doc_pretty_name}",
-                                        callback_data=f"download#{rel_path}",
-                                    )
-                                )
-                                break
-
-                    # Enviar botones solo si hay documentos para descargar
-                    if keyboard.keyboard:
-                        self.bot.send_message(
-                            message.chat.id,
-                            "Selecciona un documento para descargar:",
-                            reply_markup=keyboard,
-                        )
-
             # Actualizar analytics de búsqueda
             response_time = time.perf_counter() - start_time
             self.admin_service.update_analytics('search', {
@@ -447,6 +731,7 @@ class BotHandler:
                 'query': question,
                 'enhanced_query': enhanced_query,
                 'results_count': len(similar_chunks),
+                'retrieval': retrieval_mode,
                 'response_time': response_time,
                 'success': True
             })
@@ -461,14 +746,7 @@ class BotHandler:
                 except:
                     pass
             
-            # Mensaje de error específico
-            error_msg = "❌ Error al procesar tu búsqueda."
-            if "timeout" in str(e).lower() or "connection" in str(e).lower():
-                error_msg += "\n\n⏱️ El servicio está experimentando alta demanda. Por favor, intenta nuevamente en unos momentos."
-            else:
-                error_msg += "\n\n💡 Intenta reformular tu consulta o usar `/help` para ver otros comandos."
-            
-            self.bot.send_message(message.chat.id, error_msg)
+            self.bot.send_message(message.chat.id, self._search_error_message(e))
 
             self.admin_service.update_analytics('search', {
                 'user_id': user_id,
@@ -481,7 +759,137 @@ class BotHandler:
             self.logger.info(
                 f"Tiempo de respuesta de handle_embedding_search para usuario {user_id}: {elapsed:.3f} segundos"
             )
-            self.processing_users.discard(user_id)
+            self.admission.release(ticket)
+
+    async def handle_embedding_search_async(self, message):
+        """Versión asíncrona de `handle_embedding_search` (usa `self.async_bot`)"""
+        question = message.text.replace("/search ", "")
+        if not question or question == "/search":
+            help_text = await asyncio.to_thread(self._search_help_text, message.from_user.id)
+            await self.async_bot.send_message(message.chat.id, help_text, parse_mode="Markdown")
+            return
+
+        await self._enqueue_async(message, lambda: self._process_embedding_search_async(message, question))
+
+    async def _process_embedding_search_async(self, message, question: str):
+        """Versión asíncrona de `_process_embedding_search`"""
+        bot = self.async_bot
+        start_time = time.perf_counter()
+        user_id = message.from_user.id
+        ticket = await self.admission.acquire_async(self._admission_lane(user_id, question, "search"))
+        if ticket is None:
+            await self._shed_async(message, 'search', {'query': question})
+            return
+        await asyncio.to_thread(self.state_manager.update_user_context, user_id, "search")
+        await asyncio.to_thread(self.state_manager.update_search_stats, user_id, question)
+
+        status_msg = None
+        try:
+            await bot.send_chat_action(message.chat.id, "typing")
+            status_msg = await bot.send_message(
+                message.chat.id,
+                "🔍 Realizando búsqueda contextual inteligente..."
+            )
+
+            self.logger.info(f"Búsqueda contextual para usuario {user_id}: {question[:50]}...")
+
+            enhanced_query, enhanced_filters = await asyncio.to_thread(
+                self.search_service.contextual_search, question, user_id
+            )
+            knowledge = self.knowledge_base.snapshot
+
+            failure = None
+            similar_chunks = []
+            retrieval_mode = None
+            if not knowledge.searchable:
+                failure = "⚠️ No hay documentos procesados disponibles para búsqueda."
+            else:
+                question_embedding = await self.hybrid_search.embed_query_async(enhanced_query)
+                if question_embedding is None and not self.hybrid_search.lexical_available(knowledge):
+                    failure = "❌ No pude procesar tu consulta. Intenta con otra pregunta."
+                else:
+                    similar_chunks, retrieval_mode = await asyncio.to_thread(
+                        self.hybrid_search.search, enhanced_query, question_embedding, knowledge, top_k=5
+                    )
+                    if not similar_chunks:
+                        failure = "❓ No encontré documentos relacionados con tu consulta."
+
+            if failure:
+                try:
+                    await bot.delete_message(message.chat.id, status_msg.message_id)
+                except Exception:
+                    pass
+                status_msg = None
+                await bot.send_message(message.chat.id, failure)
+                return
+
+            try:
+                await bot.edit_message_text(
+                    "🤖 Generando respuesta personalizada con IA adaptativa...",
+                    message.chat.id,
+                    status_msg.message_id
+                )
+            except Exception:
+                pass
+
+            progress = AsyncProgressiveMessage(bot, message.chat.id, status_msg.message_id)
+            answer = await self.adaptive_ai.generate_adaptive_response_async(
+                question, "search", user_id, similar_chunks,
+                on_text=progress.update if STREAMING_CONFIG['enabled'] else None,
+            )
+
+            if not await progress.finalize(answer):
+                try:
+                    await bot.delete_message(message.chat.id, status_msg.message_id)
+                except Exception:
+                    pass
+
+                for part in self._split_answer(answer):
+                    await bot.send_message(message.chat.id, part, parse_mode="Markdown")
+            status_msg = None
+
+            ref_text, keyboard = await asyncio.to_thread(self._build_search_references, similar_chunks)
+            if ref_text:
+                await bot.send_message(message.chat.id, ref_text)
+            if keyboard:
+                await bot.send_message(
+                    message.chat.id,
+                    "Selecciona un documento para descargar:",
+                    reply_markup=keyboard,
+                )
+
+            await asyncio.to_thread(self.admin_service.update_analytics, 'search', {
+                'user_id': user_id,
+                'query': question,
+                'enhanced_query': enhanced_query,
+                'results_count': len(similar_chunks),
+                'retrieval': retrieval_mode,
+                'response_time': time.perf_counter() - start_time,
+                'success': True
+            })
+
+        except Exception as e:
+            self.logger.error(f"Error en handle_embedding_search_async para usuario {user_id}: {str(e)}")
+            if status_msg:
+                try:
+                    await bot.delete_message(message.chat.id, status_msg.message_id)
+                except Exception:
+                    pass
+
+            await bot.send_message(message.chat.id, self._search_error_message(e))
+
+            await asyncio.to_thread(self.admin_service.update_analytics, 'search', {
+                'user_id': user_id,
+                'query': question,
+                'success': False,
+                'error': str(e)
+            })
+        finally:
+            elapsed = time.perf_counter() - start_time
+            self.logger.info(
+                f"Tiempo de respuesta de handle_embedding_search_async para usuario {user_id}: {elapsed:.3f} segundos"
+            )
+            self.admission.release(ticket)
 
     # Nuevos métodos para funcionalidades avanzadas
     def handle_preferences_command(self, message):
@@ -759,7 +1167,7 @@ class BotHandler:
         session.preferences["interests"] = []
         
         # Guardar cambios
-        self.state_manager._save_sessions()
+        self.state_manager.flush()
         
         reset_text = (
             "🔄 **Onboarding reiniciado**\n\n"
@@ -5,10 +5,20 @@ import os
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
-EMBEDDINGS_FILE = os.path.join(ROOT_DIR, "Bot", "data", "embeddings_data.pkl")
-INDEX_FILE = os.path.join(ROOT_DIR, "Bot", "data", "vector_index.pkl")
+DATA_FOLDER = os.path.join(ROOT_DIR, "Bot", "data")
+EMBEDDINGS_FILE = os.path.join(DATA_FOLDER, "embeddings_data.pkl")  # Formato antiguo (solo migración)
+INDEX_FILE = os.path.join(DATA_FOLDER, "vector_index.pkl")
+EMBEDDINGS_MATRIX_FILE = os.path.join(DATA_FOLDER, "embeddings.npy")
+EMBEDDING_IDS_FILE = os.path.join(DATA_FOLDER, "embedding_ids.npy")
+CHUNKS_METADATA_FILE = os.path.join(DATA_FOLDER, "chunks_metadata.jsonl")
+STORE_INFO_FILE = os.path.join(DATA_FOLDER, "store_info.json")
+DOCUMENTS_MANIFEST_FILE = os.path.join(DATA_FOLDER, "documents_manifest.json")
+QUERY_EMBEDDING_CACHE_FILE = os.path.join(DATA_FOLDER, "query_embeddings.sqlite3")
+LEXICAL_INDEX_FILE = os.path.join(DATA_FOLDER, "lexical_index.json")  # Índice BM25 sobre el texto de los chunks
 DOCUMENTS_FOLDER = os.path.join(ROOT_DIR, "Bot", "Design_Resources")
 LOGS_FOLDER = os.path.join(ROOT_DIR, "Bot", "logs")
+BOT_DATABASE_FILE = os.path.join(LOGS_FOLDER, "bot_state.sqlite3")  # Sesiones, búsquedas y analytics
+DESIGN_SYNONYMS_FILE = os.path.join(ROOT_DIR, "Bot", "core", "design_synonyms.json")  # Sinónimos y herramientas para expandir consultas
 
 # Categorías esenciales de recursos de diseño UX/UI (simplificadas y más accesibles)
 DESIGN_CATEGORIES = {
@@ -85,6 +95,117 @@ SEARCH_CONFIG = {
     'trending_window_days': 7
 }
 
+# Recuperación híbrida (BM25 + vectorial)
+HYBRID_SEARCH_CONFIG = {
+    'mode': 'hybrid',                  # 'hybrid', 'vector' o 'lexical' (sin llamar a la API de embeddings)
+    'candidates': 20,                  # resultados de cada buscador antes de fusionar
+    'rrf_k': 60,                       # constante de reciprocal rank fusion
+    'bm25_k1': 1.5,
+    'bm25_b': 0.75,
+    'embedding_timeout_seconds': 8,    # más lento que esto se responde solo con BM25
+    'embedding_cooldown_seconds': 60   # tras un fallo del embedding, búsquedas solo léxicas durante este tiempo
+}
+
+# Ingesta de documentos
+INGESTION_CONFIG = {
+    'extraction_workers': min(4, os.cpu_count() or 1),  # procesos para extraer texto de PDFs; 1 = secuencial
+    'queue_size': 8,  # lotes pendientes como máximo entre etapas del pipeline
+    'embed_batch_chunks': 32,  # fragmentos por lote de embeddings
+    'index_batch_chunks': 256  # fragmentos por escritura en el almacén
+}
+
+# Fragmentación de documentos
+CHUNKING_CONFIG = {
+    'strategy': 'structured',  # 'structured' (páginas, párrafos y títulos) o 'fixed' (bloques de caracteres del formato anterior)
+    'target_tokens': 350,      # tamaño buscado por fragmento
+    'max_tokens': 600,         # un párrafo más largo se parte por frases
+    'min_tokens': 60,          # fragmentos más cortos se unen al siguiente (salvo antes de un título)
+    'overlap_tokens': 40,      # frases finales repetidas al inicio del siguiente fragmento
+    'chars_per_token': 4,      # estimación, igual que en EMBEDDING_CONFIG
+    'fixed_block_chars': 12500,
+    'fixed_overlap_chars': 500
+}
+
+# Cliente de embeddings (peticiones por lotes)
+EMBEDDING_CONFIG = {
+    'model': 'nomic-ai/nomic-embed-text-v1.5',
+    'dimensions': 768,
+    'max_batch_tokens': 60000,  # presupuesto estimado (~4 caracteres por token) por petición
+    'max_batch_items': 96,
+    'batch_timeout': 60
+}
+
+# Caché de embeddings de consultas
+EMBEDDING_CACHE_CONFIG = {
+    'memory_entries': 1024,
+    'disk_entries': 50000,
+    'ttl_hours': 24 * 30
+}
+
+# Caché semántico de respuestas generales (/ask, /design, /ux, /ui, /tools)
+ANSWER_CACHE_CONFIG = {
+    'enabled': True,
+    'similarity_threshold': 0.95,  # similitud coseno mínima entre preguntas
+    'ttl_hours': 24,
+    'max_entries': 500
+}
+
+# Limitador adaptativo (token bucket + AIMD) compartido por las llamadas a la API de IA
+RATE_LIMITER_CONFIG = {
+    'initial_rate': 2.0,  # peticiones por segundo
+    'min_rate': 0.2,
+    'max_rate': 20.0,
+    'additive_increase': 0.25,  # req/s añadidas por cada respuesta 2xx
+    'decrease_factor': 0.5,  # multiplicador de tasa y concurrencia ante un 429
+    'initial_concurrency': 2,
+    'max_concurrency': 8,
+    'max_throttle_retries': 4  # reintentos tras un 429 antes de rendirse
+}
+
+# Recarga de la base de conocimiento
+KNOWLEDGE_BASE_CONFIG = {
+    'watch_enabled': True,
+    'watch_interval_seconds': 30  # un cambio se procesa tras dos lecturas iguales de la carpeta
+}
+
+# Persistencia de sesiones de usuario
+SESSION_CONFIG = {
+    'flush_interval_seconds': 5  # las sesiones modificadas se guardan en segundo plano con este intervalo
+}
+
+ANALYTICS_CONFIG = {
+    'flush_interval_seconds': 5,          # los eventos se añaden al registro en lotes con este intervalo
+    'compaction_interval_seconds': 3600,  # cada cuánto se pliegan los eventos en los agregados diarios
+    'event_retention_days': 30            # eventos individuales conservados tras compactarse
+}
+
+# Cola de consultas por usuario
+REQUEST_QUEUE_CONFIG = {
+    'max_pending_per_user': 3,  # consultas en espera por usuario (sin contar la que está en curso)
+    'workers': 16,              # hilos que atienden consultas (más que ADMISSION_CONFIG['max_in_flight'] para que los carriles prioritarios no esperen hilo)
+    'async_workers': 100        # consultas simultáneas en el runtime asíncrono
+}
+
+# Control de admisión delante de las llamadas a la IA
+ADMISSION_CONFIG = {
+    'max_in_flight': 6,               # consultas trabajando a la vez contra la API
+    'max_waiting': 50,                # consultas esperando turno
+    'initial_service_seconds': 8.0,   # duración estimada de una consulta hasta tener datos reales
+    'short_search_chars': 120,        # un /search más corto va al carril prioritario de búsqueda
+    'deadline_seconds': {             # espera máxima por carril antes de rechazar
+        'admin': 60,
+        'search': 20,
+        'generation': 30
+    }
+}
+
+# Configuración de respuestas en streaming
+STREAMING_CONFIG = {
+    'enabled': True,
+    'edit_interval_seconds': 1.0,  # Telegram limita las ediciones por chat; no editar más seguido
+    'min_chars_delta': 40          # caracteres nuevos mínimos para volver a editar
+}
+
 # Configuración de IA adaptativa
 AI_CONFIG = {
     'max_context_length': 2000,
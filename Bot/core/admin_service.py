@@ -5,6 +5,9 @@ import os
 from datetime import datetime, timedelta
 from telebot import types
 from constants import ADMIN_USER_IDS, LOGS_FOLDER, RATE_LIMITS, QUALITY_METRICS
+from ai_embedding.ai import api_rate_limiter, query_embedding_cache
+from ai_embedding.adaptive_ai import semantic_answer_cache
+from core.analytics import AnalyticsLog
 
 class AdminService:
     def __init__(self, bot, state_manager, search_service):
@@ -13,7 +16,14 @@ class AdminService:
         self.search_service = search_service
         self.analytics_file = os.path.join(LOGS_FOLDER, "bot_analytics.json")
         self.rate_limit_data = {}
-        self._load_analytics()
+        # Cola de consultas del runtime activo (la asigna BotHandler)
+        self.request_queue = None
+        # Control de admisión delante de la IA (lo asigna BotHandler)
+        self.admission = None
+        # Recuperación híbrida BM25 + vectorial (la asigna BotHandler)
+        self.hybrid_search = None
+        self.state_manager.db.import_legacy_json(self.analytics_file, self._import_legacy_analytics)
+        self.analytics = AnalyticsLog(self.state_manager.db)
     
     def is_admin(self, user_id: int) -> bool:
         """Verifica si el usuario es administrador"""
@@ -155,8 +165,50 @@ class AdminService:
             f"📁 **Sistema:**\n"
             f"• Documentos indexados: {perf_data['indexed_documents']}\n"
             f"• Tamaño de embeddings: {perf_data['embeddings_size_mb']:.1f} MB\n"
-            f"• Uso de memoria: {perf_data['memory_usage']:.1f}%"
+            f"• Uso de memoria: {perf_data['memory_usage']:.1f}%\n\n"
+            f"🌐 **API de IA:**\n"
+            f"• Tasa permitida: {perf_data['api_limiter']['rate_per_second']:.2f} req/s\n"
+            f"• Concurrencia: {perf_data['api_limiter']['in_flight']}/{perf_data['api_limiter']['concurrency']}\n"
+            f"• Respuestas 429: {perf_data['api_limiter']['throttled_count']}\n"
+            f"• Caché de embeddings: {perf_data['query_cache']['hit_rate']:.1f}% aciertos "
+            f"({perf_data['query_cache']['hits']}/{perf_data['query_cache']['hits'] + perf_data['query_cache']['misses']})\n"
+            f"• Caché de respuestas: {perf_data['answer_cache']['hit_rate']:.1f}% aciertos "
+            f"({perf_data['answer_cache']['entries']} respuestas)"
         )
+
+        queue_stats = perf_data['request_queue']
+        if queue_stats:
+            performance_text += (
+                f"\n\n📥 **Cola de consultas:**\n"
+                f"• En espera: {queue_stats['pending']} ({queue_stats['users_waiting']} usuarios, "
+                f"máx. {queue_stats['max_user_depth']} por usuario)\n"
+                f"• En curso: {queue_stats['running']}\n"
+                f"• Espera media: {queue_stats['avg_wait_seconds']:.2f} s (máx. {queue_stats['max_wait_seconds']:.2f} s)\n"
+                f"• Atendidas: {queue_stats['processed']} | Rechazadas por cola llena: {queue_stats['rejected']}"
+            )
+
+        admission_stats = perf_data['admission']
+        if admission_stats:
+            waiting = admission_stats['waiting']
+            shed = admission_stats['shed']
+            performance_text += (
+                f"\n\n🚦 **Admisión a la IA:**\n"
+                f"• En curso: {admission_stats['in_flight']}/{admission_stats['max_in_flight']}\n"
+                f"• Esperando: admin {waiting['admin']}, búsqueda {waiting['search']}, generación {waiting['generation']}\n"
+                f"• Duración media: {admission_stats['avg_service_seconds']:.1f}s\n"
+                f"• Rechazadas: {sum(shed.values())} ({admission_stats['timed_out']} por plazo agotado)"
+            )
+
+        retrieval_stats = perf_data['hybrid_search']
+        if retrieval_stats:
+            searches = retrieval_stats['searches']
+            performance_text += (
+                f"\n\n🔎 **Recuperación de documentos:**\n"
+                f"• Modo: {retrieval_stats['mode']}"
+                f"{' (solo léxico: embeddings no disponibles)' if retrieval_stats['lexical_only'] else ''}\n"
+                f"• Búsquedas: híbridas {searches['hybrid']}, vectoriales {searches['vector']}, léxicas {searches['lexical']}\n"
+                f"• Fallos de embedding: {retrieval_stats['embedding_failures']}"
+            )
         
         # Indicators de estado
         indicators = []
@@ -267,7 +319,6 @@ class AdminService:
     # Métodos auxiliares para cálculos de analytics
     def _calculate_bot_statistics(self) -> Dict[str, Any]:
         """Calcula estadísticas generales del bot"""
-        analytics = self._load_analytics()
         sessions = self.state_manager.active_sessions
         
         # Calcular métricas básicas
@@ -288,9 +339,7 @@ class AdminService:
         avg_searches = total_searches / total_users if total_users > 0 else 0
         
         # Búsquedas de hoy
-        today_searches = analytics.get('daily_stats', {}).get(
-            datetime.now().strftime('%Y-%m-%d'), {}
-        ).get('searches', 0)
+        today_searches = self.analytics.daily_count(datetime.now().strftime('%Y-%m-%d'), 'searches')
         
         return {
             'total_users': total_users,
@@ -299,9 +348,9 @@ class AdminService:
             'total_searches': total_searches,
             'searches_today': today_searches,
             'avg_searches_per_user': avg_searches,
-            'total_messages': analytics.get('total_messages', 0),
-            'avg_response_time': analytics.get('avg_response_time', 0),
-            'success_rate': analytics.get('success_rate', 100)
+            'total_messages': self.analytics.total('messages'),
+            'avg_response_time': self.analytics.value('avg_response_time', 0),
+            'success_rate': self.analytics.value('success_rate', 100)
         }
     
     def _analyze_user_behavior(self) -> Dict[str, Any]:
@@ -345,17 +394,23 @@ class AdminService:
     
     def _calculate_performance_metrics(self) -> Dict[str, Any]:
         """Calcula métricas de rendimiento"""
-        analytics = self._load_analytics()
+        analytics = self.analytics
         
         return {
-            'ai_response_time': analytics.get('ai_avg_response_time', 2.5),
-            'ai_success_rate': analytics.get('ai_success_rate', 95.0),
-            'search_index_time': analytics.get('search_index_time', 1.2),
-            'search_relevance': analytics.get('search_relevance', 0.85),
-            'empty_searches': analytics.get('empty_searches_pct', 8.0),
-            'indexed_documents': analytics.get('indexed_documents', 0),
-            'embeddings_size_mb': analytics.get('embeddings_size_mb', 50.0),
-            'memory_usage': analytics.get('memory_usage_pct', 45.0)
+            'ai_response_time': analytics.value('ai_avg_response_time', 2.5),
+            'ai_success_rate': analytics.value('ai_success_rate', 95.0),
+            'search_index_time': analytics.value('search_index_time', 1.2),
+            'search_relevance': analytics.value('search_relevance', 0.85),
+            'empty_searches': analytics.value('empty_searches_pct', 8.0),
+            'indexed_documents': analytics.value('indexed_documents', 0),
+            'embeddings_size_mb': analytics.value('embeddings_size_mb', 50.0),
+            'memory_usage': analytics.value('memory_usage_pct', 45.0),
+            'api_limiter': api_rate_limiter.get_stats(),
+            'query_cache': query_embedding_cache.get_stats(),
+            'answer_cache': semantic_answer_cache.get_stats(),
+            'request_queue': self.request_queue.get_stats() if self.request_queue else None,
+            'admission': self.admission.get_stats() if self.admission else None,
+            'hybrid_search': self.hybrid_search.get_stats() if self.hybrid_search else None
         }
     
     def _analyze_usage_trends(self) -> Dict[str, Any]:
@@ -410,44 +465,29 @@ class AdminService:
         }
     
     def _load_analytics(self) -> Dict[str, Any]:
-        """Carga datos de analytics"""
-        try:
-            if os.path.exists(self.analytics_file):
-                with open(self.analytics_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return {}
-        except Exception:
-            return {}
-    
-    def _save_analytics(self, data: Dict[str, Any]):
-        """Guarda datos de analytics"""
-        try:
-            os.makedirs(LOGS_FOLDER, exist_ok=True)
-            with open(self.analytics_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            print(f"Error guardando analytics: {e}")
+        """Copia de los agregados de analytics"""
+        return self.analytics.snapshot()
+
+    @staticmethod
+    def _import_legacy_analytics(db, analytics: Dict[str, Any]) -> None:
+        """Pasa `bot_analytics.json` a las tablas de agregados (los totales se derivan de los diarios)"""
+        db.executemany(
+            "INSERT OR REPLACE INTO analytics_daily (day, event_type, count) VALUES (?, ?, ?)",
+            [
+                (day, event_type, count)
+                for day, counters in analytics.get('daily_stats', {}).items()
+                for event_type, count in counters.items()
+            ],
+        )
+        db.executemany(
+            "INSERT OR REPLACE INTO analytics_values (key, value) VALUES (?, ?)",
+            [
+                (key, value)
+                for key, value in analytics.items()
+                if not key.startswith('total_') and isinstance(value, (int, float))
+            ],
+        )
     
     def update_analytics(self, event_type: str, data: Dict[str, Any]):
         """Actualiza datos de analytics en tiempo real"""
-        analytics = self._load_analytics()
-        
-        # Actualizar contadores
-        analytics[f'total_{event_type}'] = analytics.get(f'total_{event_type}', 0) + 1
-        
-        # Datos diarios
-        today = datetime.now().strftime('%Y-%m-%d')
-        if 'daily_stats' not in analytics:
-            analytics['daily_stats'] = {}
-        if today not in analytics['daily_stats']:
-            analytics['daily_stats'][today] = {}
-        
-        analytics['daily_stats'][today][event_type] = analytics['daily_stats'][today].get(event_type, 0) + 1
-        
-        # Datos específicos del evento
-        if 'response_time' in data:
-            analytics['avg_response_time'] = (
-                analytics.get('avg_response_time', 0) * 0.9 + data['response_time'] * 0.1
-            )
-        
-        self._save_analytics(analytics)
\ No newline at end of file
+        self.analytics.record(event_type, data)
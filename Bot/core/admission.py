@@ -0,0 +1,161 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from logger import ai_logger
+from constants import ADMISSION_CONFIG
+
+# Carriles de prioridad (menor índice = se atiende antes)
+LANES = ('admin', 'search', 'generation')
+
+
+class _Waiter:
+    """Consulta esperando turno; se despierta con un Event o un Future del loop"""
+
+    def __init__(self, lane: str, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.lane = lane
+        self.granted = False
+        self.cancelled = False
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def wake(self) -> None:
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class AdmissionController:
+    """
+    Control de admisión global delante de las llamadas a la IA.
+
+    Como mucho `max_in_flight` consultas trabajan a la vez contra la API;
+    el resto espera en una cola de prioridad por carril (administradores,
+    búsquedas cortas, generaciones largas) con un plazo máximo por carril.
+    Si la espera estimada con la duración media reciente ya supera ese
+    plazo, o la cola está llena, la consulta se rechaza al momento en vez
+    de agotar el timeout de 45 s contra un proveedor saturado.
+    """
+
+    def __init__(self, config: Dict[str, Any] = ADMISSION_CONFIG):
+        self.max_in_flight = config['max_in_flight']
+        self.max_waiting = config['max_waiting']
+        self.deadlines = config['deadline_seconds']
+        self.service_seconds = config['initial_service_seconds']
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiters: List[tuple] = []  # heap de (carril, orden, _Waiter)
+        self._order = itertools.count()
+        self.admitted = 0
+        self.shed = {lane: 0 for lane in LANES}
+        self.timed_out = 0
+
+    def _try_enter(self, lane: str, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """
+        Admite, rechaza o encola la consulta (con el lock tomado).
+
+        Returns:
+            float si se admite ya, None si se rechaza, o el _Waiter encolado
+        """
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            self.admitted += 1
+            return time.monotonic()
+
+        priority = LANES.index(lane)
+        ahead = sum(1 for entry in self._waiters if entry[0] <= priority and not entry[2].cancelled)
+        predicted_wait = (ahead + 1) / self.max_in_flight * self.service_seconds
+        if len(self._waiters) >= self.max_waiting or predicted_wait > self.deadlines[lane]:
+            self.shed[lane] += 1
+            ai_logger.warning(
+                f"Consulta rechazada por admisión ({lane}): {self._in_flight} en curso, "
+                f"{len(self._waiters)} en espera, espera estimada {predicted_wait:.1f}s"
+            )
+            return None
+
+        waiter = _Waiter(lane, loop)
+        heapq.heappush(self._waiters, (priority, next(self._order), waiter))
+        return waiter
+
+    def _give_up(self, waiter: _Waiter) -> Optional[float]:
+        """Plazo agotado: retira la espera salvo que el turno llegara justo a tiempo"""
+        with self._lock:
+            if waiter.granted:
+                return time.monotonic()
+            waiter.cancelled = True
+            self._waiters = [entry for entry in self._waiters if entry[2] is not waiter]
+            heapq.heapify(self._waiters)
+            self.timed_out += 1
+            self.shed[waiter.lane] += 1
+        ai_logger.warning(f"Consulta ({waiter.lane}) descartada: superó el plazo de espera")
+        return None
+
+    def acquire(self, lane: str) -> Optional[float]:
+        """
+        Espera turno para una consulta del carril indicado.
+
+        Returns:
+            float: Ticket para `release`, o None si la consulta se rechaza
+        """
+        with self._lock:
+            entry = self._try_enter(lane)
+        if not isinstance(entry, _Waiter):
+            return entry
+        if entry.event.wait(self.deadlines[lane]):
+            return time.monotonic()
+        return self._give_up(entry)
+
+    async def acquire_async(self, lane: str) -> Optional[float]:
+        """Como `acquire`, pero cede el event loop mientras espera"""
+        with self._lock:
+            entry = self._try_enter(lane, asyncio.get_running_loop())
+        if not isinstance(entry, _Waiter):
+            return entry
+        try:
+            await asyncio.wait_for(asyncio.shield(entry.future), self.deadlines[lane])
+            return time.monotonic()
+        except asyncio.TimeoutError:
+            return self._give_up(entry)
+
+    def release(self, ticket: float) -> None:
+        """Libera el hueco, actualiza la duración media y da turno al siguiente"""
+        with self._lock:
+            elapsed = time.monotonic() - ticket
+            self.service_seconds = 0.8 * self.service_seconds + 0.2 * elapsed
+            self._in_flight -= 1
+            while self._waiters and self._in_flight < self.max_in_flight:
+                _, _, waiter = heapq.heappop(self._waiters)
+                if waiter.cancelled:
+                    continue
+                waiter.granted = True
+                self._in_flight += 1
+                self.admitted += 1
+                waiter.wake()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estado actual de la admisión"""
+        with self._lock:
+            waiting = {lane: 0 for lane in LANES}
+            for priority, _, waiter in self._waiters:
+                if not waiter.cancelled:
+                    waiting[LANES[priority]] += 1
+            return {
+                'in_flight': self._in_flight,
+                'max_in_flight': self.max_in_flight,
+                'waiting': waiting,
+                'admitted': self.admitted,
+                'shed': dict(self.shed),
+                'timed_out': self.timed_out,
+                'avg_service_seconds': round(self.service_seconds, 2),
+            }
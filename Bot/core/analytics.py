@@ -0,0 +1,147 @@
+import atexit
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from constants import ANALYTICS_CONFIG
+from core.storage import BotDatabase
+
+
+class AnalyticsLog:
+    """
+    Registro de eventos de analytics de solo añadido con contadores en memoria.
+
+    `record` solo actualiza los contadores y encola el evento (O(1), sin
+    tocar disco). Un hilo en segundo plano añade los eventos encolados al
+    registro del almacén en un único lote cada `flush_interval_seconds` y,
+    cada `compaction_interval_seconds`, los pliega en los agregados diarios
+    y descarta los eventos individuales más antiguos que la retención. Las
+    estadísticas se leen de los contadores sin volver a recorrer el
+    historial.
+    """
+
+    def __init__(self, db: BotDatabase, config: Dict[str, Any] = ANALYTICS_CONFIG):
+        self.db = db
+        self.retention_seconds = config['event_retention_days'] * 24 * 3600
+        self.compaction_interval = config['compaction_interval_seconds']
+
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending: List[tuple] = []
+        self._values_dirty = False
+        self._last_compaction = time.monotonic()
+
+        self.daily_stats: Dict[str, Dict[str, int]] = {}
+        self.totals: Dict[str, int] = {}
+        self.values: Dict[str, float] = {}
+        self._load()
+
+        self._stop_event = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_loop,
+            args=(config['flush_interval_seconds'],),
+            name="analytics-flusher",
+            daemon=True,
+        )
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def _load(self) -> None:
+        analytics = self.db.load_analytics()
+        self.daily_stats = analytics.pop('daily_stats')
+        for key, value in analytics.items():
+            if key.startswith('total_'):
+                self.totals[key[len('total_'):]] = value
+            else:
+                self.values[key] = value
+
+    def record(self, event_type: str, data: Dict[str, Any]) -> None:
+        """Registra un evento"""
+        timestamp = time.time()
+        day = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')
+        with self._lock:
+            self._pending.append((timestamp, event_type, data))
+            self.totals[event_type] = self.totals.get(event_type, 0) + 1
+            counters = self.daily_stats.setdefault(day, {})
+            counters[event_type] = counters.get(event_type, 0) + 1
+
+            # Datos específicos del evento
+            if 'response_time' in data:
+                self.values['avg_response_time'] = (
+                    self.values.get('avg_response_time', 0) * 0.9 + data['response_time'] * 0.1
+                )
+                self._values_dirty = True
+
+    def total(self, event_type: str) -> int:
+        with self._lock:
+            return self.totals.get(event_type, 0)
+
+    def daily_count(self, day: str, event_type: str) -> int:
+        with self._lock:
+            return self.daily_stats.get(day, {}).get(event_type, 0)
+
+    def value(self, key: str, default: Optional[float] = None) -> Optional[float]:
+        with self._lock:
+            return self.values.get(key, default)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Copia de los agregados con la forma del antiguo `bot_analytics.json`"""
+        with self._lock:
+            analytics: Dict[str, Any] = {
+                'daily_stats': {day: dict(counters) for day, counters in self.daily_stats.items()}
+            }
+            analytics.update({f'total_{event_type}': count for event_type, count in self.totals.items()})
+            analytics.update(self.values)
+            return analytics
+
+    def flush(self) -> bool:
+        """
+        Añade los eventos encolados al registro del almacén
+
+        Returns:
+            bool: True si había eventos y se escribieron
+        """
+        with self._write_lock:
+            with self._lock:
+                events, self._pending = self._pending, []
+                values = dict(self.values) if self._values_dirty else None
+                self._values_dirty = False
+            if not events and values is None:
+                return False
+
+            try:
+                if events:
+                    self.db.append_events(events)
+                if values is not None:
+                    self.db.save_analytics_values(values)
+                return True
+            except Exception as e:
+                print(f"Error guardando analytics: {e}")
+                # Se reintentan en el próximo guardado
+                with self._lock:
+                    self._pending[:0] = events
+                    self._values_dirty = self._values_dirty or values is not None
+                return False
+
+    def compact(self) -> int:
+        """Guarda lo pendiente y pliega el registro en los agregados diarios"""
+        self.flush()
+        with self._write_lock:
+            self._last_compaction = time.monotonic()
+            try:
+                return self.db.compact_events(time.time() - self.retention_seconds)
+            except Exception as e:
+                print(f"Error compactando analytics: {e}")
+                return 0
+
+    def _flush_loop(self, interval: float) -> None:
+        while not self._stop_event.wait(interval):
+            if time.monotonic() - self._last_compaction >= self.compaction_interval:
+                self.compact()
+            else:
+                self.flush()
+
+    def close(self) -> None:
+        """Detiene el guardado en segundo plano y guarda los eventos pendientes"""
+        self._stop_event.set()
+        self.flush()
@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from logger import data_logger
+from ai_embedding.extract import process_documents, build_chunk_lookup
+from ai_embedding.lexical_index import load_lexical_index
+from constants import DOCUMENTS_FOLDER, KNOWLEDGE_BASE_CONFIG
+
+
+@dataclass(frozen=True)
+class KnowledgeSnapshot:
+    """Estado inmutable de la base de conocimiento: índices y chunks de una misma versión"""
+    index_model: Any = None
+    lexical_index: Any = None
+    chunks: List[Dict[str, Any]] = field(default_factory=list)
+    chunks_by_id: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+    version: int = 0
+    loaded_at: float = field(default_factory=time.time)
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.index_model and self.chunks)
+
+    @property
+    def searchable(self) -> bool:
+        """Hay chunks y al menos un índice (vectorial o BM25) para buscarlos"""
+        return bool(self.chunks and (self.index_model or self.lexical_index))
+
+
+class KnowledgeBase:
+    """
+    Publica la base de conocimiento como instantáneas inmutables.
+
+    Las reconstrucciones (arranque, /admin o cambios en DOCUMENTS_FOLDER)
+    se hacen fuera del camino de las peticiones y terminan con una única
+    asignación de `self.snapshot`. Cada búsqueda lee la referencia una vez
+    y trabaja con ese par (índice, chunks) aunque se publique otro mientras.
+    """
+
+    def __init__(
+        self,
+        folder: str = DOCUMENTS_FOLDER,
+        on_publish: Optional[Callable[[KnowledgeSnapshot], None]] = None,
+    ):
+        self.folder = folder
+        self.on_publish = on_publish
+        self.snapshot = KnowledgeSnapshot()
+        self._rebuild_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    def rebuild(self) -> KnowledgeSnapshot:
+        """Procesa los documentos y publica una nueva instantánea"""
+        with self._rebuild_lock:
+            start_time = time.time()
+            index_model, chunks = process_documents()
+            chunks = chunks or []
+
+            # Construir el índice antes de publicarlo para que ninguna búsqueda espere
+            if index_model is not None and hasattr(index_model, "build"):
+                try:
+                    index_model.build()
+                except Exception as e:
+                    data_logger.error(f"No se pudo construir el índice vectorial: {e}")
+                    index_model = None
+
+            # Índice BM25 persistido junto al almacén; solo se tokenizan los chunks nuevos
+            lexical_index = None
+            if chunks:
+                try:
+                    lexical_index = load_lexical_index(chunks)
+                except Exception as e:
+                    data_logger.error(f"No se pudo construir el índice léxico: {e}")
+
+            snapshot = KnowledgeSnapshot(
+                index_model=index_model,
+                lexical_index=lexical_index,
+                chunks=chunks,
+                chunks_by_id=build_chunk_lookup(chunks),
+                version=self.snapshot.version + 1,
+            )
+            self.publish(snapshot)
+            data_logger.info(
+                f"Base de conocimiento v{snapshot.version} publicada: {len(chunks)} chunks "
+                f"en {time.time() - start_time:.2f} segundos"
+            )
+            return snapshot
+
+    def publish(self, snapshot: KnowledgeSnapshot) -> None:
+        """Reemplaza la instantánea vigente con una sola asignación"""
+        self.snapshot = snapshot
+        if self.on_publish:
+            self.on_publish(snapshot)
+
+    def _scan_folder(self) -> Dict[str, Tuple[int, int]]:
+        """Firma (tamaño, mtime) de cada PDF de la carpeta de documentos"""
+        signature = {}
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                if not name.lower().endswith(".pdf"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                signature[os.path.relpath(path, self.folder)] = (stat.st_size, stat.st_mtime_ns)
+        return signature
+
+    def start_watcher(self, interval: Optional[float] = None) -> None:
+        """Inicia el hilo que vigila DOCUMENTS_FOLDER y reconstruye al detectar cambios"""
+        if self._watcher and self._watcher.is_alive():
+            return
+
+        interval = interval or KNOWLEDGE_BASE_CONFIG["watch_interval_seconds"]
+        self._stop_event.clear()
+        self._watcher = threading.Thread(
+            target=self._watch_loop, args=(interval,), name="knowledge-watcher", daemon=True
+        )
+        self._watcher.start()
+        data_logger.info(f"Vigilando {self.folder} cada {interval} segundos")
+
+    def stop_watcher(self) -> None:
+        """Detiene el hilo de vigilancia"""
+        self._stop_event.set()
+        if self._watcher:
+            self._watcher.join(timeout=5)
+
+    def _watch_loop(self, interval: float) -> None:
+        last_signature = self._scan_folder()
+        pending_signature = None
+
+        while not self._stop_event.wait(interval):
+            try:
+                signature = self._scan_folder()
+                if signature == last_signature:
+                    pending_signature = None
+                    continue
+
+                # Esperar a que la carpeta deje de cambiar (copias en curso)
+                if signature != pending_signature:
+                    pending_signature = signature
+                    continue
+
+                data_logger.info("Cambios detectados en documentos, reconstruyendo índice...")
+                self.rebuild()
+                last_signature = signature
+                pending_signature = None
+            except Exception as e:
+                data_logger.error(f"Error en vigilancia de documentos: {e}")
@@ -0,0 +1,156 @@
+import json
+from collections import deque
+from typing import Any, Dict, List, Optional, Set
+from logger import data_logger
+from constants import DESIGN_SYNONYMS_FILE
+
+
+class KeywordAutomaton:
+    """
+    Autómata de Aho–Corasick sobre una lista de patrones.
+
+    Encuentra todas las apariciones (como subcadena) de todos los patrones
+    en una sola pasada por el texto, sin importar cuántos patrones haya.
+    """
+
+    def __init__(self, patterns: List[str]):
+        self.patterns = patterns
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+
+        for pattern_id, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(pattern_id)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                candidate = self._goto[fallback].get(char, 0)
+                # Los hijos de la raíz fallan a la raíz
+                self._fail[next_state] = candidate if candidate != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def matches(self, text: str) -> Set[int]:
+        """Índices de los patrones que aparecen en `text`"""
+        found: Set[int] = set()
+        state = 0
+        goto, fail, output = self._goto, self._fail, self._output
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+class QueryExpander:
+    """
+    Expansión de consultas con sinónimos de diseño y detección de herramientas.
+
+    Los diccionarios se compilan una vez: un índice término → clave para las
+    coincidencias exactas con un sinónimo y autómatas para las coincidencias
+    por subcadena (claves dentro de un término, variaciones de herramientas
+    dentro de la pregunta). Mantiene las reglas de los recorridos anteriores:
+    gana la primera clave del archivo y las herramientas favoritas del
+    usuario tienen preferencia.
+    """
+
+    # Términos distintos recordados por `expand_term` (el vocabulario de consultas es pequeño)
+    TERM_CACHE_SIZE = 10_000
+
+    def __init__(self, config: Dict[str, Any]):
+        self.synonyms: Dict[str, List[str]] = config.get("synonyms", {})
+        self.tool_context: Dict[str, List[str]] = config.get("tool_context", {})
+        self.tool_variations: Dict[str, List[str]] = config.get("tool_variations", {})
+
+        self._keys = list(self.synonyms)
+        self._key_automaton = KeywordAutomaton(self._keys)
+        # Término idéntico a un sinónimo → índice de la primera clave que lo contiene
+        self._synonym_index: Dict[str, int] = {}
+        for key_index, key in enumerate(self._keys):
+            for synonym in self.synonyms[key]:
+                self._synonym_index.setdefault(synonym, key_index)
+
+        self._term_cache: Dict[str, List[str]] = {}
+
+        self._trigger_automaton = KeywordAutomaton(config.get("tool_context_triggers", []))
+
+        self._tools = list(self.tool_variations)
+        variations = []
+        self._variation_tool: List[int] = []
+        for tool_index, tool in enumerate(self._tools):
+            for variation in self.tool_variations[tool]:
+                variations.append(variation)
+                self._variation_tool.append(tool_index)
+        self._tool_automaton = KeywordAutomaton(variations)
+
+    def expand_term(self, term: str) -> List[str]:
+        """Hasta 2 sinónimos del término (vacío si no hay coincidencia)"""
+        term_lower = term.lower()
+        expansion = self._term_cache.get(term_lower)
+        if expansion is not None:
+            return expansion
+
+        candidates = self._key_automaton.matches(term_lower)
+        exact = self._synonym_index.get(term_lower)
+        if exact is not None:
+            candidates.add(exact)
+        expansion = self.synonyms[self._keys[min(candidates)]][:2] if candidates else []
+        if len(self._term_cache) < self.TERM_CACHE_SIZE:
+            self._term_cache[term_lower] = expansion
+        return expansion
+
+    def expand_query(self, query: str) -> List[str]:
+        """Términos de la consulta seguidos cada uno de sus sinónimos"""
+        terms = []
+        for term in query.split():
+            terms.append(term)
+            terms += self.expand_term(term)
+        return terms
+
+    def tool_terms(self, query_lower: str, favorite_tools: List[str]) -> List[str]:
+        """Un término por herramienta favorita si la consulta trata de componentes, animación o prototipos"""
+        if not favorite_tools or not self._trigger_automaton.matches(query_lower):
+            return []
+        return [self.tool_context[tool][0] for tool in favorite_tools if self.tool_context.get(tool)]
+
+    def detect_tool(self, question: str, user_tools: List[str]) -> Optional[str]:
+        """Herramienta mencionada en la pregunta, priorizando las favoritas del usuario"""
+        matched = self._tool_automaton.matches(question.lower())
+        if not matched:
+            return None
+        tools = {self._tools[self._variation_tool[variation]] for variation in matched}
+        for tool in user_tools:
+            if tool in tools:
+                return tool
+        return self._tools[min(self._variation_tool[variation] for variation in matched)]
+
+
+def load_query_expander(path: str = DESIGN_SYNONYMS_FILE) -> QueryExpander:
+    """Compila el expansor desde el archivo de sinónimos (vacío si no se puede leer)"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return QueryExpander(json.load(f))
+    except Exception as e:
+        data_logger.error(f"Error cargando sinónimos de {path}: {str(e)}")
+        return QueryExpander({})
+
+
+# Compilado una vez al importar; compartido por búsqueda y generación
+query_expander = load_query_expander()
@@ -0,0 +1,171 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Set, Tuple
+from logger import data_logger
+from constants import REQUEST_QUEUE_CONFIG
+
+
+class UserRequestQueue:
+    """
+    Cola FIFO acotada por usuario con planificación justa entre usuarios.
+
+    Cada usuario tiene como máximo `max_pending_per_user` consultas en
+    espera y nunca más de una en ejecución, así que sus preguntas se
+    responden en el orden en que llegaron. Los usuarios con trabajo
+    pendiente forman una ronda (round-robin): un worker atiende una
+    consulta del primero y, si le quedan más, lo devuelve al final, de modo
+    que una ráfaga de mensajes de un usuario no acapara los workers.
+    """
+
+    def __init__(self, config: Dict[str, Any] = REQUEST_QUEUE_CONFIG, workers: Optional[int] = None):
+        self.max_pending = config['max_pending_per_user']
+        self.workers = workers or config['workers']
+
+        self._lock = threading.Condition()
+        self._pending: Dict[int, Deque[Tuple[Callable[[], Any], float]]] = {}
+        self._running: Set[int] = set()
+        self._ready: Deque[int] = deque()
+        self._started = False
+
+        self.processed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def submit(self, user_id: int, job: Callable[[], Any]) -> Optional[int]:
+        """
+        Encola una consulta del usuario.
+
+        Returns:
+            int: Consultas del mismo usuario por delante (0 si se atiende
+            en cuanto haya un worker libre), o None si su cola está llena
+        """
+        with self._lock:
+            pending = self._pending.get(user_id)
+            if pending is not None and len(pending) >= self.max_pending:
+                self.rejected += 1
+                return None
+
+            ahead = (len(pending) if pending else 0) + (user_id in self._running)
+            self._pending.setdefault(user_id, deque()).append((job, time.monotonic()))
+            if user_id not in self._running and len(self._pending[user_id]) == 1:
+                self._ready.append(user_id)
+                self._notify()
+            self._ensure_workers()
+            return ahead
+
+    def depth(self, user_id: int) -> int:
+        """Consultas del usuario en espera o en curso"""
+        with self._lock:
+            return len(self._pending.get(user_id, ())) + (user_id in self._running)
+
+    def _take(self) -> Tuple[int, Callable[[], Any]]:
+        """Siguiente consulta según la ronda de usuarios (con el lock tomado)"""
+        user_id = self._ready.popleft()
+        pending = self._pending[user_id]
+        job, enqueued_at = pending.popleft()
+        if not pending:
+            del self._pending[user_id]
+        self._running.add(user_id)
+
+        waited = time.monotonic() - enqueued_at
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        return user_id, job
+
+    def _finish(self, user_id: int) -> None:
+        """Marca la consulta como terminada y devuelve al usuario a la ronda (con el lock tomado)"""
+        self._running.discard(user_id)
+        self.processed += 1
+        if user_id in self._pending:
+            self._ready.append(user_id)
+            self._notify()
+
+    def _notify(self) -> None:
+        self._lock.notify()
+
+    def _ensure_workers(self) -> None:
+        if self._started:
+            return
+        self._started = True
+        for number in range(self.workers):
+            threading.Thread(
+                target=self._worker, name=f"user-queue-{number}", daemon=True
+            ).start()
+
+    def _worker(self) -> None:
+        while True:
+            with self._lock:
+                while not self._ready:
+                    self._lock.wait()
+                user_id, job = self._take()
+            try:
+                job()
+            except Exception as e:
+                data_logger.error(f"Error atendiendo consulta encolada del usuario {user_id}: {str(e)}")
+            finally:
+                with self._lock:
+                    self._finish(user_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Profundidad de las colas y tiempos de espera"""
+        with self._lock:
+            depths = [len(pending) for pending in self._pending.values()]
+            started = self.processed + len(self._running)
+            return {
+                'pending': sum(depths),
+                'running': len(self._running),
+                'users_waiting': len(depths),
+                'max_user_depth': max(depths, default=0),
+                'processed': self.processed,
+                'rejected': self.rejected,
+                'avg_wait_seconds': round(self.total_wait / started, 2) if started else 0.0,
+                'max_wait_seconds': round(self.max_wait, 2),
+            }
+
+
+class AsyncUserRequestQueue(UserRequestQueue):
+    """
+    `UserRequestQueue` para el runtime asíncrono: las consultas son
+    funciones que retornan corrutinas y los workers son tareas del event
+    loop. `submit` debe llamarse desde el propio loop.
+    """
+
+    def __init__(self, config: Dict[str, Any] = REQUEST_QUEUE_CONFIG, workers: Optional[int] = None):
+        super().__init__(config, workers or config['async_workers'])
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks = []
+
+    def _notify(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _ensure_workers(self) -> None:
+        if self._started:
+            return
+        self._started = True
+        self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._async_worker()) for _ in range(self.workers)]
+
+    async def _async_worker(self) -> None:
+        while True:
+            with self._lock:
+                item = self._take() if self._ready else None
+                if item is None:
+                    self._wakeup.clear()
+            if item is None:
+                await self._wakeup.wait()
+                continue
+
+            user_id, job = item
+            try:
+                await job()
+            except Exception as e:
+                data_logger.error(f"Error atendiendo consulta encolada del usuario {user_id}: {str(e)}")
+            finally:
+                with self._lock:
+                    self._finish(user_id)
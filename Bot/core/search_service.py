@@ -3,7 +3,10 @@ import time
 import json
 import os
 from dataclasses import dataclass
+from datetime import datetime
 from constants import LOGS_FOLDER
+from core.trending import TrendingCounter
+from core.query_expansion import query_expander
 
 @dataclass
 class SearchResult:
@@ -17,9 +20,13 @@ class SearchResult:
 class AdvancedSearchService:
     def __init__(self, state_manager):
         self.state_manager = state_manager
+        # Historial en el almacén SQLite compartido con las sesiones
+        self.db = state_manager.db
         self.search_history_file = os.path.join(LOGS_FOLDER, "search_history.json")
-        self.search_analytics = {}
         self._load_search_history()
+        # Conteos de la ventana de tendencias, actualizados en cada búsqueda
+        self.trending = TrendingCounter()
+        self._load_trending()
     
     def contextual_search(self, query: str, user_id: int, filters: Dict = None) -> List[SearchResult]:
         """Búsqueda con contexto histórico y filtros"""
@@ -41,7 +48,7 @@ class AdvancedSearchService:
     
     def _get_user_search_context(self, user_id: int) -> Dict[str, Any]:
         """Analiza el historial de búsquedas del usuario"""
-        user_searches = self.search_analytics.get(str(user_id), [])
+        user_searches = self.db.recent_searches(user_id, 20)
         
         if not user_searches:
             return {"frequent_terms": [], "preferred_categories": [], "expertise_patterns": []}
@@ -50,7 +57,7 @@ class AdvancedSearchService:
         term_frequency = {}
         category_frequency = {}
         
-        for search in user_searches[-20:]:  # Últimas 20 búsquedas
+        for search in user_searches:  # Últimas 20 búsquedas
             query = search.get("query", "").lower()
             category = search.get("category", "")
             
@@ -70,38 +77,16 @@ class AdvancedSearchService:
         return {
             "frequent_terms": [term for term, count in frequent_terms],
             "preferred_categories": [cat for cat, count in preferred_categories],
-            "total_searches": len(user_searches),
+            "total_searches": self.db.count_searches(user_id),
             "recent_queries": [s["query"] for s in user_searches[-5:]]
         }
     
     def _enhance_query_with_context(self, query: str, user_context: Dict, session) -> str:
         """Mejora la query con contexto del usuario y sinónimos"""
-        enhanced_terms = []
         query_lower = query.lower()
         
-        # Diccionario de sinónimos y términos relacionados en UX/UI
-        design_synonyms = {
-            "usabilidad": ["usability", "user experience", "ux", "experiencia usuario"],
-            "interfaz": ["interface", "ui", "user interface", "pantalla"],
-            "prototipo": ["prototype", "mockup", "wireframe", "boceto"],
-            "usuario": ["user", "cliente", "persona", "target"],
-            "diseño": ["design", "visual", "gráfico", "estética"],
-            "componente": ["component", "elemento", "widget", "control"],
-            "navegación": ["navigation", "menú", "menu", "flujo"],
-            "accesibilidad": ["accessibility", "a11y", "inclusivo", "universal"],
-            "responsive": ["adaptable", "móvil", "mobile", "tablet"],
-            "testing": ["prueba", "test", "validación", "evaluación"]
-        }
-        
         # Expandir con sinónimos
-        for term in query.split():
-            enhanced_terms.append(term)
-            term_lower = term.lower()
-            
-            for key, synonyms in design_synonyms.items():
-                if key in term_lower or term_lower in synonyms:
-                    enhanced_terms.extend(synonyms[:2])  # Añadir max 2 sinónimos
-                    break
+        enhanced_terms = query_expander.expand_query(query)
         
         # Añadir términos frecuentes del usuario si son relevantes
         user_frequent = user_context.get("frequent_terms", [])
@@ -110,22 +95,7 @@ class AdvancedSearchService:
                 enhanced_terms.append(freq_term)
         
         # Añadir contexto de herramientas favoritas
-        favorite_tools = session.favorite_tools
-        tool_context = {
-            "Figma": ["component", "auto layout", "design system"],
-            "Sketch": ["symbol", "artboard", "plugin"],
-            "Adobe XD": ["prototype", "voice", "animation"],
-            "InVision": ["collaboration", "handoff", "inspect"],
-            "Framer": ["interaction", "code", "animation"]
-        }
-        
-        for tool in favorite_tools:
-            if tool in tool_context:
-                # Añadir términos de herramienta si son relevantes al query
-                for tool_term in tool_context[tool]:
-                    if any(word in query_lower for word in ["componente", "animation", "prototipo", "interaction"]):
-                        enhanced_terms.append(tool_term)
-                        break
+        enhanced_terms.extend(query_expander.tool_terms(query_lower, session.favorite_tools))
         
         return " ".join(enhanced_terms)
     
@@ -168,26 +138,18 @@ class AdvancedSearchService:
     
     def _record_search(self, user_id: int, query: str, filters: Dict):
         """Registra la búsqueda para análisis futuro"""
-        user_id_str = str(user_id)
-        
-        if user_id_str not in self.search_analytics:
-            self.search_analytics[user_id_str] = []
-        
-        search_record = {
-            "timestamp": time.time(),
-            "query": query,
-            "filters": filters,
-            "category": filters.get("category", ""),
-            "session_id": f"{user_id}_{int(time.time() // 3600)}"  # Sesión por hora
-        }
-        
-        self.search_analytics[user_id_str].append(search_record)
-        
-        # Mantener solo últimas 100 búsquedas por usuario
-        if len(self.search_analytics[user_id_str]) > 100:
-            self.search_analytics[user_id_str] = self.search_analytics[user_id_str][-100:]
-        
-        self._save_search_history()
+        now = time.time()
+        clean_query = self._clean_query_for_trending(query.lower())
+        try:
+            # Mantener solo últimas 100 búsquedas por usuario
+            self.db.add_search(
+                user_id, query, filters.get("category", ""), filters,
+                keep_per_user=100, trending_query=clean_query, timestamp=now
+            )
+        except Exception as e:
+            print(f"Error guardando historial de búsquedas: {e}")
+        if clean_query:
+            self.trending.add(clean_query, now)
     
     def get_search_suggestions(self, user_id: int, partial_query: str = "") -> List[str]:
         """Genera sugerencias de búsqueda basadas en historial"""
@@ -234,27 +196,10 @@ class AdvancedSearchService:
     
     def get_trending_searches(self) -> List[str]:
         """Obtiene búsquedas populares de todos los usuarios"""
-        all_searches = []
-        
-        # Recopilar todas las búsquedas recientes (última semana)
-        week_ago = time.time() - (7 * 24 * 3600)
-        
-        for user_searches in self.search_analytics.values():
-            for search in user_searches:
-                if search.get("timestamp", 0) > week_ago:
-                    all_searches.append(search["query"].lower())
-        
-        # Contar frecuencia
-        query_frequency = {}
-        for query in all_searches:
-            # Normalizar query (quitar palabras comunes)
-            clean_query = self._clean_query_for_trending(query)
-            if clean_query:
-                query_frequency[clean_query] = query_frequency.get(clean_query, 0) + 1
-        
-        # Obtener las más frecuentes
-        trending = sorted(query_frequency.items(), key=lambda x: x[1], reverse=True)
-        return [query for query, count in trending[:10] if count > 1]
+        if self.trending.expire():
+            # Nuevo día: los cubos fuera de la ventana ya no se necesitan
+            self._prune_trending()
+        return [query for query, count in self.trending.top(min_count=2)]
     
     def _clean_query_for_trending(self, query: str) -> str:
         """Limpia query para análisis de tendencias"""
@@ -266,21 +211,51 @@ class AdvancedSearchService:
         
         return " ".join(clean_words) if len(clean_words) >= 2 else ""
     
-    def _save_search_history(self):
-        """Guarda historial de búsquedas"""
+    def _load_trending(self):
+        """Carga los cubos de tendencias de la ventana (reconstruyéndolos del historial la primera vez)"""
+        window_start = self.trending.window_start(datetime.now().date())
         try:
-            os.makedirs(LOGS_FOLDER, exist_ok=True)
-            with open(self.search_history_file, 'w', encoding='utf-8') as f:
-                json.dump(self.search_analytics, f, indent=2, ensure_ascii=False)
+            if self.db.get_meta("trending_buckets") is None:
+                since = datetime.strptime(window_start, '%Y-%m-%d').timestamp()
+                buckets = {}
+                for timestamp, query in self.db.searches_since(since):
+                    clean_query = self._clean_query_for_trending(query.lower())
+                    if clean_query:
+                        key = (datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d'), clean_query)
+                        buckets[key] = buckets.get(key, 0) + 1
+                self.db.add_trending([(day, query, count) for (day, query), count in buckets.items()])
+                self.db.set_meta("trending_buckets", str(time.time()))
+            self.trending.load(self.db.load_trending(window_start))
         except Exception as e:
-            print(f"Error guardando historial de búsquedas: {e}")
-    
+            print(f"Error cargando tendencias de búsqueda: {e}")
+
+    def _prune_trending(self):
+        try:
+            self.db.prune_trending(self.trending.window_start(datetime.now().date()))
+        except Exception as e:
+            print(f"Error limpiando tendencias de búsqueda: {e}")
+
     def _load_search_history(self):
-        """Carga historial de búsquedas"""
+        """Importa al almacén el historial JSON del formato anterior, si existe"""
         try:
-            if os.path.exists(self.search_history_file):
-                with open(self.search_history_file, 'r', encoding='utf-8') as f:
-                    self.search_analytics = json.load(f)
+            self.db.import_legacy_json(self.search_history_file, self._import_legacy_history)
         except Exception as e:
             print(f"Error cargando historial de búsquedas: {e}")
-            self.search_analytics = {}
\ No newline at end of file
+
+    @staticmethod
+    def _import_legacy_history(db, search_analytics: Dict[str, List[Dict[str, Any]]]) -> None:
+        rows = []
+        for user_id_str, user_searches in search_analytics.items():
+            for search in user_searches[-100:]:
+                rows.append((
+                    int(user_id_str),
+                    search.get("timestamp", 0),
+                    search.get("query", ""),
+                    search.get("category", "") or "",
+                    json.dumps(search.get("filters", {}), ensure_ascii=False),
+                ))
+        rows.sort(key=lambda row: row[1])
+        db.executemany(
+            "INSERT INTO search_records (user_id, timestamp, query, category, filters) VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
@@ -1,9 +1,12 @@
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Set
+import atexit
+import threading
 import time
 import json
 import os
-from constants import LOGS_FOLDER
+from constants import LOGS_FOLDER, SESSION_CONFIG
+from core.storage import BotDatabase
 
 @dataclass
 class UserSession:
@@ -24,33 +27,65 @@ class UserSession:
             self.session_start = time.time()
 
 class StateManager:
-    def __init__(self):
+    """
+    Sesiones de usuario en memoria con persistencia diferida (write-behind).
+
+    Las peticiones solo marcan su sesión como modificada; un hilo en
+    segundo plano guarda las sesiones marcadas cada
+    `flush_interval_seconds` (y una última vez al cerrar el proceso) como
+    una fila por sesión en el almacén SQLite compartido (`BotDatabase`),
+    así que el coste de un guardado depende de las sesiones modificadas y
+    no del número total de usuarios.
+    """
+
+    def __init__(self, flush_interval: Optional[float] = None, db: Optional[BotDatabase] = None):
         self.active_sessions: Dict[int, UserSession] = {}
+        # Formato anterior; se importa al almacén la primera vez
         self.session_file = os.path.join(LOGS_FOLDER, "user_sessions.json")
+        self.db = db or BotDatabase()
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._dirty: Set[int] = set()
         self._load_sessions()
+
+        self._stop_event = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_loop,
+            args=(flush_interval or SESSION_CONFIG['flush_interval_seconds'],),
+            name="session-flusher",
+            daemon=True,
+        )
+        self._flusher.start()
+        atexit.register(self.close)
     
     def get_user_session(self, user_id: int) -> UserSession:
-        """Recupera o crea una sesión de usuario"""
-        if user_id not in self.active_sessions:
-            self.active_sessions[user_id] = UserSession(
-                user_id=user_id,
-                current_context="main",
-                last_search=None,
-                preferences={
-                    "theme": "default",
-                    "response_style": "professional",
-                    "experience_level": "intermediate",
-                    "notifications": True
-                },
-                conversation_history=[]
-            )
-        return self.active_sessions[user_id]
+        """
+        Recupera o crea una sesión de usuario
+
+        Los llamantes modifican la sesión retornada directamente, así que
+        queda marcada para el próximo guardado.
+        """
+        with self._lock:
+            if user_id not in self.active_sessions:
+                self.active_sessions[user_id] = UserSession(
+                    user_id=user_id,
+                    current_context="main",
+                    last_search=None,
+                    preferences={
+                        "theme": "default",
+                        "response_style": "professional",
+                        "experience_level": "intermediate",
+                        "notifications": True
+                    },
+                    conversation_history=[]
+                )
+            self._dirty.add(user_id)
+            return self.active_sessions[user_id]
     
     def update_user_context(self, user_id: int, context: str):
         """Actualiza el contexto actual del usuario"""
         session = self.get_user_session(user_id)
         session.current_context = context
-        self._save_sessions()
     
     def add_to_history(self, user_id: int, message: str):
         """Añade mensaje al historial de conversación"""
@@ -85,40 +120,80 @@ class StateManager:
             "last_activity": session.conversation_history[-1] if session.conversation_history else None
         }
     
-    def _save_sessions(self):
-        """Guarda sesiones en archivo"""
-        try:
-            os.makedirs(LOGS_FOLDER, exist_ok=True)
-            # Convertir dataclasses a dict para serialización
-            sessions_data = {}
-            for user_id, session in self.active_sessions.items():
-                sessions_data[str(user_id)] = {
-                    "user_id": session.user_id,
-                    "current_context": session.current_context,
-                    "last_search": session.last_search,
-                    "preferences": session.preferences,
-                    "conversation_history": session.conversation_history[-10:],  # Solo últimos 10
-                    "expertise_level": session.expertise_level,
-                    "favorite_tools": session.favorite_tools,
-                    "search_count": session.search_count,
-                    "session_start": session.session_start
-                }
-            
-            with open(self.session_file, 'w', encoding='utf-8') as f:
-                json.dump(sessions_data, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            print(f"Error guardando sesiones: {e}")
+    @staticmethod
+    def _serialize_session(session: UserSession) -> Dict[str, Any]:
+        """Convierte la sesión a dict para serialización"""
+        return {
+            "user_id": session.user_id,
+            "current_context": session.current_context,
+            "last_search": session.last_search,
+            "preferences": json.loads(json.dumps(session.preferences)),
+            "conversation_history": list(session.conversation_history[-10:]),  # Solo últimos 10
+            "expertise_level": session.expertise_level,
+            "favorite_tools": list(session.favorite_tools),
+            "search_count": session.search_count,
+            "session_start": session.session_start
+        }
+
+    def flush(self) -> bool:
+        """
+        Guarda las sesiones modificadas desde el último guardado
+
+        Returns:
+            bool: True si había cambios y se escribieron
+        """
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return False
+                dirty, self._dirty = self._dirty, set()
+                sessions_data = {}
+                for user_id in dirty:
+                    session = self.active_sessions.get(user_id)
+                    if session is None:
+                        continue
+                    try:
+                        sessions_data[user_id] = self._serialize_session(session)
+                    except RuntimeError:
+                        # Modificada mientras se copiaba: queda para el próximo guardado
+                        self._dirty.add(user_id)
+
+            try:
+                self.db.save_sessions(sessions_data)
+                return True
+            except Exception as e:
+                print(f"Error guardando sesiones: {e}")
+                # Se reintentan en el próximo guardado
+                with self._lock:
+                    self._dirty.update(dirty)
+                return False
+
+    def _flush_loop(self, interval: float) -> None:
+        while not self._stop_event.wait(interval):
+            self.flush()
+
+    def close(self) -> None:
+        """Detiene el guardado en segundo plano y guarda los cambios pendientes"""
+        self._stop_event.set()
+        self.flush()
     
     def _load_sessions(self):
-        """Carga sesiones desde archivo"""
+        """Carga sesiones desde el almacén (importando antes el JSON anterior si existe)"""
         try:
-            if os.path.exists(self.session_file):
-                with open(self.session_file, 'r', encoding='utf-8') as f:
-                    sessions_data = json.load(f)
-                
-                for user_id_str, data in sessions_data.items():
-                    user_id = int(user_id_str)
-                    self.active_sessions[user_id] = UserSession(**data)
+            self.db.import_legacy_json(self.session_file, self._import_legacy_sessions)
+            for user_id, data in self.db.load_sessions().items():
+                self.active_sessions[user_id] = UserSession(**data)
         except Exception as e:
             print(f"Error cargando sesiones: {e}")
-            self.active_sessions = {}
\ No newline at end of file
+            self.active_sessions = {}
+
+    @staticmethod
+    def _import_legacy_sessions(db, sessions_data: Dict[str, Dict[str, Any]]) -> None:
+        now = time.time()
+        db.executemany(
+            "INSERT OR REPLACE INTO sessions (user_id, data, updated_at) VALUES (?, ?, ?)",
+            [
+                (int(user_id_str), json.dumps(data, ensure_ascii=False), now)
+                for user_id_str, data in sessions_data.items()
+            ],
+        )
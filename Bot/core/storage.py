@@ -0,0 +1,294 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from logger import data_logger
+from constants import BOT_DATABASE_FILE
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    user_id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS search_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    timestamp REAL NOT NULL,
+    query TEXT NOT NULL,
+    category TEXT NOT NULL DEFAULT '',
+    filters TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_search_records_user ON search_records (user_id, id);
+CREATE INDEX IF NOT EXISTS idx_search_records_time ON search_records (timestamp);
+CREATE TABLE IF NOT EXISTS trending_buckets (
+    day TEXT NOT NULL,
+    query TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, query)
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp REAL NOT NULL,
+    day TEXT NOT NULL,
+    event_type TEXT NOT NULL,
+    user_id INTEGER,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_day_type ON events (day, event_type);
+CREATE TABLE IF NOT EXISTS analytics_daily (
+    day TEXT NOT NULL,
+    event_type TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, event_type)
+);
+CREATE TABLE IF NOT EXISTS analytics_values (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+
+class BotDatabase:
+    """
+    Almacén SQLite (modo WAL) del estado del bot.
+
+    Reúne en un solo archivo lo que antes eran `user_sessions.json`,
+    `search_history.json` y `bot_analytics.json`: cada cambio es una
+    inserción o actualización de una fila en lugar de reescribir un JSON
+    completo, y las lecturas usan índices en vez de recorrer todo el
+    historial. Cada hilo usa su propia conexión; WAL permite leer mientras
+    otro hilo escribe.
+    """
+
+    def __init__(self, path: str = BOT_DATABASE_FILE):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.transaction() as db:
+            db.executescript(_SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        """Conexión del hilo actual"""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Ejecuta un bloque en una transacción (commit al salir, rollback si falla)"""
+        db = self.connection()
+        with db:
+            yield db
+
+    def import_legacy_json(self, path: str, importer: Callable[[sqlite3.Connection, Any], None]) -> bool:
+        """
+        Importa una sola vez un archivo JSON del formato anterior.
+
+        La marca de importación se guarda en la misma transacción que los
+        datos, así que un corte a mitad nunca duplica registros. El archivo
+        original se renombra a `.migrated`.
+        """
+        key = f"imported:{os.path.basename(path)}"
+        if not os.path.exists(path):
+            return False
+        try:
+            with self.transaction() as db:
+                if db.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+                    return False
+                with open(path, 'r', encoding='utf-8') as f:
+                    importer(db, json.load(f))
+                db.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (key, str(time.time())))
+            os.replace(path, path + ".migrated")
+            data_logger.info(f"Importado {os.path.basename(path)} al almacén SQLite")
+            return True
+        except Exception as e:
+            data_logger.error(f"Error importando {path}: {e}")
+            return False
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self.transaction() as db:
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    # Sesiones
+    def load_sessions(self) -> Dict[int, Dict[str, Any]]:
+        rows = self.connection().execute("SELECT user_id, data FROM sessions").fetchall()
+        return {user_id: json.loads(data) for user_id, data in rows}
+
+    def save_sessions(self, sessions: Dict[int, Dict[str, Any]]) -> None:
+        """Inserta o actualiza solo las sesiones indicadas"""
+        now = time.time()
+        with self.transaction() as db:
+            db.executemany(
+                "INSERT INTO sessions (user_id, data, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                [(user_id, json.dumps(data, ensure_ascii=False), now) for user_id, data in sessions.items()],
+            )
+
+    # Historial de búsquedas
+    def add_search(
+        self,
+        user_id: int,
+        query: str,
+        category: str,
+        filters: Dict[str, Any],
+        keep_per_user: int,
+        trending_query: str = "",
+        timestamp: Optional[float] = None,
+    ) -> None:
+        """
+        Registra una búsqueda y descarta las más antiguas del usuario por encima de `keep_per_user`
+
+        Si se indica `trending_query` (la consulta normalizada), incrementa
+        también su cubo diario de tendencias en la misma transacción.
+        """
+        timestamp = timestamp or time.time()
+        with self.transaction() as db:
+            db.execute(
+                "INSERT INTO search_records (user_id, timestamp, query, category, filters) VALUES (?, ?, ?, ?, ?)",
+                (user_id, timestamp, query, category or "", json.dumps(filters, ensure_ascii=False)),
+            )
+            if trending_query:
+                db.execute(
+                    "INSERT INTO trending_buckets (day, query, count) VALUES (?, ?, 1) "
+                    "ON CONFLICT(day, query) DO UPDATE SET count = count + 1",
+                    (datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d'), trending_query),
+                )
+            db.execute(
+                "DELETE FROM search_records WHERE user_id = ? AND id <= ("
+                "SELECT id FROM search_records WHERE user_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (user_id, user_id, keep_per_user),
+            )
+
+    def recent_searches(self, user_id: int, limit: int) -> List[Dict[str, Any]]:
+        """Últimas búsquedas del usuario, de la más antigua a la más reciente"""
+        rows = self.connection().execute(
+            "SELECT timestamp, query, category FROM search_records WHERE user_id = ? "
+            "ORDER BY id DESC LIMIT ?",
+            (user_id, limit),
+        ).fetchall()
+        return [
+            {"timestamp": timestamp, "query": query, "category": category}
+            for timestamp, query, category in reversed(rows)
+        ]
+
+    def count_searches(self, user_id: int) -> int:
+        return self.connection().execute(
+            "SELECT COUNT(*) FROM search_records WHERE user_id = ?", (user_id,)
+        ).fetchone()[0]
+
+    def searches_since(self, timestamp: float) -> List[Tuple[float, str]]:
+        """Pares `(timestamp, consulta)` de todos los usuarios posteriores a `timestamp`"""
+        return self.connection().execute(
+            "SELECT timestamp, query FROM search_records WHERE timestamp > ?", (timestamp,)
+        ).fetchall()
+
+    # Tendencias
+    def load_trending(self, since_day: str) -> List[Tuple[str, str, int]]:
+        return self.connection().execute(
+            "SELECT day, query, count FROM trending_buckets WHERE day >= ?", (since_day,)
+        ).fetchall()
+
+    def add_trending(self, rows: List[Tuple[str, str, int]]) -> None:
+        with self.transaction() as db:
+            db.executemany(
+                "INSERT INTO trending_buckets (day, query, count) VALUES (?, ?, ?) "
+                "ON CONFLICT(day, query) DO UPDATE SET count = count + excluded.count",
+                rows,
+            )
+
+    def prune_trending(self, before_day: str) -> None:
+        with self.transaction() as db:
+            db.execute("DELETE FROM trending_buckets WHERE day < ?", (before_day,))
+
+    # Eventos de analytics
+    def append_events(self, events: List[tuple]) -> None:
+        """Añade al registro de eventos filas `(timestamp, event_type, data)` sin tocar los agregados"""
+        with self.transaction() as db:
+            db.executemany(
+                "INSERT INTO events (timestamp, day, event_type, user_id, data) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        timestamp,
+                        datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d'),
+                        event_type,
+                        data.get('user_id'),
+                        json.dumps(data, ensure_ascii=False, default=str),
+                    )
+                    for timestamp, event_type, data in events
+                ],
+            )
+
+    def save_analytics_values(self, values: Dict[str, float]) -> None:
+        with self.transaction() as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO analytics_values (key, value) VALUES (?, ?)",
+                list(values.items()),
+            )
+
+    def _compacted_event_id(self, db: sqlite3.Connection) -> int:
+        row = db.execute("SELECT value FROM meta WHERE key = 'events_compacted_id'").fetchone()
+        return int(row[0]) if row else 0
+
+    def compact_events(self, retention_cutoff: float) -> int:
+        """
+        Pliega los eventos aún no compactados en `analytics_daily` y borra
+        los ya compactados anteriores a `retention_cutoff`.
+
+        Returns:
+            int: Eventos plegados
+        """
+        with self.transaction() as db:
+            compacted_id = self._compacted_event_id(db)
+            last_id = db.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+            if last_id > compacted_id:
+                db.execute(
+                    "INSERT INTO analytics_daily (day, event_type, count) "
+                    "SELECT day, event_type, COUNT(*) FROM events WHERE id > ? AND id <= ? "
+                    "GROUP BY day, event_type "
+                    "ON CONFLICT(day, event_type) DO UPDATE SET count = count + excluded.count",
+                    (compacted_id, last_id),
+                )
+                db.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('events_compacted_id', ?)",
+                    (str(last_id),),
+                )
+            db.execute(
+                "DELETE FROM events WHERE id <= ? AND timestamp < ?", (last_id, retention_cutoff)
+            )
+            return last_id - compacted_id
+
+    def load_analytics(self) -> Dict[str, Any]:
+        """Agregados de analytics con la forma del antiguo `bot_analytics.json`"""
+        db = self.connection()
+        analytics: Dict[str, Any] = {'daily_stats': {}}
+        rows = db.execute(
+            "SELECT day, event_type, SUM(count) FROM ("
+            "SELECT day, event_type, count FROM analytics_daily "
+            "UNION ALL "
+            "SELECT day, event_type, COUNT(*) FROM events WHERE id > ? GROUP BY day, event_type"
+            ") GROUP BY day, event_type",
+            (self._compacted_event_id(db),),
+        )
+        for day, event_type, count in rows:
+            analytics['daily_stats'].setdefault(day, {})[event_type] = count
+            analytics[f'total_{event_type}'] = analytics.get(f'total_{event_type}', 0) + count
+        for key, value in db.execute("SELECT key, value FROM analytics_values"):
+            analytics[key] = value
+        return analytics
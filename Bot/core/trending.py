@@ -0,0 +1,85 @@
+import heapq
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+from constants import SEARCH_CONFIG
+
+
+class TrendingCounter:
+    """
+    Conteo de búsquedas normalizadas en una ventana deslizante de días.
+
+    Cada día tiene su cubo de contadores y la ventana es la suma de los
+    cubos vigentes: registrar una búsqueda incrementa dos contadores, y al
+    cambiar de día se restan los cubos que salen de la ventana. Las
+    `top_k` consultas más frecuentes se mantienen ordenadas al incrementar
+    (solo cambia la consulta registrada), así que leer las tendencias no
+    recorre el historial.
+    """
+
+    def __init__(self, window_days: int = SEARCH_CONFIG['trending_window_days'], top_k: int = 10):
+        self.window_days = window_days
+        self.top_k = top_k
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Counter] = {}
+        self._window: Counter = Counter()
+        self._top: List[str] = []
+        self._current_day = ""
+
+    def window_start(self, today: date) -> str:
+        """Primer día (YYYY-MM-DD) incluido en la ventana"""
+        return (today - timedelta(days=self.window_days - 1)).strftime('%Y-%m-%d')
+
+    def load(self, rows: Iterable[Tuple[str, str, int]]) -> None:
+        """Carga cubos `(día, consulta, conteo)` guardados"""
+        with self._lock:
+            for day, query, count in rows:
+                self._buckets.setdefault(day, Counter())[query] += count
+                self._window[query] += count
+            self._current_day = ""
+            self._roll(datetime.now())
+
+    def _roll(self, now: datetime) -> bool:
+        """Descarta los cubos fuera de la ventana (con el lock tomado)"""
+        today = now.strftime('%Y-%m-%d')
+        if today == self._current_day:
+            return False
+        self._current_day = today
+        start = self.window_start(now.date())
+        for day in [day for day in self._buckets if day < start]:
+            self._window.subtract(self._buckets.pop(day))
+        self._window = +self._window  # quita los conteos que quedan a cero
+        self._top = [query for query, _ in heapq.nlargest(self.top_k, self._window.items(), key=lambda x: x[1])]
+        return True
+
+    def add(self, query: str, timestamp: float) -> None:
+        """Registra una búsqueda ya normalizada"""
+        moment = datetime.fromtimestamp(timestamp)
+        with self._lock:
+            self._roll(datetime.now())
+            day = moment.strftime('%Y-%m-%d')
+            if day < self.window_start(datetime.now().date()):
+                return
+            self._buckets.setdefault(day, Counter())[query] += 1
+            self._window[query] += 1
+
+            count = self._window[query]
+            if query not in self._top:
+                if len(self._top) >= self.top_k and count <= self._window[self._top[-1]]:
+                    return
+                if len(self._top) >= self.top_k:
+                    self._top.pop()
+                self._top.append(query)
+            self._top.sort(key=lambda q: self._window[q], reverse=True)
+
+    def expire(self) -> bool:
+        """Aplica el cambio de día; True si la ventana avanzó"""
+        with self._lock:
+            return self._roll(datetime.now())
+
+    def top(self, min_count: int = 1) -> List[Tuple[str, int]]:
+        """Consultas más frecuentes de la ventana con su conteo"""
+        with self._lock:
+            self._roll(datetime.now())
+            return [(query, self._window[query]) for query in self._top if self._window[query] >= min_count]
@@ -1,10 +1,13 @@
 import os
+import asyncio
 import logging
 import telebot
 import time
 from dotenv import load_dotenv
+from telebot.async_telebot import AsyncTeleBot
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
 from bot_handler import BotHandler
+from ai_embedding.async_ai import close_async_http_session
 
 
 def setup_logging():
@@ -152,6 +155,102 @@ def register_handlers(bot, bot_handler: BotHandler):
     logger.info(f"Registrados manejadores de DesignBot en {elapsed_time:.2f} segundos")
 
 
+def register_async_handlers(bot: AsyncTeleBot, bot_handler: BotHandler):
+    """
+    Registra los handlers del DesignBot sobre AsyncTeleBot
+
+    Las preguntas y búsquedas (embedding + LLM) usan los métodos `*_async`
+    de BotHandler y no ocupan ningún hilo mientras esperan a la API. El
+    resto de comandos son rápidos y se ejecutan con su versión síncrona en
+    el pool de hilos por defecto.
+    """
+    logger = logging.getLogger(__name__)
+    start_time = time.time()
+    logger.info("Iniciando registro de handlers asíncronos para DesignBot...")
+
+    def run_in_thread(name, handler):
+        async def callback(update):
+            logger.info(f"{name} recibido de usuario {update.from_user.id}")
+            await asyncio.to_thread(handler, update)
+        return callback
+
+    # Comandos principales y avanzados (síncronos)
+    for commands, handler in (
+        (["start"], bot_handler.start),
+        (["help"], bot_handler.show_help),
+        (["list"], bot_handler.list_categories),
+        (["preferences", "config"], bot_handler.handle_preferences_command),
+        (["analytics", "stats"], bot_handler.handle_analytics_command),
+        (["trending", "popular"], bot_handler.handle_trending_command),
+        (["tips", "advice"], bot_handler.handle_tips_command),
+        (["admin"], bot_handler.handle_admin_command),
+    ):
+        bot.register_message_handler(
+            run_in_thread(f"Comando /{commands[0]}", handler), commands=commands
+        )
+
+    # Comandos especializados en UX/UI Design
+    @bot.message_handler(commands=["design", "ux", "ui", "tools", "ask"])
+    async def general_question(message):
+        logger.info(f"Comando {message.text.split()[0]} recibido de usuario {message.from_user.id}: '{message.text}'")
+        await bot_handler.handle_general_question_async(message)
+
+    @bot.message_handler(commands=["search"])
+    async def search(message):
+        logger.info(f"Comando /search recibido de usuario {message.from_user.id}: '{message.text}'")
+        await bot_handler.handle_embedding_search_async(message)
+
+    # Callbacks para interacciones con botones (el último es el genérico)
+    for name, predicate, handler in (
+        ("Callback list", lambda call: call.data.startswith("list_"), bot_handler.handle_list),
+        ("Solicitud de descarga", lambda call: call.data.startswith("download#"), bot_handler.handle_pdf_download),
+        ("Callback back", lambda call: call.data.startswith("back_"), bot_handler.handle_back),
+        ("Callback show_help", lambda call: call.data == "show_help", bot_handler.show_help),
+        ("Callback search_help", lambda call: call.data == "search_help", bot_handler.start),
+        ("Callback genérico", lambda call: True, bot_handler.handle_callback_query),
+    ):
+        bot.register_callback_query_handler(run_in_thread(name, handler), func=predicate)
+
+    # Mensajes de texto y comandos no reconocidos
+    show_help = run_in_thread("Comando desconocido", bot_handler.show_help)
+
+    @bot.message_handler(func=lambda message: True, content_types=["text"])
+    async def handle_text(message):
+        if message.text.startswith("/"):
+            await show_help(message)
+        else:
+            logger.info(f"Mensaje de texto recibido de usuario {message.from_user.id} ({len(message.text)} caracteres)")
+            await bot_handler.handle_general_question_async(message)
+
+    elapsed_time = time.time() - start_time
+    logger.info(f"Registrados manejadores asíncronos de DesignBot en {elapsed_time:.2f} segundos")
+
+
+async def run_async_bot(token: str, logger):
+    """Ejecuta el bot con AsyncTeleBot: cientos de consultas en vuelo sin un hilo por consulta"""
+    bot = AsyncTeleBot(token, parse_mode=None)
+    # Los handlers síncronos (menús, admin, descargas) siguen usando TeleBot
+    sync_bot = telebot.TeleBot(token, parse_mode=None, threaded=False)
+
+    logger.info("Creando instancia de BotHandler (runtime asíncrono)...")
+    start_time = time.time()
+    bot_handler = await asyncio.to_thread(BotHandler, bot=sync_bot, async_bot=bot)
+    logger.info(f"BotHandler inicializado en {time.time() - start_time:.2f} segundos")
+
+    register_async_handlers(bot, bot_handler)
+
+    logger.info("Iniciando vigilancia de documentos...")
+    bot_handler.start_knowledge_watcher()
+
+    logger.info("Iniciando infinity_polling asíncrono...")
+    print("🚀 DesignBot UX/UI listo (runtime asíncrono)!")
+    try:
+        await bot.infinity_polling(skip_pending=True)
+    finally:
+        await close_async_http_session()
+        await bot.close_session()
+
+
 def main():
     """Función principal para ejecutar el bot con funcionalidades avanzadas"""
     load_dotenv()
@@ -165,6 +264,14 @@ def main():
         logger.critical("ERROR: No se encontró el TOKEN en las variables de entorno")
         return
 
+    runtime = os.getenv("BOT_RUNTIME", "threaded")
+    if runtime == "async":
+        try:
+            asyncio.run(run_async_bot(token, logger))
+        except Exception as e:
+            logger.critical(f"ERROR FATAL iniciando el bot: {str(e)}", exc_info=True)
+        return
+
     try:
         logger.info("Inicializando cliente de Telegram...")
         bot = telebot.TeleBot(token, parse_mode=None, threaded=True)
@@ -180,6 +287,9 @@ def main():
         logger.info("Registrando handlers...")
         register_handlers(bot, bot_handler)
 
+        logger.info("Iniciando vigilancia de documentos...")
+        bot_handler.start_knowledge_watcher()
+
         
         logger.info("Bot completamente configurado y listo para recibir mensajes")
         logger.info("Iniciando infinity_polling...")